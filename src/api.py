@@ -1,20 +1,35 @@
 from contextlib import asynccontextmanager
-from fastapi import FastAPI
+from typing import Literal
+from fastapi import FastAPI, Query, Response, status
 from fastapi.middleware.cors import CORSMiddleware
 
-from repository.tables import metadata
-from api.dependencies import engine
-from api.routes import users, posts, comments
+from repository.migrations import migrate
+from api.dependencies import (
+    comment_tree_cache,
+    comment_write_queue,
+    engine,
+    metrics,
+    read_engine,
+    slow_queries,
+    username_cache,
+)
+from api.metrics import CONTENT_TYPE, MetricsMiddleware
+from api.routes import users, posts, comments, search
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    # Создание таблиц при запуске
-    async with engine.begin() as conn:
-        await conn.run_sync(metadata.create_all)
+    # Создание/обновление схемы при запуске
+    await migrate(engine)
+    if comment_write_queue is not None:
+        comment_write_queue.start()
     yield
-    # Очистка при завершении
+    # Очистка при завершении: сначала дописать очередь комментариев
+    if comment_write_queue is not None:
+        await comment_write_queue.stop()
     await engine.dispose()
+    if read_engine is not engine:
+        await read_engine.dispose()
 
 app = FastAPI(
     title="CommentHub API",
@@ -31,10 +46,21 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+if metrics is not None:
+    # Снаружи CORS: время запроса - вместе со всеми middleware
+    app.add_middleware(MetricsMiddleware, metrics=metrics)
+    metrics.add_stats("commenthub_username_cache", username_cache.stats)
+    metrics.add_stats("commenthub_comment_tree_cache", comment_tree_cache.stats)
+    if comment_write_queue is not None:
+        metrics.add_stats("commenthub_comment_write_queue", comment_write_queue.stats)
+    if slow_queries is not None:
+        metrics.add_stats("commenthub_slow_queries", slow_queries.stats)
+
 # Подключение роутов
 app.include_router(users.router)
 app.include_router(posts.router)
 app.include_router(comments.router)
+app.include_router(search.router)
 
 @app.get("/")
 async def root():
@@ -48,6 +74,46 @@ async def root():
 async def health_check():
     return {"status": "healthy"}
 
+@app.get("/metrics", include_in_schema=False)
+async def prometheus_metrics():
+    """Метрики в текстовом формате Prometheus (404, если METRICS_ENABLED=false)."""
+    if metrics is None:
+        return Response(status_code=404)
+    return Response(content=metrics.render(), media_type=CONTENT_TYPE)
+
+@app.get("/debug/stats")
+async def debug_stats():
+    """Счётчики кэшей и очереди групповой фиксации."""
+    return {
+        "username_cache": username_cache.stats(),
+        "comment_tree_cache": comment_tree_cache.stats(),
+        "comment_write_queue": (
+            comment_write_queue.stats() if comment_write_queue is not None else None
+        ),
+    }
+
+@app.get("/debug/slow-queries")
+async def debug_slow_queries(
+    limit: int = Query(20, ge=1, le=500, description="Сколько форм запросов вернуть"),
+    order: Literal["max", "total"] = Query(
+        "max", description="max - по самому медленному случаю, total - по суммарному времени"
+    ),
+):
+    """Самые медленные формы SQL-запросов: параметры и маршрут худшего случая, план SQLite."""
+    if slow_queries is None:
+        return {"enabled": False, "threshold_ms": None, "queries": []}
+    return {
+        "enabled": True,
+        "threshold_ms": 1000 * slow_queries.threshold,
+        "queries": slow_queries.top(limit, order),
+    }
+
+@app.delete("/debug/slow-queries", status_code=status.HTTP_204_NO_CONTENT)
+async def clear_slow_queries():
+    """Очистить журнал (например, перед замером)."""
+    if slow_queries is not None:
+        slow_queries.clear()
+
 if __name__ == "__main__":
     import uvicorn
     print("!!!ПЕРЕЙДИ ПО ССЫЛКЕ: http://localhost:8000/docs")
@@ -1,3 +1,3 @@
-from api.routes import users, posts, comments
+from api.routes import users, posts, comments, search
 
-__all__ = ["users", "posts", "comments"]
+__all__ = ["users", "posts", "comments", "search"]
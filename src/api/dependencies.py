@@ -1,26 +1,74 @@
-from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
-from fastapi import Depends, HTTPException, status
-from typing import Annotated, AsyncGenerator
+from sqlalchemy.ext.asyncio import async_sessionmaker
+from fastapi import Depends, HTTPException, Query, status
+from typing import Annotated, AsyncGenerator, Optional
 
 from config import settings
+from domain.user import User
+from api.metrics import Metrics, instrument_engine
+from repository.cache import CommentTreeCache, LRUCache
+from repository.engine import create_engines
+from repository.pagination import decode_cursor
+from repository.slow_queries import SlowQueryLog
 from repository.repository import Repository
+from repository.write_queue import CommentWriteQueue
 from service.user_service import UserService
 from service.post_service import PostService
 from service.comment_service import CommentService
+from service.search_service import SearchService
 
 
 # Настройка базы данных
-engine = create_async_engine(settings.DATABASE_URL, echo=settings.DEBUG)
-async_session_factory = async_sessionmaker(engine, expire_on_commit=False)
+# Чтение - через пул соединений query_only, запись - через единственного писателя
+# (для SQLite; иначе это один и тот же движок, см. repository/engine.py).
+# Миграции выполняются на писателе: engine - движок записи.
+read_engine, engine = create_engines(settings.DATABASE_URL, echo=settings.DEBUG)
+async_session_factory = async_sessionmaker(read_engine, expire_on_commit=False)
+write_session_factory = (
+    async_sessionmaker(engine, expire_on_commit=False)
+    if engine is not read_engine
+    else async_session_factory
+)
+
+# Метрики процесса: SQL-запросы и время в БД считаются на обоих движках,
+# запросы дольше SLOW_QUERY_MS попадают в журнал медленных запросов
+metrics: Optional[Metrics] = Metrics() if settings.METRICS_ENABLED else None
+slow_queries: Optional[SlowQueryLog] = (
+    SlowQueryLog(settings.SLOW_QUERY_MS / 1000, settings.SLOW_QUERY_MAX_SHAPES)
+    if metrics is not None and settings.SLOW_QUERY_MS > 0
+    else None
+)
+if metrics is not None:
+    instrument_engine(read_engine, slow_queries)
+    metrics.add_pool("read", read_engine)
+    if engine is not read_engine:
+        instrument_engine(engine, slow_queries)
+        metrics.add_pool("write", engine)
+
+# Кэши процесса, общие для всех запросов
+username_cache: LRUCache[str, User] = LRUCache(
+    settings.USERNAME_CACHE_SIZE, settings.USERNAME_CACHE_TTL
+)
+comment_tree_cache = CommentTreeCache(settings.COMMENT_TREE_CACHE_NODES)
+
+# Очередь групповой фиксации комментариев; запускается в lifespan
+comment_write_queue: Optional[CommentWriteQueue] = (
+    CommentWriteQueue(
+        write_session_factory,
+        settings.COMMENT_WRITE_BATCH,
+        settings.COMMENT_WRITE_DELAY_MS / 1000,
+    )
+    if settings.COMMENT_WRITE_QUEUE
+    else None
+)
+
+def open_repository() -> Repository:
+    """Новая единица работы с общими фабриками сессий и кэшами процесса."""
+    return Repository(async_session_factory, username_cache, write_session_factory)
 
 async def get_db() -> AsyncGenerator[Repository, None]:
-    """Зависимость для получения репозитория."""
-    async with async_session_factory() as session:
-        repos = Repository(session_factory=async_session_factory)
-        try:
-            yield repos
-        finally:
-            pass
+    """Зависимость для получения репозитория: одна единица работы на запрос."""
+    async with open_repository() as repos:
+        yield repos
 
 async def get_user_service(
     repos: Annotated[Repository, Depends(get_db)]
@@ -35,7 +83,12 @@ async def get_post_service(
 async def get_comment_service(
     repos: Annotated[Repository, Depends(get_db)]
 ) -> CommentService:
-    return CommentService(repos)
+    return CommentService(repos, comment_tree_cache, comment_write_queue)
+
+async def get_search_service(
+    repos: Annotated[Repository, Depends(get_db)]
+) -> SearchService:
+    return SearchService(repos)
 
 
 # Общие зависимости для проверки существования сущностей
@@ -62,3 +115,15 @@ async def require_post(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Пост не найден"
         )
+
+
+async def page_cursor(
+    after: Optional[str] = Query(None, description="Курсор next_cursor с предыдущей страницы")
+) -> Optional[int]:
+    try:
+        return decode_cursor(after)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
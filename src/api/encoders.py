@@ -0,0 +1,117 @@
+"""Прямая сериализация доменных объектов в JSON для нагруженных GET-маршрутов.
+
+Формат совпадает с model_dump_json() схем из api/schemas.py (тот же порядок
+полей, компактные разделители, datetime в ISO 8601 с Z для UTC, не-ASCII
+без экранирования), но без проверки схемы и обхода атрибутов pydantic.
+Авторы кодируются один раз на ответ (кэш по user.id, не больше MAX_CACHED_USERS):
+комментарии одного пользователя переиспользуют готовый фрагмент.
+"""
+from datetime import datetime
+from json.encoder import encode_basestring
+from typing import Callable, Iterable, TypeVar
+
+from fastapi import Response
+
+from domain.comment import Comment
+from domain.post import Post
+from domain.user import User
+from repository.pagination import Page
+
+
+T = TypeVar("T")
+
+# Предел кэша авторов одного кодировщика (ответ NDJSON может быть любого размера)
+MAX_CACHED_USERS = 1024
+
+
+def _datetime(value: datetime) -> str:
+    text = value.isoformat()
+    if text.endswith("+00:00"):
+        text = text[:-6] + "Z"
+    return f'"{text}"'
+
+
+def _optional_int(value: int | None) -> str:
+    return "null" if value is None else str(int(value))
+
+
+class Encoder:
+    """Кодировщик одного ответа (кэш авторов живёт, пока живёт экземпляр)."""
+
+    def __init__(self) -> None:
+        # user.id -> готовый фрагмент; ключ - id в БД, а не адрес объекта: потоковые
+        # источники создают нового User на каждую строку, и адреса переиспользуются
+        self._users: dict[int, str] = {}
+
+    def user(self, user: User) -> str:
+        key = user.id
+        encoded = self._users.get(key)
+        if encoded is None:
+            if len(self._users) >= MAX_CACHED_USERS:
+                # Поток может пройти по сколь угодно большому числу авторов
+                self._users.clear()
+            encoded = (
+                f'{{"username":{encode_basestring(user.username)},'
+                f'"id":{int(user.id)},'
+                f'"created_date":{_datetime(user.created_date)}}}'
+            )
+            self._users[key] = encoded
+        return encoded
+
+    def post(self, post: Post) -> str:
+        return (
+            f'{{"title":{encode_basestring(post.title)},'
+            f'"content":{encode_basestring(post.content)},'
+            f'"id":{int(post.id)},'
+            f'"author":{self.user(post.author)},'
+            f'"created_at":{_datetime(post.created_at)},'
+            f'"comment_count":{int(post.comment_count)}}}'
+        )
+
+    def _comment_fields(self, comment: Comment) -> str:
+        return (
+            f'{{"text":{encode_basestring(comment.text)},'
+            f'"id":{int(comment.id)},'
+            f'"author":{self.user(comment.author)},'
+            f'"parent_id":{_optional_int(comment.parent_id)},'
+            f'"created_at":{_datetime(comment.created_at)},'
+            f'"reply_count":{int(comment.reply_count)}'
+        )
+
+    def comment_flat(self, comment: Comment) -> str:
+        """Как CommentFlatResponse: без replies."""
+        return self._comment_fields(comment) + "}"
+
+    def comment(self, comment: Comment) -> str:
+        """Как CommentResponse: с вложенными replies.
+
+        Обход без рекурсии: глубина ветки не ограничена стеком интерпретатора.
+        """
+        parts: list[str] = []
+        stack: list[Comment | str] = [comment]
+        while stack:
+            item = stack.pop()
+            if isinstance(item, str):
+                parts.append(item)
+                continue
+            parts.append(self._comment_fields(item))
+            parts.append(',"replies":[')
+            stack.append("]}")
+            replies = item.replies
+            for index in range(len(replies) - 1, -1, -1):
+                stack.append(replies[index])
+                if index:
+                    stack.append(",")
+        return "".join(parts)
+
+    def items(self, items: Iterable[T], encode_item: Callable[[T], str]) -> str:
+        return "[" + ",".join(encode_item(item) for item in items) + "]"
+
+    def page(self, page: Page[T], encode_item: Callable[[T], str]) -> str:
+        """Как PageResponse[...]: items и next_cursor."""
+        cursor = "null" if page.next_cursor is None else encode_basestring(page.next_cursor)
+        return f'{{"items":{self.items(page.items, encode_item)},"next_cursor":{cursor}}}'
+
+
+def json_response(body: str, headers: dict[str, str] | None = None) -> Response:
+    return Response(content=body.encode(), media_type="application/json", headers=headers)
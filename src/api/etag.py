@@ -0,0 +1,24 @@
+import hashlib
+
+from fastapi import Request, Response, status
+
+
+def post_etag(post_id: int, version: int, *variant) -> str:
+    """ETag ресурса поста: версия поста плюс параметры, влияющие на тело ответа."""
+    tag = f"p{post_id}v{version}"
+    if variant:
+        digest = hashlib.blake2s(repr(variant).encode(), digest_size=6).hexdigest()
+        tag = f"{tag}-{digest}"
+    return f'"{tag}"'
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    candidates = {value.strip().removeprefix("W/") for value in header.split(",")}
+    return "*" in candidates or etag in candidates
+
+
+def not_modified(etag: str) -> Response:
+    return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
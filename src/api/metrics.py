@@ -0,0 +1,268 @@
+"""Метрики запросов в текстовом формате Prometheus.
+
+На каждый HTTP-запрос MetricsMiddleware заводит RequestStats в contextvar.
+Обработчики событий движка (instrument_engine) добавляют туда число SQL-запросов
+и время в БД, а фазы обработчика размечаются через with phase("service") /
+phase("serialize"). По завершении ответа всё попадает в гистограммы
+с меткой маршрута - шаблона пути ("/comments/post/{post_id}"), а не самого пути.
+Время db входит во время service: разница - сборка объектов и деревьев.
+Запросы дольше порога дополнительно попадают в журнал медленных запросов
+(repository/slow_queries.py) вместе с маршрутом, который их выполнил.
+"""
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Iterator
+
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from repository.slow_queries import SlowQueryLog
+
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 250)
+
+
+class RequestStats:
+    """Счётчики одного запроса."""
+    __slots__ = ("scope", "statements", "db_seconds", "phases")
+
+    def __init__(self, scope: Scope) -> None:
+        self.scope = scope
+        self.statements = 0
+        self.db_seconds = 0.0
+        self.phases: dict[str, float] = {}
+
+    @property
+    def route(self) -> str | None:
+        """Шаблон пути маршрута (известен после того, как роутер выбрал маршрут)."""
+        return getattr(self.scope.get("route"), "path", None)
+
+    @property
+    def endpoint(self) -> str | None:
+        """Метод и маршрут: "GET /comments/post/{post_id}"."""
+        route = self.route
+        return f"{self.scope['method']} {route}" if route else None
+
+
+_current: ContextVar[RequestStats | None] = ContextVar("request_stats", default=None)
+
+
+def current_stats() -> RequestStats | None:
+    return _current.get()
+
+
+@contextmanager
+def phase(name: str) -> Iterator[None]:
+    """Добавить время блока к фазе name текущего запроса (вне запроса - ничего)."""
+    stats = _current.get()
+    if stats is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        stats.phases[name] = stats.phases.get(name, 0.0) + time.perf_counter() - started
+
+
+def instrument_engine(engine: AsyncEngine, slow_queries: SlowQueryLog | None = None) -> None:
+    """Считать SQL-запросы и время в БД для текущего запроса; медленные - в журнал."""
+    sync_engine = engine.sync_engine
+
+    # Одно время начала на соединение: выполнение на соединении последовательное.
+    # Упавший запрос after_cursor_execute не вызывает - время сбрасывает handle_error.
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        conn.info["query_started"] = time.perf_counter()
+
+    @event.listens_for(sync_engine, "handle_error")
+    def _error(exception_context):
+        if exception_context.connection is not None:
+            exception_context.connection.info.pop("query_started", None)
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        started = conn.info.pop("query_started", None)
+        if started is None:
+            return
+        elapsed = time.perf_counter() - started
+        stats = _current.get()
+        if stats is not None:
+            stats.statements += 1
+            stats.db_seconds += elapsed
+        if slow_queries is not None and elapsed >= slow_queries.threshold:
+            endpoint = stats.endpoint if stats is not None else None
+            slow_queries.record(conn, statement, parameters, executemany, elapsed, endpoint)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(names: tuple[str, ...], values: tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, labels: tuple[str, ...], buckets: tuple[float, ...]) -> None:
+        self.name = name
+        self.help = help
+        self.label_names = labels
+        self.buckets = buckets
+        # значения меток -> [число попаданий в каждый бакет (не накопительно) + +Inf, сумма]
+        self._series: dict[tuple[str, ...], list] = {}
+
+    def observe(self, labels: tuple[str, ...], value: float) -> None:
+        series = self._series.get(labels)
+        if series is None:
+            series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+        series[0][bisect_left(self.buckets, value)] += 1
+        series[1] += value
+
+    def render(self, lines: list[str]) -> None:
+        lines.append(f"# HELP {self.name} {self.help}")
+        lines.append(f"# TYPE {self.name} histogram")
+        for values, (counts, total) in sorted(self._series.items()):
+            cumulative = 0
+            for bound, count in zip((*self.buckets, "+Inf"), counts):
+                cumulative += count
+                le = bound if isinstance(bound, str) else f"{bound:g}"
+                labels = _labels(self.label_names, values, f'le="{le}"')
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.label_names, values)} {total:.6f}")
+            lines.append(f"{self.name}_count{_labels(self.label_names, values)} {cumulative}")
+
+
+class Counter:
+    def __init__(self, name: str, help: str, labels: tuple[str, ...]) -> None:
+        self.name = name
+        self.help = help
+        self.label_names = labels
+        self._values: dict[tuple[str, ...], float] = {}
+
+    def inc(self, labels: tuple[str, ...], value: float = 1) -> None:
+        self._values[labels] = self._values.get(labels, 0) + value
+
+    def render(self, lines: list[str]) -> None:
+        lines.append(f"# HELP {self.name} {self.help}")
+        lines.append(f"# TYPE {self.name} counter")
+        for values, value in sorted(self._values.items()):
+            lines.append(f"{self.name}{_labels(self.label_names, values)} {value:g}")
+
+
+class Metrics:
+    """Реестр метрик процесса и снимки пулов соединений на момент опроса."""
+
+    def __init__(self) -> None:
+        route = ("method", "route")
+        self.requests = Counter(
+            "commenthub_http_requests_total", "HTTP-запросы по маршруту и коду ответа", (*route, "status")
+        )
+        self.latency = Histogram(
+            "commenthub_http_request_duration_seconds", "Время обработки запроса", route, LATENCY_BUCKETS
+        )
+        self.queries = Histogram(
+            "commenthub_db_queries_per_request", "SQL-запросов на HTTP-запрос", route, QUERY_BUCKETS
+        )
+        self.db_time = Histogram(
+            "commenthub_db_seconds_per_request", "Время в БД на HTTP-запрос", route, LATENCY_BUCKETS
+        )
+        self.phases = Histogram(
+            "commenthub_request_phase_seconds",
+            "Время фаз обработчика (db входит в service)",
+            (*route, "phase"),
+            LATENCY_BUCKETS,
+        )
+        self._pools: dict[str, AsyncEngine] = {}
+        self._collectors: list[Callable[[list[str]], None]] = []
+
+    def add_pool(self, name: str, engine: AsyncEngine) -> None:
+        self._pools[name] = engine
+
+    def add_stats(self, prefix: str, stats: Callable[[], dict[str, float] | None]) -> None:
+        """Каждый ключ словаря stats() - gauge {prefix}_{ключ} (None - не выводить)."""
+
+        def render(lines: list[str]) -> None:
+            for key, value in (stats() or {}).items():
+                name = f"{prefix}_{key}"
+                lines.append(f"# TYPE {name} gauge")
+                lines.append(f"{name} {value:g}")
+
+        self._collectors.append(render)
+
+    def observe(self, method: str, route: str, status: int, seconds: float, stats: RequestStats) -> None:
+        labels = (method, route)
+        self.requests.inc((*labels, str(status)))
+        self.latency.observe(labels, seconds)
+        self.queries.observe(labels, stats.statements)
+        self.db_time.observe(labels, stats.db_seconds)
+        for name, value in stats.phases.items():
+            self.phases.observe((*labels, name), value)
+
+    def _render_pools(self, lines: list[str]) -> None:
+        gauges = {
+            "commenthub_db_pool_size": ("Размер пула соединений", "size"),
+            "commenthub_db_pool_checked_out": ("Соединения, выданные из пула", "checkedout"),
+            "commenthub_db_pool_checked_in": ("Свободные соединения в пуле", "checkedin"),
+            "commenthub_db_pool_overflow": ("Соединения сверх размера пула (< 0 - ещё не открытые соединения пула)", "overflow"),
+        }
+        for name, (help, method) in gauges.items():
+            lines.append(f"# HELP {name} {help}")
+            lines.append(f"# TYPE {name} gauge")
+            for pool_name, engine in self._pools.items():
+                getter = getattr(engine.pool, method, None)
+                if getter is not None:
+                    lines.append(f'{name}{{pool="{pool_name}"}} {getter()}')
+
+    def render(self) -> str:
+        lines: list[str] = []
+        for metric in (self.requests, self.latency, self.queries, self.db_time, self.phases):
+            metric.render(lines)
+        self._render_pools(lines)
+        for render in self._collectors:
+            render(lines)
+        return "\n".join(lines) + "\n"
+
+
+class MetricsMiddleware:
+    """ASGI-middleware: статистика запроса от начала до последнего байта ответа.
+
+    Маршрут определяется роутером FastAPI (scope["route"]) после обработки;
+    запросы мимо маршрутов попадают под route="unmatched".
+    """
+
+    def __init__(self, app: ASGIApp, metrics: Metrics) -> None:
+        self.app = app
+        self.metrics = metrics
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats(scope)
+        token = _current.set(stats)
+        status = 500
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - started
+            _current.reset(token)
+            self.metrics.observe(scope["method"], stats.route or "unmatched", status, elapsed, stats)
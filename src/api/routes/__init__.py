@@ -1,3 +1,3 @@
-from . import users, posts, comments
+from . import users, posts, comments, search
 
-__all__ = ["users", "posts", "comments"]
+__all__ = ["users", "posts", "comments", "search"]
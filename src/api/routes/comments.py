@@ -1,9 +1,22 @@
-from fastapi import APIRouter, Depends, status, Query
-from typing import List, Annotated
+from fastapi import APIRouter, Depends, status, Query, Request
+from typing import Annotated, List, Literal, Optional, Union
 
-from api.schemas import CommentCreate, CommentReplyCreate, CommentResponse, CommentTreeResponse
-from api.dependencies import get_comment_service
-from service.comment_service import CommentService
+from api.schemas import (
+    CommentBatchCreate,
+    CommentCreate,
+    CommentFlatResponse,
+    CommentReplyCreate,
+    CommentResponse,
+    CommentTreeResponse,
+    PageResponse,
+)
+from api.dependencies import get_comment_service, page_cursor
+from api.etag import etag_matches, not_modified, post_etag
+from api.encoders import Encoder, json_response
+from api.metrics import phase
+from api.streaming import ndjson_response, wants_ndjson
+from repository.pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
+from service.comment_service import CommentService, NewComment
 
 
 router = APIRouter(prefix="/comments", tags=["comments"])
@@ -37,6 +50,35 @@ async def add_comment_to_post(
             detail=str(e)
         )
 
+@router.post(
+    "/post/{post_id}/batch",
+    response_model=List[CommentFlatResponse],
+    status_code=status.HTTP_201_CREATED,
+    summary="Добавить комментарии к посту пакетом"
+)
+async def add_comments_batch(
+    post_id: int,
+    batch: CommentBatchCreate,
+    comment_service: Annotated[CommentService, Depends(get_comment_service)]
+):
+    """
+    Добавить пакет комментариев одной транзакцией.
+
+    Ответы внутри пакета ссылаются на родителя через parent_index,
+    ответ сервера - плоский список в порядке запроса, с присвоенными id.
+    """
+    try:
+        return await comment_service.add_comments_to_post(
+            post_id,
+            [NewComment(c.username, c.text, c.parent_index, c.parent_id) for c in batch.comments]
+        )
+    except (ValueError, LookupError) as e:
+        from fastapi import HTTPException
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+
 @router.post(
     "/{comment_id}/reply",
     response_model=CommentResponse,
@@ -68,23 +110,87 @@ async def reply_to_comment(
 
 @router.get(
     "/post/{post_id}",
-    response_model=List[CommentResponse],
+    response_model=Union[PageResponse[CommentResponse], PageResponse[CommentFlatResponse]],
     summary="Получить комментарии к посту"
 )
 async def get_comments_for_post(
     post_id: int,
-    comment_service: Annotated[CommentService, Depends(get_comment_service)]
+    request: Request,
+    comment_service: Annotated[CommentService, Depends(get_comment_service)],
+    after_id: Annotated[Optional[int], Depends(page_cursor)],
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE, description="Число корневых комментариев на странице"),
+    mode: Literal["tree", "flat"] = Query(
+        "tree",
+        description="tree - только корни с вложенными replies, flat - плоский список с parent_id"
+    ),
+    max_depth: Optional[int] = Query(None, ge=1, description="Глубина дерева (1 - только корни)")
+):
+    """Получить комментарии к посту, страницами по корневым комментариям.
+
+    Каждый комментарий попадает в ответ ровно один раз. Ответ помечается ETag
+    по версии поста; If-None-Match с тем же ETag даёт 304 без сборки дерева.
+
+    С Accept: application/x-ndjson - все комментарии после курсора потоком,
+    плоско (с parent_id) в порядке обхода дерева; limit и mode не применяются.
+    """
+    version = await comment_service.repositories.posts.get_version(post_id)
+    if version is None:
+        from fastapi import HTTPException
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="пост не найден"
+        )
+    if wants_ndjson(request):
+        # Поток читает своей единицей работы; соединение этого запроса
+        # отдаём в пул сразу, а не после отправки всего ответа
+        await comment_service.repositories.commit()
+        return ndjson_response(
+            lambda repos: repos.comments.stream_by_post(post_id, after_id, max_depth),
+            Encoder.comment_flat,
+        )
+    etag = post_etag(post_id, version, mode, limit, after_id, max_depth)
+    if etag_matches(request, etag):
+        return not_modified(etag)
+
+    try:
+        with phase("service"):
+            page = await comment_service.get_comments_page(
+                post_id, limit, after_id, max_depth, roots_only=(mode == "tree"), version=version
+            )
+    except LookupError as e:
+        from fastapi import HTTPException
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=str(e)
+        )
+
+    with phase("serialize"):
+        encoder = Encoder()
+        encode_item = encoder.comment_flat if mode == "flat" else encoder.comment
+        return json_response(encoder.page(page, encode_item), headers={"ETag": etag})
+
+@router.get(
+    "/{comment_id}/thread",
+    response_model=CommentResponse,
+    summary="Получить ветку обсуждения с корнем в комментарии"
+)
+async def get_comment_thread(
+    comment_id: int,
+    comment_service: Annotated[CommentService, Depends(get_comment_service)],
+    max_depth: Optional[int] = Query(None, ge=1, description="Глубина ветки (1 - только сам комментарий)")
 ):
-    """Получить все комментарии к посту в виде дерева (с ответами)"""
+    """Получить комментарий и все ответы на него (без загрузки остального поста)"""
     try:
-        comments = await comment_service.get_comments_for_post(post_id)
-        return comments
+        with phase("service"):
+            thread = await comment_service.get_thread(comment_id, max_depth)
     except LookupError as e:
         from fastapi import HTTPException
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=str(e)
         )
+    with phase("serialize"):
+        return json_response(Encoder().comment(thread))
 
 @router.get(
     "/{comment_id}",
@@ -96,11 +202,13 @@ async def get_comment(
     comment_service: Annotated[CommentService, Depends(get_comment_service)]
 ):
     """Получить информацию о комментарии по ID"""
-    comment = await comment_service.repositories.comments.find_by_id(comment_id)
+    with phase("service"):
+        comment = await comment_service.repositories.comments.find_by_id(comment_id)
     if not comment:
         from fastapi import HTTPException
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Комментарий не найден"
         )
-    return comment
+    with phase("serialize"):
+        return json_response(Encoder().comment(comment))
@@ -1,14 +1,33 @@
-from fastapi import APIRouter, Depends, status, Query
-from typing import List, Annotated
+from fastapi import APIRouter, Depends, status, Query, Request
+from fastapi.responses import StreamingResponse
+from typing import List, Annotated, Literal, Optional
 
-from api.schemas import PostCreate, PostResponse
-from api.dependencies import get_post_service, get_user_service
-from service.post_service import PostService
+from api.schemas import PageResponse, PostBatchCreate, PostCreate, PostResponse
+from api.dependencies import get_post_service, get_user_service, page_cursor
+from api.etag import etag_matches, not_modified, post_etag
+from api.encoders import Encoder, json_response
+from api.metrics import phase
+from api.streaming import NDJSON, ndjson_response, stream_response, wants_ndjson
+from repository.pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
+from service.export_service import ExportService
+from service.post_service import NewPost, PostService
 from service.user_service import UserService
 
 
 router = APIRouter(prefix="/posts", tags=["posts"])
 
+EXPORT_MEDIA_TYPES = {"jsonl": NDJSON, "csv": "text/csv; charset=utf-8"}
+ExportFormat = Literal["jsonl", "csv"]
+
+
+def export_response(fmt: str, post_id: Optional[int], filename: str):
+    """Выгрузка ExportService потоком, как вложение."""
+    return stream_response(
+        lambda repos: ExportService(repos).export(fmt, post_id),
+        EXPORT_MEDIA_TYPES[fmt],
+        headers={"Content-Disposition": f'attachment; filename="{filename}.{fmt}"'},
+    )
+
 @router.post(
     "/",
     response_model=PostResponse,
@@ -34,16 +53,62 @@ async def create_post(
             detail=str(e)
         )
 
+@router.post(
+    "/batch",
+    response_model=List[PostResponse],
+    status_code=status.HTTP_201_CREATED,
+    summary="Создать посты пакетом"
+)
+async def create_posts_batch(
+    batch: PostBatchCreate,
+    post_service: Annotated[PostService, Depends(get_post_service)]
+):
+    """Создать посты одной транзакцией; ответ - в порядке запроса, с id."""
+    try:
+        return await post_service.create_posts(
+            [NewPost(p.username, p.title, p.content) for p in batch.posts]
+        )
+    except (ValueError, LookupError) as e:
+        from fastapi import HTTPException
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+
 @router.get(
     "/",
-    response_model=List[PostResponse],
-    summary="Получить все посты"
+    response_model=PageResponse[PostResponse],
+    summary="Получить посты постранично"
 )
 async def get_all_posts(
-    post_service: Annotated[PostService, Depends(get_post_service)]
+    request: Request,
+    post_service: Annotated[PostService, Depends(get_post_service)],
+    after_id: Annotated[Optional[int], Depends(page_cursor)],
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE, description="Размер страницы")
 ):
-    """Получить список всех постов."""
-    return await post_service.repositories.posts.find_all()
+    """Получить посты в порядке id; следующая страница - по next_cursor.
+
+    С Accept: application/x-ndjson - все посты после курсора потоком,
+    по одному на строку (limit не применяется).
+    """
+    if wants_ndjson(request):
+        return ndjson_response(lambda repos: repos.posts.stream_all(after_id), Encoder.post)
+    with phase("service"):
+        page = await post_service.repositories.posts.find_page(limit, after_id)
+    with phase("serialize"):
+        encoder = Encoder()
+        return json_response(encoder.page(page, encoder.post))
+
+@router.get(
+    "/export",
+    response_class=StreamingResponse,
+    summary="Выгрузить все посты с комментариями"
+)
+async def export_posts(
+    format: ExportFormat = Query("jsonl", description="jsonl - формат импорта CLI, csv - строка на пост или комментарий")
+):
+    """Все пользователи, посты и деревья комментариев одним потоком (см. service/export_service.py)."""
+    return export_response(format, None, "posts")
 
 @router.get(
     "/{post_id}",
@@ -52,17 +117,31 @@ async def get_all_posts(
 )
 async def get_post(
     post_id: int,
+    request: Request,
     post_service: Annotated[PostService, Depends(get_post_service)]
 ):
-    """Получить информацию о посте по его ID."""
-    post = await post_service.repositories.posts.find_by_id(post_id)
+    """Получить информацию о посте по его ID (с ETag по версии поста)."""
+    version = await post_service.repositories.posts.get_version(post_id)
+    if version is None:
+        from fastapi import HTTPException
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Пост не найден"
+        )
+    etag = post_etag(post_id, version)
+    if etag_matches(request, etag):
+        return not_modified(etag)
+
+    with phase("service"):
+        post = await post_service.repositories.posts.find_by_id(post_id)
     if not post:
         from fastapi import HTTPException
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Пост не найден"
         )
-    return post
+    with phase("serialize"):
+        return json_response(Encoder().post(post), headers={"ETag": etag})
 
 @router.get(
     "/author/{username}",
@@ -82,4 +161,29 @@ async def get_posts_by_author(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Пользователь не найден"
         )
-    return await post_service.repositories.posts.find_by_author(user)
+    with phase("service"):
+        posts = await post_service.repositories.posts.find_by_author(user)
+    with phase("serialize"):
+        encoder = Encoder()
+        return json_response(encoder.items(posts, encoder.post))
+
+@router.get(
+    "/{post_id}/export",
+    response_class=StreamingResponse,
+    summary="Выгрузить пост с деревом комментариев"
+)
+async def export_post(
+    post_id: int,
+    post_service: Annotated[PostService, Depends(get_post_service)],
+    format: ExportFormat = Query("jsonl", description="jsonl - формат импорта CLI, csv - строка на пост или комментарий")
+):
+    """Пост, его авторы и все комментарии потоком, в порядке обхода дерева."""
+    if await post_service.repositories.posts.get_version(post_id) is None:
+        from fastapi import HTTPException
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Пост не найден"
+        )
+    # Соединение этого запроса не держим, пока идёт передача
+    await post_service.repositories.commit()
+    return export_response(format, post_id, f"post-{post_id}")
@@ -0,0 +1,34 @@
+from fastapi import APIRouter, Depends, Query, status
+from typing import Annotated, Optional
+
+from api.dependencies import get_search_service
+from api.schemas import PageResponse, SearchHitResponse
+from repository.pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
+from service.search_service import SearchService
+
+
+router = APIRouter(prefix="/search", tags=["search"])
+
+@router.get(
+    "",
+    response_model=PageResponse[SearchHitResponse],
+    summary="Полнотекстовый поиск по постам и комментариям"
+)
+async def search(
+    search_service: Annotated[SearchService, Depends(get_search_service)],
+    q: str = Query(..., min_length=1, max_length=500, description="Слова для поиска; слово* - поиск по префиксу"),
+    after: Optional[str] = Query(None, description="Курсор next_cursor с предыдущей страницы"),
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE, description="Размер страницы")
+):
+    """Найти посты и комментарии, содержащие все слова запроса.
+
+    Результаты общие для постов и комментариев, от более релевантных к менее (bm25).
+    """
+    try:
+        return await search_service.search(q, limit, after)
+    except ValueError as e:
+        from fastapi import HTTPException
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
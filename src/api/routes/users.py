@@ -1,8 +1,12 @@
-from fastapi import APIRouter, Depends, status
-from typing import List, Annotated
+from fastapi import APIRouter, Depends, status, Query, Request
+from typing import Annotated, List, Optional
 
-from api.schemas import UserCreate, UserResponse
-from api.dependencies import get_user_service
+from api.schemas import PageResponse, UserBatchCreate, UserCreate, UserResponse
+from api.dependencies import get_user_service, page_cursor
+from api.encoders import Encoder, json_response
+from api.metrics import phase
+from api.streaming import ndjson_response, wants_ndjson
+from repository.pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
 from service.user_service import UserService
 
 
@@ -28,16 +32,49 @@ async def create_user(
             detail=str(e)
         )
 
+@router.post(
+    "/batch",
+    response_model=List[UserResponse],
+    status_code=status.HTTP_201_CREATED,
+    summary="Создать пользователей пакетом"
+)
+async def create_users_batch(
+    batch: UserBatchCreate,
+    user_service: Annotated[UserService, Depends(get_user_service)]
+):
+    """Создать пользователей одной транзакцией; ответ - в порядке запроса, с id"""
+    try:
+        return await user_service.create_users([u.username for u in batch.users])
+    except ValueError as e:
+        from fastapi import HTTPException
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+
 @router.get(
     "/",
-    response_model=List[UserResponse],
-    summary="Получить всех пользователей"
+    response_model=PageResponse[UserResponse],
+    summary="Получить пользователей постранично"
 )
 async def get_all_users(
-    user_service: Annotated[UserService, Depends(get_user_service)]
+    request: Request,
+    user_service: Annotated[UserService, Depends(get_user_service)],
+    after_id: Annotated[Optional[int], Depends(page_cursor)],
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE, description="Размер страницы")
 ):
-    """Получить список всех пользователей"""
-    return await user_service.find_all()
+    """Получить пользователей в порядке id; следующая страница - по next_cursor.
+
+    С Accept: application/x-ndjson - все пользователи после курсора потоком,
+    по одному на строку (limit не применяется).
+    """
+    if wants_ndjson(request):
+        return ndjson_response(lambda repos: repos.users.stream_all(after_id), Encoder.user)
+    with phase("service"):
+        page = await user_service.find_page(limit, after_id)
+    with phase("serialize"):
+        encoder = Encoder()
+        return json_response(encoder.page(page, encoder.user))
 
 @router.get(
     "/{user_id}",
@@ -50,10 +87,13 @@ async def get_user(
 ):
     """Получить информацию о пользователе по ID"""
     try:
-        return await user_service.find_by_id(user_id)
+        with phase("service"):
+            user = await user_service.find_by_id(user_id)
     except LookupError:
         from fastapi import HTTPException
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Пользователь не найден"
         )
+    with phase("serialize"):
+        return json_response(Encoder().user(user))
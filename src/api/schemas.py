@@ -1,6 +1,11 @@
 from datetime import datetime
-from typing import List, Optional
-from pydantic import BaseModel, ConfigDict
+from typing import Generic, List, Literal, Optional, TypeVar
+from pydantic import BaseModel, ConfigDict, Field
+
+T = TypeVar("T")
+
+# Максимальный размер пакета в batch-эндпоинтах
+MAX_BATCH_SIZE = 1000
 
 
 class UserBase(BaseModel):
@@ -9,6 +14,9 @@ class UserBase(BaseModel):
 class UserCreate(UserBase):
     pass
 
+class UserBatchCreate(BaseModel):
+    users: List[UserCreate] = Field(..., min_length=1, max_length=MAX_BATCH_SIZE)
+
 class UserResponse(UserBase):
     id: int
     created_date: datetime
@@ -22,10 +30,17 @@ class PostBase(BaseModel):
 class PostCreate(PostBase):
     pass
 
+class PostBatchItem(PostBase):
+    username: str
+
+class PostBatchCreate(BaseModel):
+    posts: List[PostBatchItem] = Field(..., min_length=1, max_length=MAX_BATCH_SIZE)
+
 class PostResponse(PostBase):
     id: int
     author: UserResponse
     created_at: datetime
+    comment_count: int = 0
     
     model_config = ConfigDict(from_attributes=True)
 
@@ -38,11 +53,32 @@ class CommentCreate(CommentBase):
 class CommentReplyCreate(CommentBase):
     pass
 
+class CommentBatchItem(CommentBase):
+    username: str
+    parent_index: Optional[int] = Field(
+        None, description="Позиция родителя среди предыдущих элементов пакета"
+    )
+    parent_id: Optional[int] = Field(None, description="id уже существующего родителя")
+
+class CommentBatchCreate(BaseModel):
+    comments: List[CommentBatchItem] = Field(..., min_length=1, max_length=MAX_BATCH_SIZE)
+
+class CommentFlatResponse(CommentBase):
+    """Комментарий без вложенных ответов: связь только через parent_id."""
+    id: int
+    author: UserResponse
+    parent_id: Optional[int] = None
+    created_at: datetime
+    reply_count: int = 0
+
+    model_config = ConfigDict(from_attributes=True)
+
 class CommentResponse(CommentBase):
     id: int
     author: UserResponse
     parent_id: Optional[int] = None
     created_at: datetime
+    reply_count: int = 0
     replies: List["CommentResponse"] = []
     
     model_config = ConfigDict(from_attributes=True)
@@ -52,3 +88,22 @@ CommentResponse.model_rebuild()
 
 class CommentTreeResponse(BaseModel):
     comments: List[CommentResponse]
+
+
+class SearchHitResponse(BaseModel):
+    """Результат поиска: snippet - HTML-экранированный фрагмент текста с совпадениями в <b>...</b>."""
+    kind: Literal["post", "comment"]
+    id: int
+    post_id: int
+    rank: float
+    snippet: str
+
+    model_config = ConfigDict(from_attributes=True)
+
+
+class PageResponse(BaseModel, Generic[T]):
+    """Страница keyset-пагинации: next_cursor передаётся в параметр after."""
+    items: List[T]
+    next_cursor: Optional[str] = None
+
+    model_config = ConfigDict(from_attributes=True)
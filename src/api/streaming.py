@@ -0,0 +1,59 @@
+from typing import Any, AsyncIterator, Callable
+
+from fastapi import Request
+from fastapi.responses import StreamingResponse
+
+from api.dependencies import open_repository
+from api.encoders import Encoder
+from repository.repository import Repository
+
+
+NDJSON = "application/x-ndjson"
+# Строки копятся до этого размера и уходят клиенту одним куском
+FLUSH_BYTES = 64 * 1024
+
+
+def wants_ndjson(request: Request) -> bool:
+    return NDJSON in request.headers.get("accept", "")
+
+
+def stream_response(
+    chunks: Callable[[Repository], AsyncIterator[str]],
+    media_type: str,
+    headers: dict[str, str] | None = None,
+) -> StreamingResponse:
+    """Потоковый ответ из текстовых кусков chunks(repos), склеенных до FLUSH_BYTES.
+
+    chunks(repos) выполняется в собственной единице работы внутри генератора
+    тела ответа: соединение занято, пока идёт передача, и освобождается сразу
+    после неё. Ошибка посреди передачи обрывает поток - статус к этому моменту
+    уже отправлен.
+    """
+    async def body() -> AsyncIterator[bytes]:
+        async with open_repository() as repos:
+            buffer = bytearray()
+            async for chunk in chunks(repos):
+                buffer += chunk.encode()
+                if len(buffer) >= FLUSH_BYTES:
+                    yield bytes(buffer)
+                    buffer.clear()
+            if buffer:
+                yield bytes(buffer)
+
+    return StreamingResponse(body(), media_type=media_type, headers=headers)
+
+
+def ndjson_response(
+    items: Callable[[Repository], AsyncIterator],
+    encode_item: Callable[[Encoder, Any], str],
+) -> StreamingResponse:
+    """Потоковый ответ: по одному JSON-объекту на строку (encode_item - метод Encoder).
+
+    items(repos) - асинхронный итератор репозитория (stream_*), см. stream_response.
+    """
+    async def lines(repos: Repository) -> AsyncIterator[str]:
+        encoder = Encoder()
+        async for item in items(repos):
+            yield encode_item(encoder, item) + "\n"
+
+    return stream_response(lines, NDJSON)
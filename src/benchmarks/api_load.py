@@ -0,0 +1,287 @@
+"""Сквозная нагрузка на API: задержки p50/p95/p99 и пропускная способность по маршрутам.
+
+Приложение из api.py запускается в том же процессе (httpx.ASGITransport, с lifespan)
+на временной SQLite-базе, заполненной benchmarks/dataset.py. Остальные настройки
+берутся из окружения как обычно (COMMENT_WRITE_QUEUE, SQLITE_* и т.д.).
+
+Запуск из src/:
+    python -m benchmarks.api_load [--requests 200] [--concurrency 16] [--output result.json]
+    python -m benchmarks.api_load --baseline result.json [--tolerance 0.25]
+
+Результат - JSON (в stdout или в --output). С --baseline маршруты, у которых p95
+вырос больше чем на tolerance (и больше чем на --noise-ms), печатаются как
+регрессии, а код выхода - 1.
+"""
+import argparse
+import asyncio
+import importlib.util
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from dataclasses import asdict, dataclass
+from datetime import datetime, timezone
+from pathlib import Path
+from types import ModuleType
+from typing import Any, Callable
+
+import httpx
+
+from benchmarks.dataset import Dataset, DatasetShape, generate, text
+
+
+SRC = Path(__file__).resolve().parent.parent
+
+
+@dataclass(frozen=True)
+class Scenario:
+    """Один вид запроса; name - маршрут, в квадратных скобках - вариант данных."""
+    name: str
+    build: Callable[[random.Random, Dataset], dict[str, Any]]
+
+
+def _get(url: str, **kwargs: Any) -> dict[str, Any]:
+    return {"method": "GET", "url": url, **kwargs}
+
+
+def _post(url: str, **kwargs: Any) -> dict[str, Any]:
+    return {"method": "POST", "url": url, **kwargs}
+
+
+def _comment_batch(rng: random.Random, data: Dataset) -> dict[str, Any]:
+    items = []
+    for i in range(10):
+        item = {"text": text(rng), "username": rng.choice(data.usernames)}
+        if i and i % 2:
+            item["parent_index"] = rng.randrange(i)
+        items.append(item)
+    return _post(f"/comments/post/{rng.choice(data.post_ids)}/batch", json={"comments": items})
+
+
+SCENARIOS: list[Scenario] = [
+    Scenario("POST /users/", lambda rng, d: _post(
+        "/users/", json={"username": d.unique("load")})),
+    Scenario("POST /users/batch", lambda rng, d: _post(
+        "/users/batch", json={"users": [{"username": d.unique("load")} for _ in range(10)]})),
+    Scenario("GET /users/", lambda rng, d: _get("/users/", params={"limit": 50})),
+    Scenario("GET /users/{user_id}", lambda rng, d: _get(f"/users/{rng.choice(d.user_ids)}")),
+
+    Scenario("POST /posts/", lambda rng, d: _post(
+        "/posts/",
+        params={"username": rng.choice(d.usernames)},
+        json={"title": text(rng, 4), "content": text(rng, 40)})),
+    Scenario("POST /posts/batch", lambda rng, d: _post(
+        "/posts/batch",
+        json={"posts": [
+            {"title": text(rng, 4), "content": text(rng, 40), "username": rng.choice(d.usernames)}
+            for _ in range(10)
+        ]})),
+    Scenario("GET /posts/", lambda rng, d: _get("/posts/", params={"limit": 50})),
+    Scenario("GET /posts/{post_id}", lambda rng, d: _get(f"/posts/{rng.choice(d.post_ids)}")),
+    Scenario("GET /posts/author/{username}", lambda rng, d: _get(
+        f"/posts/author/{rng.choice(d.usernames)}")),
+    Scenario("GET /posts/export", lambda rng, d: _get("/posts/export")),
+    Scenario("GET /posts/export [csv]", lambda rng, d: _get("/posts/export", params={"format": "csv"})),
+    Scenario("GET /posts/{post_id}/export", lambda rng, d: _get(
+        f"/posts/{rng.choice(d.post_ids)}/export")),
+    Scenario("GET /posts/{post_id}/export [wide]", lambda rng, d: _get(
+        f"/posts/{d.wide_post_id}/export")),
+    Scenario("GET /posts/{post_id}/export [deep, csv]", lambda rng, d: _get(
+        f"/posts/{d.deep_post_id}/export", params={"format": "csv"})),
+
+    Scenario("POST /comments/post/{post_id}", lambda rng, d: _post(
+        f"/comments/post/{rng.choice(d.post_ids)}",
+        params={"username": rng.choice(d.usernames)},
+        json={"text": text(rng)})),
+    Scenario("POST /comments/post/{post_id}/batch", _comment_batch),
+    Scenario("POST /comments/{comment_id}/reply", lambda rng, d: _post(
+        f"/comments/{rng.choice(d.comment_ids)}/reply",
+        params={"username": rng.choice(d.usernames)},
+        json={"text": text(rng)})),
+    Scenario("GET /comments/post/{post_id}", lambda rng, d: _get(
+        f"/comments/post/{rng.choice(d.post_ids)}")),
+    Scenario("GET /comments/post/{post_id} [wide]", lambda rng, d: _get(
+        f"/comments/post/{d.wide_post_id}", params={"limit": 100})),
+    Scenario("GET /comments/post/{post_id} [wide, flat, depth 1]", lambda rng, d: _get(
+        f"/comments/post/{d.wide_post_id}", params={"limit": 100, "mode": "flat", "max_depth": 1})),
+    Scenario("GET /comments/post/{post_id} [deep]", lambda rng, d: _get(
+        f"/comments/post/{d.deep_post_id}")),
+    Scenario("GET /comments/post/{post_id} [wide, ndjson]", lambda rng, d: _get(
+        f"/comments/post/{d.wide_post_id}", headers={"Accept": "application/x-ndjson"})),
+    Scenario("GET /comments/{comment_id}/thread [deep]", lambda rng, d: _get(
+        f"/comments/{d.deep_root_id}/thread")),
+    Scenario("GET /comments/{comment_id}", lambda rng, d: _get(
+        f"/comments/{rng.choice(d.comment_ids)}")),
+
+    Scenario("GET /search", lambda rng, d: _get(
+        "/search", params={"q": " ".join(rng.sample(["пост", "кэш", "индекс", "sqlite", "cache"], 2))})),
+]
+
+
+def load_app(database_url: str) -> ModuleType:
+    """Импорт api.py с нужной базой (модуль api перекрыт пакетом api/)."""
+    os.environ["DATABASE_URL"] = database_url
+    spec = importlib.util.spec_from_file_location("commenthub_app", SRC / "api.py")
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def _percentile(values: list[float], q: int) -> float:
+    if len(values) == 1:
+        return values[0]
+    return statistics.quantiles(values, n=100, method="inclusive")[q - 1]
+
+
+async def run_scenario(
+    client: httpx.AsyncClient,
+    scenario: Scenario,
+    data: Dataset,
+    requests: int,
+    concurrency: int,
+    warmup: int,
+    seed: int,
+) -> dict[str, Any]:
+    rng = random.Random(seed)
+    for _ in range(warmup):
+        await client.request(**scenario.build(rng, data))
+
+    latencies: list[float] = []
+    statuses: dict[str, int] = {}
+    remaining = iter(range(requests))
+
+    async def worker() -> None:
+        for _ in remaining:
+            request = scenario.build(rng, data)
+            started = time.perf_counter()
+            response = await client.request(**request)
+            await response.aread()
+            latencies.append(time.perf_counter() - started)
+            key = str(response.status_code)
+            statuses[key] = statuses.get(key, 0) + 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(min(concurrency, requests))))
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "requests": len(latencies),
+        "errors": sum(n for code, n in statuses.items() if int(code) >= 400),
+        "status": statuses,
+        "rps": round(len(latencies) / elapsed, 1),
+        "mean_ms": round(1000 * statistics.fmean(latencies), 2),
+        "p50_ms": round(1000 * _percentile(latencies, 50), 2),
+        "p95_ms": round(1000 * _percentile(latencies, 95), 2),
+        "p99_ms": round(1000 * _percentile(latencies, 99), 2),
+        "max_ms": round(1000 * latencies[-1], 2),
+    }
+
+
+def _git_revision() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=SRC, capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def run(args: argparse.Namespace, shape: DatasetShape) -> dict[str, Any]:
+    scenarios = [s for s in SCENARIOS if not args.only or any(f in s.name for f in args.only)]
+    with tempfile.TemporaryDirectory() as tmp:
+        module = load_app(f"sqlite+aiosqlite:///{os.path.join(tmp, 'load.db')}")
+        app = module.app
+        from api.dependencies import open_repository  # после load_app: настройки уже из окружения
+
+        async with app.router.lifespan_context(app):
+            started = time.perf_counter()
+            async with open_repository() as repos:
+                data = await generate(repos, shape)
+            generated = time.perf_counter() - started
+
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://loadtest") as client:
+                routes = {}
+                for index, scenario in enumerate(scenarios):
+                    routes[scenario.name] = await run_scenario(
+                        client, scenario, data, args.requests, args.concurrency,
+                        args.warmup, shape.seed + index,
+                    )
+                    print(f"{scenario.name:55} {routes[scenario.name]['p95_ms']:>9} ms p95", file=sys.stderr)
+
+    return {
+        "meta": {
+            "revision": _git_revision(),
+            "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+            "warmup": args.warmup,
+            "dataset": asdict(shape),
+            "dataset_seconds": round(generated, 2),
+            "env": {k: v for k, v in os.environ.items() if k.startswith(("SQLITE_", "COMMENT_"))},
+        },
+        "routes": routes,
+    }
+
+
+def compare(baseline: dict, current: dict, tolerance: float, noise_ms: float) -> list[str]:
+    """Маршруты, у которых p95 вырос сверх допуска относительно baseline."""
+    regressions = []
+    for name, result in current["routes"].items():
+        before = baseline.get("routes", {}).get(name)
+        if before is None:
+            continue
+        old, new = before["p95_ms"], result["p95_ms"]
+        if new > old * (1 + tolerance) and new - old > noise_ms:
+            regressions.append(f"{name}: p95 {old} -> {new} ms (+{100 * (new - old) / old:.0f}%)")
+        if result["errors"] > before["errors"]:
+            regressions.append(f"{name}: ошибок {before['errors']} -> {result['errors']}")
+    return regressions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=200, help="запросов на маршрут")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--warmup", type=int, default=5, help="неучитываемых запросов на маршрут")
+    parser.add_argument("--only", action="append", help="подстрока имени маршрута (можно несколько)")
+    parser.add_argument("--users", type=int, default=DatasetShape.users)
+    parser.add_argument("--posts", type=int, default=DatasetShape.posts)
+    parser.add_argument("--comments", type=int, default=DatasetShape.comments_per_post, help="на обычный пост")
+    parser.add_argument("--wide", type=int, default=DatasetShape.wide_roots, help="корней у широкого поста")
+    parser.add_argument("--depth", type=int, default=DatasetShape.deep_depth, help="глубина глубокого поста")
+    parser.add_argument("--seed", type=int, default=DatasetShape.seed)
+    parser.add_argument("--output", type=Path, help="файл для JSON (иначе stdout)")
+    parser.add_argument("--baseline", type=Path, help="JSON прошлого запуска для сравнения")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="допустимый рост p95 (доля)")
+    parser.add_argument("--noise-ms", type=float, default=1.0, help="рост p95 меньше этого не считается")
+    args = parser.parse_args()
+
+    shape = DatasetShape(args.users, args.posts, args.comments, args.wide, args.depth, args.seed)
+    result = asyncio.run(run(args, shape))
+
+    encoded = json.dumps(result, ensure_ascii=False, indent=2)
+    if args.output:
+        args.output.write_text(encoded + "\n", encoding="utf-8")
+    else:
+        print(encoded)
+
+    if args.baseline:
+        baseline = json.loads(args.baseline.read_text(encoding="utf-8"))
+        regressions = compare(baseline, result, args.tolerance, args.noise_ms)
+        for line in regressions:
+            print(f"РЕГРЕССИЯ {line}", file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""Генератор наборов данных для нагрузочных замеров.
+
+Пользователи, посты и комментарии трёх видов: обычные посты с небольшими
+деревьями, один «широкий» пост (много корневых комментариев) и один
+«глубокий» (длинная цепочка ответов). Запись идёт через репозитории пакетами
+save_many, так что дерево путей и счётчики заполняются как в приложении.
+"""
+import itertools
+import random
+from dataclasses import dataclass, field
+
+from domain.comment import Comment
+from domain.post import Post
+from domain.user import User
+from repository.repository import Repository
+
+
+WORDS = (
+    "комментарий", "пост", "поиск", "дерево", "ответ", "запрос", "кэш", "индекс",
+    "база", "очередь", "поток", "страница", "курсор", "профиль", "сервер",
+    "python", "sqlite", "fastapi", "latency", "benchmark", "cache", "index",
+)
+CHUNK_SIZE = 500
+
+
+@dataclass
+class DatasetShape:
+    users: int = 200
+    posts: int = 100
+    comments_per_post: int = 20
+    wide_roots: int = 2000
+    deep_depth: int = 300
+    seed: int = 1
+
+
+@dataclass
+class Dataset:
+    """Что создано генератором: по этим id сценарии строят запросы."""
+    usernames: list[str]
+    user_ids: list[int]
+    post_ids: list[int]
+    comment_ids: list[int]
+    wide_post_id: int
+    deep_post_id: int
+    deep_root_id: int
+    _sequence: itertools.count = field(default_factory=itertools.count, repr=False)
+
+    def unique(self, prefix: str) -> str:
+        """Новое уникальное имя (для создания пользователей во время замера)."""
+        return f"{prefix}_{next(self._sequence)}"
+
+
+def text(rng: random.Random, words: int = 8) -> str:
+    return " ".join(rng.choices(WORDS, k=words))
+
+
+async def _save_comments(repos: Repository, comments: list[Comment]) -> None:
+    for start in range(0, len(comments), CHUNK_SIZE):
+        await repos.comments.save_many(comments[start:start + CHUNK_SIZE])
+        await repos.commit()
+
+
+async def generate(repos: Repository, shape: DatasetShape) -> Dataset:
+    rng = random.Random(shape.seed)
+
+    users = [User(f"user_{i}") for i in range(shape.users)]
+    await repos.users.save_many(users)
+    await repos.commit()
+
+    posts = [
+        Post(text(rng, 4), text(rng, 40), rng.choice(users))
+        for _ in range(shape.posts + 2)
+    ]
+    await repos.posts.save_many(posts)
+    await repos.commit()
+    *regular, wide, deep = posts
+
+    comment_ids: list[int] = []
+    for post in regular:
+        comments: list[Comment] = []
+        for i in range(shape.comments_per_post):
+            author = rng.choice(users)
+            if comments and i % 3:
+                comments.append(Comment.reply_to(rng.choice(comments), text(rng), author))
+            else:
+                comments.append(Comment.for_post(post, text(rng), author))
+        await _save_comments(repos, comments)
+        comment_ids.extend(c.id for c in comments)
+
+    roots = [Comment.for_post(wide, text(rng), rng.choice(users)) for _ in range(shape.wide_roots)]
+    await _save_comments(repos, roots)
+
+    chain = [Comment.for_post(deep, text(rng), rng.choice(users))]
+    for _ in range(shape.deep_depth - 1):
+        chain.append(Comment.reply_to(chain[-1], text(rng), rng.choice(users)))
+    await _save_comments(repos, chain)
+
+    return Dataset(
+        usernames=[u.username for u in users],
+        user_ids=[u.id for u in users],
+        post_ids=[p.id for p in regular],
+        comment_ids=comment_ids,
+        wide_post_id=wide.id,
+        deep_post_id=deep.id,
+        deep_root_id=chain[0].id,
+    )
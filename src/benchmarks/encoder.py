@@ -0,0 +1,86 @@
+"""Сериализация ответов: pydantic (response_model/from_attributes) против api/encoders.py.
+
+Запуск из src/:  python -m benchmarks.encoder [--comments 20000] [--repeat 5]
+"""
+import argparse
+import random
+import time
+from datetime import datetime, timedelta
+
+from api.encoders import Encoder
+from api.schemas import CommentFlatResponse, CommentResponse, PageResponse, PostResponse
+from domain.comment import Comment
+from domain.post import Post
+from domain.user import User
+from repository.pagination import Page
+
+
+def build_tree(comments: int, users: int = 50, seed: int = 1) -> tuple[Post, list[Comment]]:
+    """Пост и дерево комментариев в памяти; у каждого пятого комментария нет родителя."""
+    rng = random.Random(seed)
+    start = datetime(2024, 1, 1)
+    authors = [User(f"пользователь_{i}", start, id=i + 1) for i in range(users)]
+    post = Post("Заголовок", "Текст поста", authors[0], start, id=1)
+    items: list[Comment] = []
+    for i in range(comments):
+        parent = rng.choice(items) if items and i % 5 else None
+        items.append(Comment(
+            post=post,
+            author=rng.choice(authors),
+            text=f"Комментарий №{i} \"в кавычках\"",
+            parent=parent,
+            created_at=start + timedelta(seconds=i, microseconds=i % 1000),
+            id=i + 1,
+        ))
+    return post, items
+
+
+def _best(fn, repeat: int) -> tuple[float, str]:
+    best = float("inf")
+    result = ""
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - started)
+    return best, result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--comments", type=int, default=20000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    post, comments = build_tree(args.comments)
+    tree = Page(items=[c for c in comments if c.parent is None], next_cursor="eyJpZCI6IDF9")
+    flat = Page(items=comments)
+    posts = [post] * 1000
+
+    cases = {
+        "comments tree": (
+            lambda: PageResponse[CommentResponse].model_validate(tree).model_dump_json(),
+            lambda: (lambda e: e.page(tree, e.comment))(Encoder()),
+        ),
+        "comments flat": (
+            lambda: PageResponse[CommentFlatResponse].model_validate(flat).model_dump_json(),
+            lambda: (lambda e: e.page(flat, e.comment_flat))(Encoder()),
+        ),
+        "posts x1000": (
+            lambda: "[" + ",".join(PostResponse.model_validate(p).model_dump_json() for p in posts) + "]",
+            lambda: (lambda e: e.items(posts, e.post))(Encoder()),
+        ),
+    }
+    print(f"{'':14} {'pydantic, ms':>13} {'encoder, ms':>12} {'speedup':>8}")
+    for name, (pydantic_fn, encoder_fn) in cases.items():
+        pydantic_time, expected = _best(pydantic_fn, args.repeat)
+        encoder_time, actual = _best(encoder_fn, args.repeat)
+        if actual != expected:
+            raise SystemExit(f"{name}: вывод кодировщика отличается от pydantic")
+        print(
+            f"{name:14} {1000 * pydantic_time:13.1f} {1000 * encoder_time:12.1f} "
+            f"{pydantic_time / encoder_time:7.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
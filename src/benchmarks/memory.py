@@ -0,0 +1,86 @@
+"""Память дерева комментариев, собранного CommentRepository.find_by_post.
+
+Запуск из src/:  python -m benchmarks.memory [--comments 100000]
+"""
+import argparse
+import asyncio
+import gc
+import os
+import random
+import tempfile
+import time
+import tracemalloc
+
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from repository.engine import create_engine
+from repository.migrations import migrate
+from repository.repository import Repository
+from service.comment_service import CommentService, NewComment
+from service.post_service import PostService
+from service.user_service import UserService
+
+
+CHUNK = 1000
+
+
+async def _populate(session_factory, comments: int, users: int, seed: int = 1) -> None:
+    rng = random.Random(seed)
+    usernames = [f"user{i}" for i in range(users)]
+    async with Repository(session_factory) as repos:
+        await UserService(repos).create_users(usernames)
+        await PostService(repos).create_post(usernames[0], "Большое обсуждение", "текст")
+        for start in range(0, comments, CHUNK):
+            size = min(CHUNK, comments - start)
+            items = [
+                NewComment(
+                    rng.choice(usernames),
+                    f"комментарий {start + i}",
+                    parent_index=rng.randrange(i) if i and i % 5 else None,
+                )
+                for i in range(size)
+            ]
+            await CommentService(repos).add_comments_to_post(1, items)
+
+
+async def run(comments: int, users: int) -> dict:
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(f"sqlite+aiosqlite:///{os.path.join(tmp, 'bench.db')}", echo=False)
+        session_factory = async_sessionmaker(engine, expire_on_commit=False)
+        try:
+            await migrate(engine)
+            await _populate(session_factory, comments, users)
+
+            async with Repository(session_factory) as repos:
+                post = await repos.posts.find_by_id(1)
+                gc.collect()
+                tracemalloc.start()
+                started = time.perf_counter()
+                tree = await repos.comments.find_by_post(1, post=post)
+                elapsed = time.perf_counter() - started
+                gc.collect()
+                retained, peak = tracemalloc.get_traced_memory()
+                tracemalloc.stop()
+                assert len(tree) == comments
+        finally:
+            await engine.dispose()
+
+    return {
+        "comments": comments,
+        "retained_mb": round(retained / 2**20, 1),
+        "peak_mb": round(peak / 2**20, 1),
+        "bytes_per_comment": round(retained / comments),
+        "load_seconds_traced": round(elapsed, 2),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--comments", type=int, default=100_000)
+    parser.add_argument("--users", type=int, default=500)
+    args = parser.parse_args()
+    print(asyncio.run(run(args.comments, args.users)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+"""Смешанная нагрузка чтение/запись на SQLite: без профиля PRAGMA, с ним и с отдельным писателем.
+
+Запуск из src/:  python -m benchmarks.sqlite_profile [--seconds 5] [--writers 4] [--readers 16]
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import tempfile
+import time
+
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from repository.engine import create_engine, sqlite_pragmas
+from repository.migrations import migrate
+from repository.repository import Repository
+from service.comment_service import CommentService
+from service.post_service import PostService
+from service.user_service import UserService
+
+
+async def _prepare(factories, posts: int) -> None:
+    async with Repository(*factories) as repos:
+        await UserService(repos).create_user("bench")
+        for i in range(posts):
+            await PostService(repos).create_post("bench", f"post {i}", "content")
+
+
+async def _writer(factories, posts: int, deadline: float, stats: dict) -> None:
+    i = 0
+    while time.perf_counter() < deadline:
+        i += 1
+        async with Repository(*factories) as repos:
+            await CommentService(repos).add_comment_to_post(i % posts + 1, "bench", f"comment {i}")
+        stats["writes"] += 1
+
+
+async def _reader(factories, posts: int, deadline: float, stats: dict) -> None:
+    i = 0
+    while time.perf_counter() < deadline:
+        i += 1
+        started = time.perf_counter()
+        async with Repository(*factories) as repos:
+            await CommentService(repos).get_comments_page(i % posts + 1, 50)
+        stats["read_latency"].append(time.perf_counter() - started)
+
+
+async def run(
+    pragmas: dict,
+    split: bool,
+    seconds: float,
+    writers: int,
+    readers: int,
+    posts: int,
+) -> dict:
+    with tempfile.TemporaryDirectory() as tmp:
+        url = f"sqlite+aiosqlite:///{os.path.join(tmp, 'bench.db')}"
+        if split:
+            # Как repository.engine.create_engines, но с явным профилем
+            write_engine = create_engine(url, echo=False, pragmas=pragmas, pool_size=1, max_overflow=0)
+            read_engine = create_engine(
+                url, echo=False, pragmas=pragmas, read_only=True, pool_size=readers, max_overflow=0
+            )
+        else:
+            write_engine = read_engine = create_engine(
+                url, echo=False, pragmas=pragmas, pool_size=writers + readers
+            )
+        read_factory = async_sessionmaker(read_engine, expire_on_commit=False)
+        write_factory = (
+            async_sessionmaker(write_engine, expire_on_commit=False) if split else read_factory
+        )
+        factories = (read_factory, None, write_factory)
+        try:
+            await migrate(write_engine)
+            await _prepare(factories, posts)
+
+            stats = {"writes": 0, "read_latency": []}
+            deadline = time.perf_counter() + seconds
+            results = await asyncio.gather(
+                *(_writer(factories, posts, deadline, stats) for _ in range(writers)),
+                *(_reader(factories, posts, deadline, stats) for _ in range(readers)),
+                return_exceptions=True,
+            )
+        finally:
+            await write_engine.dispose()
+            if read_engine is not write_engine:
+                await read_engine.dispose()
+
+    errors = [r for r in results if isinstance(r, Exception)]
+    latency = sorted(stats["read_latency"])
+    percentiles = statistics.quantiles(latency, n=100) if len(latency) > 1 else [0.0] * 99
+    return {
+        "writes_per_sec": round(stats["writes"] / seconds, 1),
+        "reads_per_sec": round(len(latency) / seconds, 1),
+        "read_p50_ms": round(1000 * percentiles[49], 1),
+        "read_p99_ms": round(1000 * percentiles[98], 1),
+        "failed_workers": len(errors),
+        "first_error": repr(errors[0]) if errors else None,
+    }
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--seconds", type=float, default=5.0)
+    parser.add_argument("--writers", type=int, default=4)
+    parser.add_argument("--readers", type=int, default=16)
+    parser.add_argument("--posts", type=int, default=20)
+    args = parser.parse_args()
+
+    variants = {
+        "default": ({}, False),
+        "profile": (sqlite_pragmas(), False),
+        "split": (sqlite_pragmas(), True),
+    }
+    for name, (pragmas, split) in variants.items():
+        result = await run(pragmas, split, args.seconds, args.writers, args.readers, args.posts)
+        print(f"{name:8} {pragmas}{' + отдельный писатель' if split else ''}")
+        print(f"         {result}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
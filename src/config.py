@@ -4,5 +4,35 @@ from typing import Optional
 class Settings:
     DATABASE_URL: str = os.getenv("DATABASE_URL", "sqlite+aiosqlite:///./commenthub.db")
     DEBUG: bool = os.getenv("DEBUG", "False").lower() == "true"
+    # Кэш username -> User (см. repository/cache.py)
+    USERNAME_CACHE_SIZE: int = int(os.getenv("USERNAME_CACHE_SIZE", "10000"))
+    USERNAME_CACHE_TTL: float = float(os.getenv("USERNAME_CACHE_TTL", "300"))
+    # Кэш деревьев комментариев: суммарное число узлов во всех постах
+    COMMENT_TREE_CACHE_NODES: int = int(os.getenv("COMMENT_TREE_CACHE_NODES", "200000"))
+    # Групповая фиксация комментариев (repository/write_queue.py)
+    COMMENT_WRITE_QUEUE: bool = os.getenv("COMMENT_WRITE_QUEUE", "False").lower() == "true"
+    COMMENT_WRITE_BATCH: int = int(os.getenv("COMMENT_WRITE_BATCH", "100"))
+    COMMENT_WRITE_DELAY_MS: float = float(os.getenv("COMMENT_WRITE_DELAY_MS", "5"))
+    # Профиль SQLite: PRAGMA на каждое новое соединение (repository/engine.py).
+    # Пустое значение - оставить настройку SQLite по умолчанию.
+    SQLITE_JOURNAL_MODE: str = os.getenv("SQLITE_JOURNAL_MODE", "WAL")
+    SQLITE_SYNCHRONOUS: str = os.getenv("SQLITE_SYNCHRONOUS", "NORMAL")
+    SQLITE_CACHE_SIZE: str = os.getenv("SQLITE_CACHE_SIZE", "-65536")  # < 0 - в КиБ
+    SQLITE_MMAP_SIZE: str = os.getenv("SQLITE_MMAP_SIZE", "268435456")
+    SQLITE_BUSY_TIMEOUT_MS: str = os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000")
+    SQLITE_TEMP_STORE: str = os.getenv("SQLITE_TEMP_STORE", "MEMORY")
+    # Пул соединений только для чтения при одном соединении-писателе; 0 - общий движок
+    SQLITE_READ_POOL_SIZE: int = int(os.getenv("SQLITE_READ_POOL_SIZE", "8"))
+    # Счётчики запросов к БД и гистограммы по маршрутам для /metrics (api/metrics.py)
+    METRICS_ENABLED: bool = os.getenv("METRICS_ENABLED", "True").lower() == "true"
+    # Журнал медленных запросов (repository/slow_queries.py): порог в мс, 0 - выключен.
+    # Работает вместе с метриками: нужен для маршрута запроса.
+    SLOW_QUERY_MS: float = float(os.getenv("SLOW_QUERY_MS", "100"))
+    SLOW_QUERY_MAX_SHAPES: int = int(os.getenv("SLOW_QUERY_MAX_SHAPES", "500"))
+    # Импорт JSONL из CLI (service/import_service.py): записей в одной транзакции
+    IMPORT_CHUNK_SIZE: int = int(os.getenv("IMPORT_CHUNK_SIZE", "1000"))
+    # Режим скрипта CLI (main.py --script): записей в одной транзакции и одновременных чтений
+    SCRIPT_TRANSACTION_SIZE: int = int(os.getenv("SCRIPT_TRANSACTION_SIZE", "1000"))
+    SCRIPT_READ_CONCURRENCY: int = int(os.getenv("SCRIPT_READ_CONCURRENCY", "4"))
 
 settings = Settings()
@@ -9,6 +9,13 @@ from domain.user import User
 
 
 class Comment:
+    # Слоты вместо __dict__: деревья на сотни тысяч комментариев заметно компактнее.
+    # Поля с дескрипторами хранятся в слотах _post, _author, _text.
+    # У листьев replies - общий пустой кортеж, список заводится первым add_reply.
+    __slots__ = (
+        "id", "_post", "_author", "_text", "parent", "replies", "created_at", "reply_count"
+    )
+
     post = NonNull("пост не может быть пустым")
     author = NonNull("автор не может быть пустым")
     text = NonEmptyString("текст комментария не может быть пустым")
@@ -20,15 +27,18 @@ class Comment:
         text: str,
         parent: Comment | None = None,
         created_at: datetime | None = None,
-        id: int | None = None
+        id: int | None = None,
+        reply_count: int = 0
     ) -> None:
         self.id = id
         self.post = post
         self.author = author
         self.parent = parent
         self.text = text
-        self.replies: List[Comment] = []
+        self.replies: List[Comment] | tuple[()] = ()
         self.created_at = created_at or datetime.now()
+        # Число прямых ответов в БД (replies может быть загружен не полностью)
+        self.reply_count = reply_count
         if parent is not None:
             parent.add_reply(self)
 
@@ -54,7 +64,10 @@ class Comment:
 
     def add_reply(self, reply: Comment) -> None:
         if reply is not None:
-            self.replies.append(reply)
+            if self.replies:
+                self.replies.append(reply)
+            else:
+                self.replies = [reply]
 
     def is_reply(self) -> bool:
         return self.parent is not None
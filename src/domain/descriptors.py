@@ -1,43 +1,54 @@
-class NonEmptyString:
-    """Дескриптор для непустых строковых полей."""
+from types import MemberDescriptorType
+
+
+class _Field:
+    """Общая часть дескрипторов: значение хранится в атрибуте _name.
+
+    Если у класса есть слот _name (__slots__), дескриптор работает напрямую
+    с дескриптором этого слота, без поиска атрибута по имени.
+    """
 
     def __init__(self, message: str) -> None:
         self.message = message
         self.private_name: str | None = None
+        self._slot: MemberDescriptorType | None = None
 
     def __set_name__(self, owner, name) -> None:
         self.private_name = f"_{name}"
+        slot = owner.__dict__.get(self.private_name)
+        if isinstance(slot, MemberDescriptorType):
+            self._slot = slot
 
     def __get__(self, instance, owner):
         if instance is None:
             return self
+        if self._slot is not None:
+            return self._slot.__get__(instance, owner)
         return getattr(instance, self.private_name)
 
+    def _store(self, instance, value) -> None:
+        if self._slot is not None:
+            self._slot.__set__(instance, value)
+        else:
+            setattr(instance, self.private_name, value)
+
+
+class NonEmptyString(_Field):
+    """Дескриптор для непустых строковых полей."""
+
     def __set__(self, instance, value) -> None:
         if not isinstance(value, str) or not value:
             raise ValueError(self.message)
-        setattr(instance, self.private_name, value)
+        self._store(instance, value)
 
 
-class NonNull:
+class NonNull(_Field):
     """Дескриптор для полей, которые не могут быть пустыми."""
 
-    def __init__(self, message: str) -> None:
-        self.message = message
-        self.private_name: str | None = None
-
-    def __set_name__(self, owner, name) -> None:
-        self.private_name = f"_{name}"
-
-    def __get__(self, instance, owner):
-        if instance is None:
-            return self
-        return getattr(instance, self.private_name)
-
     def __set__(self, instance, value) -> None:
         if value is None:
             raise ValueError(self.message)
-        setattr(instance, self.private_name, value)
+        self._store(instance, value)
 
 
 class _IdProtectedMeta(type):
@@ -5,6 +5,8 @@ from domain.user import User
 
 
 class Post:
+    __slots__ = ("id", "_title", "_content", "_author", "created_at", "comment_count")
+
     title = NonEmptyString("заголовок поста не может быть пустым")
     content = NonEmptyString("пост не может быть пустым")
     author = NonNull("автор не может быть пустым")
@@ -15,10 +17,12 @@ class Post:
         content: str,
         author: User,
         created_at: datetime | None = None,
-        id: int | None = None
+        id: int | None = None,
+        comment_count: int = 0
     ) -> None:
         self.id = id
         self.title = title
         self.content = content
         self.author = author
         self.created_at = created_at or datetime.now()
+        self.comment_count = comment_count
@@ -4,6 +4,8 @@ from domain.descriptors import NonEmptyString
 
 
 class User:
+    __slots__ = ("id", "_username", "created_date")
+
     username = NonEmptyString("имя юзера не может быть пустым")
 
     def __init__(self, username: str, created_date: datetime | None = None, id: int | None = None) -> None:
@@ -1,17 +1,49 @@
 import asyncio
+import io
+import os
 import shlex
+import sys
+import time
+from contextlib import nullcontext
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import Iterable
 
-from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
 
 from repository.repository import Repository
-from repository.tables import metadata
+from config import settings
+from repository.cache import LRUCache
+from repository.engine import create_engine
+from repository.migrations import migrate
 from service.comment_service import CommentService
+from service.export_service import ExportService, ExportStats
+from service.import_service import ImportStats, ImportService
 from service.post_service import PostService
 from service.user_service import UserService
 
 
 DATABASE_URL = "sqlite+aiosqlite:///./commenthub.db"
 
+# (команда, подкоманда) -> (вид, минимум слов). Вид задаёт выполнение в режиме
+# скрипта: write - в общей транзакции с соседними записями, read - параллельно
+# с соседними чтениями, single - отдельно от всех.
+COMMANDS: dict[tuple[str, str | None], tuple[str, int]] = {
+    ("help", None): ("read", 1),
+    ("user", "add"): ("write", 3),
+    ("user", "list"): ("read", 2),
+    ("post", "add"): ("write", 5),
+    ("post", "list"): ("read", 2),
+    ("comment", "add"): ("write", 5),
+    ("comment", "reply"): ("write", 5),
+    ("comment", "list"): ("read", 3),
+    ("repair", "counters"): ("write", 2),
+    ("search", None): ("read", 2),
+    ("import", None): ("single", 2),
+    ("export", None): ("single", 2),
+    ("quit", None): ("quit", 1),
+}
+
 
 def print_help() -> None:
     print(
@@ -23,121 +55,470 @@ def print_help() -> None:
         "  comment add <post_id> <username> <text>\n"
         "  comment reply <comment_id> <username> <text>\n"
         "  comment list <post_id>\n"
+        "  repair counters\n"
+        "  search <запрос>\n"
+        "  import <file.jsonl> [размер_пакета]\n"
+        "  export <file.jsonl|file.csv|-> [post_id]\n"
         "  help\n"
         "  quit\n"
+        "\n"
+        "Любую команду можно выполнить без интерактивного режима: python main.py <команда>\n"
+        "Скрипт (по команде на строку, # - комментарий): python main.py --script <файл|->\n"
+        "или команды на stdin: python main.py < commands.txt\n"
     )
 
 
-async def cli() -> None:
-    engine = create_async_engine(DATABASE_URL, echo=False)
-    session_factory = async_sessionmaker(engine, expire_on_commit=False)
+def print_import_progress(stats: ImportStats) -> None:
+    print(
+        f"  строк: {stats.started_line + stats.lines}, пользователей: {stats.users}, "
+        f"постов: {stats.posts}, комментариев: {stats.comments} "
+        f"({stats.rows_per_second:.0f} записей/с)"
+    )
+
 
-    async with engine.begin() as conn:
-        await conn.run_sync(metadata.create_all)
+async def execute(parts: list[str], repos: Repository) -> bool:
+    """Выполнить одну команду в текущей единице работы; False - пора выходить.
 
-    repos = Repository(session_factory)
+    Ошибки команды пробрасываются наружу.
+    """
     user_service = UserService(repos)
     post_service = PostService(repos)
     comment_service = CommentService(repos)
-
-    print("Простой CLI для CommentHub. Используй 'help' для подсказки.")
-
-    while True:
+    cmd = parts[0].lower()
+
+    if cmd == "quit":
+        return False
+
+    if cmd == "help":
+        print_help()
+
+    elif cmd == "user" and len(parts) >= 2:
+        sub = parts[1]
+
+        if sub == "add" and len(parts) >= 3:
+            user = await user_service.create_user(parts[2])
+            print(f"Создан пользователь: id={user.id}, username={user.username}")
+
+        elif sub == "list":
+            users = await user_service.find_all()
+            for u in users:
+                print(f"{u.id}: {u.username} (created={u.created_date})")
+
+        else:
+            print("Неправильная user-команда.")
+
+    elif cmd == "post" and len(parts) >= 2:
+        sub = parts[1]
+
+        if sub == "add" and len(parts) >= 5:
+            username = parts[2]
+            title = parts[3]
+            content = " ".join(parts[4:])
+            post = await post_service.create_post(username, title, content)
+            print(
+                f"Опубликован пост: id={post.id}, title={post.title}, "
+                f"author={post.author.username}"
+            )
+
+        elif sub == "list":
+            posts = await repos.posts.find_all()
+            for p in posts:
+                print(f"{p.id}: {p.title} by {p.author.username} (комментариев: {p.comment_count})")
+
+        else:
+            print("Неправильная post-команда.")
+
+    elif cmd == "comment" and len(parts) >= 2:
+        sub = parts[1]
+
+        if sub == "add" and len(parts) >= 5:
+            post_id = int(parts[2])
+            username = parts[3]
+            text = " ".join(parts[4:])
+            c = await comment_service.add_comment_to_post(post_id, username, text)
+            print(f"Создан комментарий: id={c.id} к посту {post_id}")
+
+        elif sub == "reply" and len(parts) >= 5:
+            comment_id = int(parts[2])
+            username = parts[3]
+            text = " ".join(parts[4:])
+            c = await comment_service.reply_to_comment(comment_id, username, text)
+            print(f"Создан ответ: id={c.id} к комментарию {comment_id}")
+
+        elif sub == "list" and len(parts) >= 3:
+            post_id = int(parts[2])
+            comments = await comment_service.get_comments_for_post(post_id)
+            for c in comments:
+                prefix = f"{c.id} (post {c.post.id})"
+                if c.parent:
+                    prefix += f" reply_to={c.parent.id}"
+                print(f"{prefix}: {c.author.username} -> {c.text}")
+
+        else:
+            print("Неправильная comment-команда.")
+
+    elif cmd == "search" and len(parts) >= 2:
+        page = await repos.search.search(" ".join(parts[1:]), 20, as_html=False)
+        if not page.items:
+            print("Ничего не найдено.")
+        for hit in page.items:
+            where = f"пост {hit.id}" if hit.kind == "post" else f"комментарий {hit.id} (пост {hit.post_id})"
+            print(f"{where}: {hit.snippet}")
+
+    elif cmd == "repair" and len(parts) >= 2 and parts[1] == "counters":
+        posts_fixed, comments_fixed = await repos.comments.repair_counters()
+        await repos.commit()
+        print(
+            f"Счётчики пересчитаны: постов исправлено {posts_fixed}, "
+            f"комментариев исправлено {comments_fixed}"
+        )
+
+    elif cmd == "import" and len(parts) >= 2:
+        chunk_size = int(parts[2]) if len(parts) >= 3 else settings.IMPORT_CHUNK_SIZE
+        importer = ImportService(repos, chunk_size)
         try:
-            raw = input("> ").strip()
-        except (EOFError, KeyboardInterrupt):
-            print()
+            stats = await importer.import_jsonl(parts[1], print_import_progress)
+        except ValueError as exc:
+            # Всё до последнего зафиксированного пакета уже сохранено
+            print(f"Ошибка: {exc}")
+            print("После исправления файла повторный запуск продолжит с последнего пакета.")
+            return True
+        if stats.started_line:
+            print(f"Продолжение со строки {stats.started_line + 1}.")
+        print(
+            f"Импортировано за {stats.seconds:.1f} с: пользователей {stats.users} "
+            f"(уже были: {stats.users_skipped}), постов {stats.posts}, "
+            f"комментариев {stats.comments}; {stats.rows_per_second:.0f} записей/с"
+        )
+
+    elif cmd == "export" and len(parts) >= 2:
+        target = parts[1]
+        post_id = int(parts[2]) if len(parts) >= 3 else None
+        if post_id is not None and await repos.posts.get_version(post_id) is None:
+            print("Пост не найден.")
+            return True
+        # Формат - по расширению; "-" - JSONL в stdout (отчёт тогда в stderr)
+        fmt = "csv" if target.lower().endswith(".csv") else "jsonl"
+        stats = ExportStats()
+        started = time.perf_counter()
+        out = nullcontext(sys.stdout) if target == "-" else open(target, "w", encoding="utf-8", newline="")
+        with out as file:
+            async for chunk in ExportService(repos).export(fmt, post_id, stats):
+                file.write(chunk)
+        print(
+            f"Выгружено за {time.perf_counter() - started:.1f} с: пользователей {stats.users}, "
+            f"постов {stats.posts}, комментариев {stats.comments}",
+            file=sys.stderr if target == "-" else sys.stdout,
+        )
+
+    else:
+        print("Неизвестная команда, попробуй 'help'.")
+
+    return True
+
+
+async def run_command(parts: list[str], repos: Repository) -> bool:
+    """Выполнить одну команду отдельной единицей работы; False - пора выходить."""
+    try:
+        return await execute(parts, repos)
+    except Exception as exc:
+        print(f"Ошибка: {exc}")
+        return True
+    finally:
+        await repos.close()
+
+
+def command_kind(parts: list[str]) -> str | None:
+    """Вид команды из COMMANDS; None - неизвестная команда или мало аргументов."""
+    sub = parts[1] if len(parts) >= 2 else None
+    spec = COMMANDS.get((parts[0].lower(), sub)) or COMMANDS.get((parts[0].lower(), None))
+    if spec is None or len(parts) < spec[1]:
+        return None
+    return spec[0]
+
+
+@dataclass
+class ScriptCommand:
+    line: int
+    parts: list[str]
+    kind: str
+
+
+def parse_script(lines: Iterable[str]) -> tuple[list[ScriptCommand], list[str]]:
+    """Команды скрипта (до quit) и ошибки разбора с номерами строк."""
+    commands: list[ScriptCommand] = []
+    errors: list[str] = []
+    for number, raw in enumerate(lines, 1):
+        raw = raw.strip()
+        if not raw or raw.startswith("#"):
+            continue
+        try:
+            parts = shlex.split(raw)
+        except ValueError as exc:
+            errors.append(f"строка {number}: {exc}")
+            continue
+        kind = command_kind(parts)
+        if kind is None:
+            errors.append(f"строка {number}: неизвестная команда или не хватает аргументов: {raw}")
+        elif kind == "quit":
             break
+        else:
+            commands.append(ScriptCommand(number, parts, kind))
+    return commands, errors
+
+
+def plan_script(commands: list[ScriptCommand], max_writes: int) -> list[list[ScriptCommand]]:
+    """Группы подряд идущих записей (не больше max_writes) и подряд идущих чтений.
+
+    Порядок групп - порядок скрипта: чтение после записи видит её результат.
+    """
+    groups: list[list[ScriptCommand]] = []
+    for command in commands:
+        last = groups[-1] if groups else None
+        if (
+            last is not None
+            and command.kind != "single"
+            and last[0].kind == command.kind
+            and (command.kind == "read" or len(last) < max_writes)
+        ):
+            last.append(command)
+        else:
+            groups.append([command])
+    return groups
+
+
+# Буфер вывода текущей задачи чтения (см. _TaskStdout)
+_output: ContextVar[io.StringIO | None] = ContextVar("script_output", default=None)
+
+
+class _TaskStdout:
+    """stdout на время скрипта: параллельные чтения пишут каждое в свой буфер,
+    который потом выводится в порядке скрипта."""
+
+    def __init__(self, stream) -> None:
+        self.stream = stream
+
+    def write(self, text: str) -> int:
+        buffer = _output.get()
+        return (self.stream if buffer is None else buffer).write(text)
+
+    def __getattr__(self, name: str):
+        return getattr(self.stream, name)
+
+
+@dataclass
+class ScriptStats:
+    commands: int = 0
+    errors: int = 0
+    writes: int = 0
+    transactions: int = 0
+    write_seconds: float = 0.0
+    reads: int = 0
+    read_groups: int = 0
+    read_seconds: float = 0.0
+    singles: int = 0
+    single_seconds: float = 0.0
+    seconds: float = 0.0
+
+
+class ScriptRunner:
+    """Выполнение разобранного скрипта группами из plan_script.
+
+    Записи группы идут одной транзакцией, каждая команда - в своём SAVEPOINT:
+    ошибка откатывает только её. Чтения группы выполняются одновременно
+    (не больше concurrency), каждое в своей единице работы.
+    """
+
+    def __init__(
+        self,
+        session_factory: async_sessionmaker[AsyncSession],
+        username_cache: LRUCache,
+        max_writes: int = settings.SCRIPT_TRANSACTION_SIZE,
+        concurrency: int = settings.SCRIPT_READ_CONCURRENCY,
+    ) -> None:
+        self.session_factory = session_factory
+        self.username_cache = username_cache
+        self.max_writes = max_writes
+        self.concurrency = max(1, concurrency)
+        self.stats = ScriptStats()
+
+    def _repository(self) -> Repository:
+        return Repository(self.session_factory, self.username_cache)
+
+    async def run(self, commands: list[ScriptCommand]) -> ScriptStats:
+        started = time.perf_counter()
+        stdout, sys.stdout = sys.stdout, _TaskStdout(sys.stdout)
+        try:
+            for group in plan_script(commands, self.max_writes):
+                if group[0].kind == "write":
+                    await self._run_writes(group)
+                elif group[0].kind == "read":
+                    await self._run_reads(group)
+                else:
+                    await self._run_single(group[0])
+        finally:
+            sys.stdout = stdout
+        self.stats.commands = len(commands)
+        self.stats.seconds = time.perf_counter() - started
+        return self.stats
+
+    @staticmethod
+    def _report(command: ScriptCommand, exc: Exception) -> None:
+        print(f"строка {command.line}: Ошибка: {exc}")
+
+    async def _run_writes(self, group: list[ScriptCommand]) -> None:
+        repos = self._repository()
+        started = time.perf_counter()
+        failed = 0
+        try:
+            async with repos.transaction():
+                for command in group:
+                    try:
+                        async with repos.savepoint():
+                            await execute(command.parts, repos)
+                    except Exception as exc:
+                        self._report(command, exc)
+                        failed += 1
+        except Exception as exc:
+            print(f"строки {group[0].line}-{group[-1].line}: транзакция не зафиксирована: {exc}")
+            failed = len(group)
+        finally:
+            await repos.close()
+        self.stats.writes += len(group)
+        self.stats.transactions += 1
+        self.stats.errors += failed
+        self.stats.write_seconds += time.perf_counter() - started
+
+    async def _run_reads(self, group: list[ScriptCommand]) -> None:
+        limit = asyncio.Semaphore(self.concurrency)
+
+        async def run(command: ScriptCommand) -> tuple[str, bool]:
+            async with limit:
+                buffer = io.StringIO()
+                _output.set(buffer)
+                ok = await self._execute(command)
+                return buffer.getvalue(), ok
+
+        started = time.perf_counter()
+        results = await asyncio.gather(*(run(command) for command in group))
+        for text, ok in results:
+            sys.stdout.write(text)
+            self.stats.errors += not ok
+        self.stats.reads += len(group)
+        self.stats.read_groups += 1
+        self.stats.read_seconds += time.perf_counter() - started
+
+    async def _run_single(self, command: ScriptCommand) -> None:
+        started = time.perf_counter()
+        self.stats.errors += not await self._execute(command)
+        self.stats.singles += 1
+        self.stats.single_seconds += time.perf_counter() - started
+
+    async def _execute(self, command: ScriptCommand) -> bool:
+        """Команда отдельной единицей работы; False - ошибка."""
+        repos = self._repository()
+        try:
+            await execute(command.parts, repos)
+            return True
+        except Exception as exc:
+            self._report(command, exc)
+            return False
+        finally:
+            await repos.close()
 
-        if not raw:
-            continue
 
-        parts = shlex.split(raw)
-        cmd = parts[0].lower()
+def print_script_stats(stats: ScriptStats) -> None:
+    print(
+        f"Скрипт: команд {stats.commands}, ошибок {stats.errors}, {stats.seconds:.2f} с\n"
+        f"  запись: команд {stats.writes}, транзакций {stats.transactions}, {stats.write_seconds:.2f} с\n"
+        f"  чтение: команд {stats.reads}, параллельных групп {stats.read_groups}, {stats.read_seconds:.2f} с\n"
+        f"  import/export: команд {stats.singles}, {stats.single_seconds:.2f} с",
+        file=sys.stderr,
+    )
 
-        try:
-            if cmd == "quit":
-                break
 
-            if cmd == "help":
-                print_help()
+async def run_script(path: str, session_factory: async_sessionmaker[AsyncSession], username_cache: LRUCache) -> int:
+    """Скрипт из файла (или stdin для "-"); код выхода: 0, 1 - были ошибки команд,
+    2 - ошибки разбора (тогда не выполняется ничего)."""
+    if path == "-":
+        commands, errors = parse_script(sys.stdin)
+    else:
+        with open(path, encoding="utf-8") as file:
+            commands, errors = parse_script(file)
+    if errors:
+        for error in errors:
+            print(error, file=sys.stderr)
+        print("Скрипт не выполнен.", file=sys.stderr)
+        return 2
+
+    stats = await ScriptRunner(session_factory, username_cache).run(commands)
+    print_script_stats(stats)
+    return 1 if stats.errors else 0
+
+
+async def cli(command: list[str] | None = None, script: str | None = None) -> int:
+    """Интерактивный режим, одна команда (command) или скрипт (script); код выхода."""
+    engine = create_engine(DATABASE_URL, echo=False)
+    session_factory = async_sessionmaker(engine, expire_on_commit=False)
 
-            elif cmd == "user" and len(parts) >= 2:
-                sub = parts[1]
+    await migrate(engine)
 
-                if sub == "add" and len(parts) >= 3:
-                    user = await user_service.create_user(parts[2])
-                    print(f"Создан пользователь: id={user.id}, username={user.username}")
+    username_cache = LRUCache(settings.USERNAME_CACHE_SIZE, settings.USERNAME_CACHE_TTL)
+    repos = Repository(session_factory, username_cache)
 
-                elif sub == "list":
-                    users = await user_service.find_all()
-                    for u in users:
-                        print(f"{u.id}: {u.username} (created={u.created_date})")
+    if script is not None:
+        try:
+            return await run_script(script, session_factory, username_cache)
+        finally:
+            await engine.dispose()
 
-                else:
-                    print("Неправильная user-команда.")
-
-            elif cmd == "post" and len(parts) >= 2:
-                sub = parts[1]
-
-                if sub == "add" and len(parts) >= 5:
-                    username = parts[2]
-                    title = parts[3]
-                    content = " ".join(parts[4:])
-                    post = await post_service.create_post(username, title, content)
-                    print(
-                        f"Опубликован пост: id={post.id}, title={post.title}, "
-                        f"author={post.author.username}"
-                    )
-
-                elif sub == "list":
-                    posts = await repos.posts.find_all()
-                    for p in posts:
-                        print(f"{p.id}: {p.title} by {p.author.username}")
+    if command:
+        await run_command(command, repos)
+        await engine.dispose()
+        return 0
 
-                else:
-                    print("Неправильная post-команда.")
-
-            elif cmd == "comment" and len(parts) >= 2:
-                sub = parts[1]
-
-                if sub == "add" and len(parts) >= 5:
-                    post_id = int(parts[2])
-                    username = parts[3]
-                    text = " ".join(parts[4:])
-                    c = await comment_service.add_comment_to_post(post_id, username, text)
-                    print(f"Создан комментарий: id={c.id} к посту {post_id}")
-
-                elif sub == "reply" and len(parts) >= 5:
-                    comment_id = int(parts[2])
-                    username = parts[3]
-                    text = " ".join(parts[4:])
-                    c = await comment_service.reply_to_comment(comment_id, username, text)
-                    print(f"Создан ответ: id={c.id} к комментарию {comment_id}")
-
-                elif sub == "list" and len(parts) >= 3:
-                    post_id = int(parts[2])
-                    comments = await comment_service.get_comments_for_post(post_id)
-                    for c in comments:
-                        prefix = f"{c.id} (post {c.post.id})"
-                        if c.parent:
-                            prefix += f" reply_to={c.parent.id}"
-                        print(f"{prefix}: {c.author.username} -> {c.text}")
+    print("Простой CLI для CommentHub. Используй 'help' для подсказки.")
 
-                else:
-                    print("Неправильная comment-команда.")
+    while True:
+        try:
+            raw = input("> ").strip()
+        except (EOFError, KeyboardInterrupt):
+            print()
+            break
 
-            else:
-                print("Неизвестная команда, попробуй 'help'.")
+        if not raw:
+            continue
 
-        except Exception as exc:
-            print(f"Ошибка: {exc}")
+        try:
+            parts = shlex.split(raw)
+        except ValueError as exc:
+            print(f"Ошибка разбора: {exc}")
+            continue
+        if not await run_command(parts, repos):
+            break
 
     await engine.dispose()
+    return 0
 
 
 def main() -> None:
-    asyncio.run(cli())
+    args = sys.argv[1:]
+    script = None
+    if args and args[0] == "--script":
+        if len(args) != 2:
+            print("Использование: python main.py --script <файл|->", file=sys.stderr)
+            sys.exit(2)
+        script = args[1]
+    elif not args and not sys.stdin.isatty():
+        # Команды переданы через pipe - выполнить их как скрипт
+        script = "-"
+    try:
+        sys.exit(asyncio.run(cli(args, script)))
+    except BrokenPipeError:
+        # Читатель вывода закрылся раньше времени (| head): незафиксированное уже
+        # откатилось, остаётся не дать интерпретатору снова писать в закрытый pipe
+        os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+        sys.exit(1)
 
 
 if __name__ == "__main__":
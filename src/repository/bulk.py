@@ -0,0 +1,18 @@
+from sqlalchemy import Table, insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+
+async def insert_returning_ids(session: AsyncSession, table: Table, rows: list[dict]) -> list[int]:
+    """Многострочный INSERT ... RETURNING id; id возвращаются в порядке rows.
+
+    SQLAlchemy собирает rows в INSERT с несколькими VALUES (страницами по 1000).
+    Порядок строк RETURNING СУБД не гарантирует, а сортировка id неверна, если
+    они заданы явно или не монотонны: sort_by_parameter_order=True поручает
+    SQLAlchemy сопоставить строки RETURNING с параметрами (по колонке
+    tables.SENTINEL, иначе в SQLite INSERT выполнялся бы построчно).
+    """
+    if not rows:
+        return []
+    stmt = insert(table).returning(table.c.id, sort_by_parameter_order=True)
+    result = await session.execute(stmt, rows)
+    return [int(row_id) for row_id in result.scalars().all()]
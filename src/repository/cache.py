@@ -0,0 +1,260 @@
+import bisect
+import time
+from collections import OrderedDict
+from typing import Generic, Hashable, TypeVar
+
+from domain.comment import Comment
+from domain.post import Post
+from repository.pagination import Page, encode_cursor
+
+
+K = TypeVar("K", bound=Hashable)
+V = TypeVar("V")
+
+
+class LRUCache(Generic[K, V]):
+    """Ограниченный кэш процесса с вытеснением LRU и временем жизни записей.
+
+    ttl - секунды (None - без ограничения). Счётчики hits/misses/evictions
+    доступны через stats().
+    """
+
+    def __init__(self, maxsize: int, ttl: float | None = None) -> None:
+        if maxsize <= 0:
+            raise ValueError("размер кэша должен быть положительным")
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._data: OrderedDict[K, tuple[V, float]] = OrderedDict()
+
+    def get(self, key: K) -> V | None:
+        entry = self._data.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        value, expires_at = entry
+        if expires_at < time.monotonic():
+            del self._data[key]
+            self.misses += 1
+            return None
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def put(self, key: K, value: V) -> None:
+        expires_at = time.monotonic() + self.ttl if self.ttl is not None else float("inf")
+        self._data[key] = (value, expires_at)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate(self, key: K) -> None:
+        self._data.pop(key, None)
+
+    def clear(self) -> None:
+        self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+
+class CommentTree:
+    """Собранное дерево комментариев поста: корни по id и индекс узлов.
+
+    version - posts.version, которой соответствует дерево; растёт вместе
+    с версией в БД на каждый добавленный через add комментарий.
+    """
+
+    def __init__(self, post: Post, comments: list[Comment], version: int = 0) -> None:
+        self.post = post
+        self.version = version
+        self.by_id: dict[int, Comment] = {c.id: c for c in comments}
+        self.roots: list[Comment] = [c for c in comments if c.parent is None]
+        self.roots.sort(key=lambda c: c.id)
+        self.root_ids: list[int] = [c.id for c in self.roots]
+
+    def __len__(self) -> int:
+        return len(self.by_id)
+
+    def insert(self, comment: Comment) -> None:
+        """Добавляет уже привязанный к родителю узел, сохраняя порядок по id."""
+        self.by_id[comment.id] = comment
+        if comment.parent is None:
+            index = bisect.bisect_right(self.root_ids, comment.id)
+            self.root_ids.insert(index, comment.id)
+            self.roots.insert(index, comment)
+            return
+        siblings = comment.parent.replies
+        if len(siblings) > 1 and siblings[-2].id > comment.id:
+            siblings.sort(key=lambda c: c.id)
+
+    def page(self, limit: int, after_id: int | None = None, roots_only: bool = False) -> Page[Comment]:
+        """Та же страница, что CommentRepository.find_page_by_post, но из памяти."""
+        start = 0 if after_id is None else bisect.bisect_right(self.root_ids, after_id)
+        roots = self.roots[start:start + limit + 1]
+        next_cursor = None
+        if len(roots) > limit:
+            roots = roots[:limit]
+            next_cursor = encode_cursor(roots[-1].id)
+        if roots_only:
+            return Page(items=roots, next_cursor=next_cursor)
+
+        # Плоский список в порядке обхода дерева, как при сортировке по path
+        items: list[Comment] = []
+        stack = list(reversed(roots))
+        while stack:
+            comment = stack.pop()
+            items.append(comment)
+            stack.extend(reversed(comment.replies))
+        return Page(items=items, next_cursor=next_cursor)
+
+
+class CommentTreeCache:
+    """Кэш процесса с деревьями комментариев популярных постов.
+
+    Ограничен суммарным числом узлов, при переполнении вытесняются посты,
+    которые дольше всего не читали. Новые комментарии добавляются в дерево
+    инкрементально (add) после успешного commit.
+
+    Записи других процессов (CLI, импорт) кэш не видит: читатель сверяет
+    CommentTree.version с версией поста в БД (см. CommentService).
+
+    Чтение дерева из БД идёт между start_load и put: если за это время
+    в пост добавили комментарий, загруженный снимок может быть неполным
+    и в кэш не кладётся. Между begin_write и end_write (пока фиксируется
+    транзакция с новым комментарием) дерево поста из кэша не отдаётся.
+    """
+
+    def __init__(self, max_nodes: int) -> None:
+        if max_nodes <= 0:
+            raise ValueError("размер кэша должен быть положительным")
+        self.max_nodes = max_nodes
+        self.nodes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._trees: OrderedDict[int, CommentTree] = OrderedDict()
+        # Счётчики записей для постов, которые сейчас в кэше или загружаются
+        self._versions: dict[int, int] = {}
+        self._loading: dict[int, int] = {}
+        self._writing: dict[int, int] = {}
+
+    def get(self, post_id: int) -> CommentTree | None:
+        tree = self._trees.get(post_id)
+        if tree is None or post_id in self._writing:
+            self.misses += 1
+            return None
+        self._trees.move_to_end(post_id)
+        self.hits += 1
+        return tree
+
+    def begin_write(self, post_id: int) -> None:
+        self._writing[post_id] = self._writing.get(post_id, 0) + 1
+        if post_id in self._versions:
+            self._versions[post_id] += 1
+
+    def end_write(self, post_id: int) -> None:
+        self._writing[post_id] -= 1
+        if not self._writing[post_id]:
+            del self._writing[post_id]
+
+    def start_load(self, post_id: int) -> int:
+        self._loading[post_id] = self._loading.get(post_id, 0) + 1
+        return self._versions.setdefault(post_id, 0)
+
+    def abort_load(self, post_id: int) -> None:
+        """Завершает start_load без put (например, загрузка упала)."""
+        self._loading[post_id] -= 1
+        if not self._loading[post_id]:
+            del self._loading[post_id]
+        self._forget_version(post_id)
+
+    def put(self, tree: CommentTree, version: int) -> bool:
+        """Кладёт загруженное дерево, если с start_load в пост ничего не писали."""
+        post_id = tree.post.id
+        self._loading[post_id] -= 1
+        if not self._loading[post_id]:
+            del self._loading[post_id]
+
+        fresh = self._versions.get(post_id) == version
+        if not fresh or post_id in self._trees or len(tree) > self.max_nodes:
+            self._forget_version(post_id)
+            return False
+
+        self._trees[post_id] = tree
+        self.nodes += len(tree)
+        self._evict()
+        return True
+
+    def add(self, comment: Comment) -> None:
+        """Добавляет сохранённый комментарий в дерево его поста, если оно в кэше."""
+        post_id = comment.post.id
+        if post_id in self._versions:
+            self._versions[post_id] += 1
+
+        tree = self._trees.get(post_id)
+        if tree is None or comment.id in tree.by_id:
+            return
+
+        parent = None
+        if comment.parent_id is not None:
+            parent = tree.by_id.get(comment.parent_id)
+            if parent is None:
+                self.invalidate(post_id)
+                return
+
+        # Отдельный узел: объект из запроса привязан к родителю из запроса, а не из кэша
+        node = Comment(
+            post=tree.post,
+            author=comment.author,
+            text=comment.text,
+            parent=parent,
+            created_at=comment.created_at,
+            id=comment.id
+        )
+        tree.insert(node)
+        tree.version += 1
+        tree.post.comment_count += 1
+        if parent is not None:
+            parent.reply_count += 1
+        self.nodes += 1
+        self._evict()
+
+    def invalidate(self, post_id: int) -> None:
+        tree = self._trees.pop(post_id, None)
+        if tree is not None:
+            self.nodes -= len(tree)
+        self._forget_version(post_id)
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "posts": len(self._trees),
+            "nodes": self.nodes,
+            "max_nodes": self.max_nodes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+    def _evict(self) -> None:
+        while self.nodes > self.max_nodes and self._trees:
+            post_id, tree = self._trees.popitem(last=False)
+            self.nodes -= len(tree)
+            self.evictions += 1
+            self._forget_version(post_id)
+
+    def _forget_version(self, post_id: int) -> None:
+        if post_id not in self._trees and post_id not in self._loading:
+            self._versions.pop(post_id, None)
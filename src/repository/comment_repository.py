@@ -1,169 +1,351 @@
-from sqlalchemy import select, insert
-from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+from collections import Counter
+from functools import cache
+from typing import AsyncIterator
+
+from sqlalchemy import bindparam, func, select, insert, update
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from domain.comment import Comment
 from domain.post import Post
-from domain.user import User
-from repository.tables import comments as comments_table, posts as posts_table, users as users_table
+from repository.bulk import insert_returning_ids
+from repository.counters import bump_stale_versions, recount_posts, recount_replies
+from repository.hydration import (
+    comment_from_row,
+    comment_tree_from_rows,
+    comment_with_context_from_row,
+    post_from_row,
+    select_comment_with_context,
+    select_comments,
+    select_posts,
+    user_from_row,
+)
+from repository.loader import BatchLoader
+from repository.pagination import STREAM_CHUNK_SIZE, Page, encode_cursor
+from repository.tables import comments as comments_table, posts as posts_table
+from repository.tree_path import SEGMENT_LENGTH, segment, upper_bound
+from repository.unit_of_work import UnitOfWork
 
 
 class CommentRepository:
     """Репозиторий комментариев."""
-    def __init__(self, session_factory: async_sessionmaker[AsyncSession] | None = None) -> None:
-        self.session_factory = session_factory
+    def __init__(self, uow: UnitOfWork | None = None) -> None:
+        self.uow = uow
+        self._batch_loader: BatchLoader[int, Comment] | None = None
+
+    def _session(self, write: bool = False) -> AsyncSession:
+        if self.uow is None:
+            raise RuntimeError("unit of work не инициализирован")
+        return self.uow.session(write)
 
     async def save(self, comment: Comment) -> Comment:
-        if self.session_factory is None:
-            raise RuntimeError("session_factory не инициализирован")
-
-        async with self.session_factory() as session:
-            async with session.begin():
-                stmt = insert(comments_table).values(
-                    post_id=comment.post.id,
-                    author_id=comment.author.id,
-                    parent_id=comment.parent.id if comment.parent is not None else None,
-                    text=comment.text,
-                    created_at=comment.created_at,
-                )
-                result = await session.execute(stmt)
-                comment_id = result.inserted_primary_key[0]
-                comment.id = int(comment_id)
+        session = self._session(write=True)
+        stmt = insert(comments_table).values(
+            post_id=comment.post.id,
+            author_id=comment.author.id,
+            parent_id=comment.parent.id if comment.parent is not None else None,
+            text=comment.text,
+            created_at=comment.created_at,
+        )
+        result = await session.execute(stmt)
+        comment_id = result.inserted_primary_key[0]
+        comment.id = int(comment_id)
+        await self._after_insert(session, [comment])
         return comment
 
-    async def find_by_id(self, id: int) -> Comment | None:
-        if self.session_factory is None:
-            raise RuntimeError("session_factory не инициализирован")
-
-        async with self.session_factory() as session:
-            stmt = select(comments_table).where(comments_table.c.id == id)
-            result = await session.execute(stmt)
-            row = result.mappings().one_or_none()
-            if row is None:
-                return None
-
-            post = await self._load_post(session, row["post_id"])
-            author = await self._load_user(session, row["author_id"])
-
-            parent = None
-            if row["parent_id"] is not None:
-                parent = await self._load_comment_simple(session, row["parent_id"], post)
-
-            comment = Comment(
-                post=post,
-                author=author,
-                text=row["text"],
-                parent=parent,
-                created_at=row["created_at"],
-                id=int(row["id"])
-            )
-            return comment
+    async def save_many(self, comments: list[Comment]) -> list[Comment]:
+        """Вставляет комментарии многострочными INSERT и проставляет id.
 
-    async def find_by_post(self, post_id: int) -> list[Comment]:
-        """Возвращает дерево комментариев к посту (parent/replies)."""
-        if self.session_factory is None:
-            raise RuntimeError("session_factory не инициализирован")
+        Родителем может быть комментарий из этого же списка: вставка идёт
+        по уровням, каждый уровень - один INSERT, после которого у родителей
+        следующего уровня уже есть id.
+        """
+        session = self._session(write=True)
+        pending = list(comments)
+        while pending:
+            level = [c for c in pending if c.parent is None or c.parent.id is not None]
+            if not level:
+                raise ValueError("родительский комментарий не сохранён")
+            rows = [
+                {
+                    "post_id": c.post.id,
+                    "author_id": c.author.id,
+                    "parent_id": c.parent_id,
+                    "text": c.text,
+                    "created_at": c.created_at,
+                }
+                for c in level
+            ]
+            ids = await insert_returning_ids(session, comments_table, rows)
+            for comment, comment_id in zip(level, ids):
+                comment.id = comment_id
+            await self._after_insert(session, level)
+            pending = [c for c in pending if c.id is None]
+        return comments
 
-        async with self.session_factory() as session:
-            post = await self._load_post(session, post_id)
+    async def _after_insert(self, session: AsyncSession, comments: list[Comment]) -> None:
+        """Пути новых комментариев, версии и счётчики постов и родителей - по одному executemany.
 
-            stmt = (
-                select(comments_table)
-                .where(comments_table.c.post_id == post_id)
-                .order_by(comments_table.c.id)
+        Счётчики увеличиваются в той же транзакции, что и вставка, и
+        на загруженных объектах поста и родителя.
+        """
+        await session.execute(
+            self._path_update(),
+            [
+                {"b_id": c.id, "b_parent_id": c.parent_id, "b_segment": segment(c.id)}
+                for c in comments
+            ],
+        )
+        per_post = Counter(c.post.id for c in comments)
+        await session.execute(
+            update(posts_table)
+            .where(posts_table.c.id == bindparam("b_id"))
+            .values(
+                version=posts_table.c.version + bindparam("b_count"),
+                comment_count=posts_table.c.comment_count + bindparam("b_count"),
+            ),
+            [{"b_id": post_id, "b_count": count} for post_id, count in per_post.items()],
+        )
+        per_parent = Counter(c.parent_id for c in comments if c.parent is not None)
+        if per_parent:
+            await session.execute(
+                update(comments_table)
+                .where(comments_table.c.id == bindparam("b_id"))
+                .values(reply_count=comments_table.c.reply_count + bindparam("b_count")),
+                [{"b_id": parent_id, "b_count": count} for parent_id, count in per_parent.items()],
             )
-            result = await session.execute(stmt)
-            rows = result.mappings().all()
-            if not rows:
-                return []
+        for comment in comments:
+            comment.post.comment_count += 1
+            if comment.parent is not None:
+                comment.parent.reply_count += 1
+            self.uow.identity_map.comments[comment.id] = comment
 
-            # Загружаем всех авторов одним запросом
-            user_ids = {row["author_id"] for row in rows}
-            users_map: dict[int, User] = {}
-            if user_ids:
-                users_stmt = select(users_table).where(users_table.c.id.in_(user_ids))
-                user_rows = (await session.execute(users_stmt)).mappings().all()
-                for u_row in user_rows:
-                    user = User(
-                        username=u_row["username"],
-                        created_date=u_row["created_date"],
-                        id=int(u_row["id"])
-                    )
-                    users_map[user.id] = user
-
-            comments_map: dict[int, Comment] = {}
-            comments_list: list[Comment] = []
-
-            for row in rows:
-                author = users_map[row["author_id"]]
-                parent_id = row["parent_id"]
-                parent = comments_map.get(parent_id)
-
-                comment = Comment(
-                    post=post,
-                    author=author,
-                    text=row["text"],
-                    parent=parent,
-                    created_at=row["created_at"],
-                    id=int(row["id"])
-                )
-                comments_map[comment.id] = comment
-                comments_list.append(comment)
-
-            return comments_list
+    async def find_by_id(self, id: int) -> Comment | None:
+        return await self.load(id)
 
-    @staticmethod
-    async def _load_user(session: AsyncSession, user_id: int) -> User:
-        stmt = select(users_table).where(users_table.c.id == user_id)
+    async def load(self, id: int) -> Comment | None:
+        """Комментарий с постом и родителем (ответы не загружаются).
+
+        Берётся из карты идентичности или пакетом вместе с соседними load -
+        один JOIN-запрос на пакет.
+        """
+        return await self._loader().load(id)
+
+    async def load_many(self, ids: list[int]) -> list[Comment | None]:
+        return await self._loader().load_many(ids)
+
+    async def find_by_post(self, post_id: int, post: Post | None = None) -> list[Comment]:
+        """Возвращает дерево комментариев к посту (parent/replies).
+
+        Если пост уже загружен, его можно передать, чтобы не читать повторно.
+        """
+        session = self._session()
+        if post is None:
+            post = await self._load_post(session, post_id)
+            if post is None:
+                return []
+
+        stmt = (
+            select_comments()
+            .where(comments_table.c.post_id == post_id)
+            .order_by(comments_table.c.id)
+        )
         result = await session.execute(stmt)
-        row = result.mappings().one()
-        user = User(
-            username=row["username"],
-            created_date=row["created_date"],
-            id=int(row["id"])
+        return comment_tree_from_rows(
+            result.mappings().all(), post, users_map=self.uow.identity_map.users
         )
-        return user
 
-    @staticmethod
-    async def _load_post(session: AsyncSession, post_id: int) -> Post:
-        stmt = select(posts_table).where(posts_table.c.id == post_id)
-        result = await session.execute(stmt)
-        row = result.mappings().one()
-        # автор поста
-        author_stmt = select(users_table).where(users_table.c.id == row["author_id"])
-        author_result = await session.execute(author_stmt)
-        author_row = author_result.mappings().one()
-        author = User(
-            username=author_row["username"],
-            created_date=author_row["created_date"],
-            id=int(author_row["id"])
+    async def find_page_by_post(
+        self,
+        post_id: int,
+        limit: int,
+        after_id: int | None = None,
+        max_depth: int | None = None,
+        post: Post | None = None,
+    ) -> Page[Comment]:
+        """Keyset-страница корневых комментариев поста вместе с их ответами.
+
+        Курсор указывает на последний корневой комментарий страницы,
+        в items попадают корни страницы и их потомки в порядке обхода дерева
+        (родитель раньше ответов): все или только до уровня max_depth
+        (корни - уровень 1).
+        """
+        session = self._session()
+        if post is None:
+            post = await self._load_post(session, post_id)
+            if post is None:
+                return Page()
+
+        roots_stmt = (
+            select(comments_table.c.id)
+            .where(comments_table.c.post_id == post_id)
+            .where(comments_table.c.parent_id.is_(None))
+            .order_by(comments_table.c.id)
+            .limit(limit + 1)
         )
+        if after_id is not None:
+            roots_stmt = roots_stmt.where(comments_table.c.id > after_id)
+        root_ids = list((await session.execute(roots_stmt)).scalars().all())
+        if not root_ids:
+            return Page()
 
-        post = Post(
-            title=row["title"],
-            content=row["content"],
-            author=author,
-            created_at=row["created_at"],
+        next_cursor = None
+        if len(root_ids) > limit:
+            root_ids = root_ids[:limit]
+            next_cursor = encode_cursor(root_ids[-1])
+
+        # Корни страницы идут подряд по id, значит их поддеревья - один диапазон путей
+        stmt = (
+            select_comments()
+            .where(comments_table.c.post_id == post_id)
+            .where(comments_table.c.path >= segment(root_ids[0]))
+            .where(comments_table.c.path < upper_bound(segment(root_ids[-1])))
+            .order_by(comments_table.c.path)
+        )
+        if max_depth is not None:
+            stmt = stmt.where(func.length(comments_table.c.path) <= max_depth * SEGMENT_LENGTH)
+        rows = (await session.execute(stmt)).mappings().all()
+        items = comment_tree_from_rows(rows, post, users_map=self.uow.identity_map.users)
+        return Page(items=items, next_cursor=next_cursor)
+
+    async def stream_by_post(
+        self,
+        post_id: int,
+        after_id: int | None = None,
+        max_depth: int | None = None,
+        post: Post | None = None,
+    ) -> AsyncIterator[Comment]:
+        """Комментарии поста плоским списком в порядке обхода дерева, по мере чтения курсора.
+
+        after_id - последний уже полученный корень: выдача продолжается со следующего.
+        У каждого комментария проставлен parent, но replies не заполняются:
+        держится только цепочка предков текущей строки, память не растёт с выборкой.
+        """
+        session = self._session()
+        if post is None:
+            post = await self._load_post(session, post_id)
+            if post is None:
+                return
+
+        stmt = (
+            select_comments()
+            .add_columns(comments_table.c.path)
+            .where(comments_table.c.post_id == post_id)
+            .order_by(comments_table.c.path)
+            .execution_options(yield_per=STREAM_CHUNK_SIZE)
+        )
+        if after_id is not None:
+            stmt = stmt.where(comments_table.c.path >= upper_bound(segment(after_id)))
+        if max_depth is not None:
+            stmt = stmt.where(func.length(comments_table.c.path) <= max_depth * SEGMENT_LENGTH)
+
+        ancestors: list[tuple[str, Comment]] = []
+        result = await session.stream(stmt)
+        async for row in result.mappings():
+            path = row["path"]
+            while ancestors and not path.startswith(ancestors[-1][0]):
+                ancestors.pop()
+            comment = comment_from_row(row, post, user_from_row(row, "author__"))
+            # Без add_reply: родитель не должен копить ответы
+            comment.parent = ancestors[-1][1] if ancestors else None
+            ancestors.append((path, comment))
+            yield comment
+
+    async def find_thread(self, comment_id: int, max_depth: int | None = None) -> Comment | None:
+        """Поддерево комментария (сам комментарий и ответы до уровня max_depth).
+
+        Потомки выбираются одним диапазонным запросом по индексу (post_id, path).
+        """
+        session = self._session()
+        root_stmt = (
+            select_comment_with_context()
+            .add_columns(comments_table.c.path)
+            .where(comments_table.c.id == comment_id)
+        )
+        root_row = (await session.execute(root_stmt)).mappings().one_or_none()
+        if root_row is None:
+            return None
+
+        root = self._comment_with_context(root_row)
+        known = {root.parent.id: root.parent} if root.parent is not None else {}
+
+        root_path = root_row["path"]
+        stmt = (
+            select_comments()
+            .where(comments_table.c.post_id == root.post.id)
+            .where(comments_table.c.path >= root_path)
+            .where(comments_table.c.path < upper_bound(root_path))
+            .order_by(comments_table.c.path)
+        )
+        if max_depth is not None:
+            max_length = len(root_path) + (max_depth - 1) * SEGMENT_LENGTH
+            stmt = stmt.where(func.length(comments_table.c.path) <= max_length)
+        rows = (await session.execute(stmt)).mappings().all()
+        comments = comment_tree_from_rows(
+            rows, root.post, known, users_map=self.uow.identity_map.users
         )
-        post.id = int(row["id"])
-        return post
+        return comments[0]
+
+    async def repair_counters(self) -> tuple[int, int]:
+        """Пересчитывает comment_count постов и reply_count комментариев.
+
+        Версия затронутых постов увеличивается (см. bump_stale_versions).
+        Возвращает число исправленных постов и комментариев; фиксирует вызывающий.
+        """
+        session = self._session(write=True)
+        await session.execute(bump_stale_versions())
+        posts_fixed = (await session.execute(recount_posts())).rowcount
+        comments_fixed = (await session.execute(recount_replies())).rowcount
+        self.uow.identity_map.clear()
+        return posts_fixed, comments_fixed
 
     @staticmethod
-    async def _load_comment_simple(
-        session: AsyncSession,
-        comment_id: int,
-        post: Post,
-    ) -> Comment:
-        """Загрузка родительского комментария без его потомков."""
-        stmt = select(comments_table).where(comments_table.c.id == comment_id)
+    @cache
+    def _path_update():
+        """UPDATE, дописывающий к пути родителя (b_parent_id) сегмент комментария b_id.
+
+        Строится один раз: сборка алиаса и подзапроса заметна на каждом save.
+        """
+        parents = comments_table.alias("parent")
+        parent_path = (
+            select(parents.c.path)
+            .where(parents.c.id == bindparam("b_parent_id"))
+            .scalar_subquery()
+        )
+        return (
+            update(comments_table)
+            .where(comments_table.c.id == bindparam("b_id"))
+            .values(path=func.coalesce(parent_path, "") + bindparam("b_segment"))
+        )
+
+    def _loader(self) -> BatchLoader[int, Comment]:
+        if self.uow is None:
+            raise RuntimeError("unit of work не инициализирован")
+        if self._batch_loader is None:
+            self._batch_loader = BatchLoader(
+                self._load_batch, self.uow.identity_map.comments, self.uow.lock
+            )
+        return self._batch_loader
+
+    async def _load_batch(self, ids: list[int]) -> dict[int, Comment]:
+        session = self._session()
+        stmt = select_comment_with_context().where(comments_table.c.id.in_(ids))
         result = await session.execute(stmt)
-        row = result.mappings().one()
-        author = await CommentRepository._load_user(session, row["author_id"])
-        parent = Comment(
-            post=post,
-            author=author,
-            text=row["text"],
-            parent=None,
-            created_at=row["created_at"],
-            id=int(row["id"])
+        comments = [self._comment_with_context(row) for row in result.mappings().all()]
+        return {comment.id: comment for comment in comments}
+
+    def _comment_with_context(self, row) -> Comment:
+        identity_map = self.uow.identity_map
+        return comment_with_context_from_row(
+            row, identity_map.users, identity_map.posts, identity_map.comments
         )
-        return parent
+
+    async def _load_post(self, session: AsyncSession, post_id: int) -> Post | None:
+        identity_map = self.uow.identity_map
+        if post_id in identity_map.posts:
+            return identity_map.posts[post_id]
+        stmt = select_posts().where(posts_table.c.id == post_id)
+        row = (await session.execute(stmt)).mappings().one_or_none()
+        if row is None:
+            return None
+        author = user_from_row(row, "author__", identity_map.users)
+        return post_from_row(row, author, posts_map=identity_map.posts)
@@ -0,0 +1,57 @@
+"""Пересчёт денормализованных счётчиков posts.comment_count и comments.reply_count.
+
+В обычной работе счётчики увеличиваются в CommentRepository при вставке,
+эти запросы нужны для заполнения в миграции и для ремонта (repair counters).
+Обновляются только строки, где счётчик расходится с фактом.
+"""
+from sqlalchemy import Table, Update, func, or_, select, update
+
+from repository.tables import comments, posts
+
+
+def _comment_count():
+    return (
+        select(func.count())
+        .select_from(comments)
+        .where(comments.c.post_id == posts.c.id)
+        .scalar_subquery()
+    )
+
+
+def _reply_count(parent: Table):
+    replies = comments.alias("reply")
+    return (
+        select(func.count())
+        .select_from(replies)
+        .where(replies.c.parent_id == parent.c.id)
+        .scalar_subquery()
+    )
+
+
+def recount_posts() -> Update:
+    actual = _comment_count()
+    return update(posts).where(posts.c.comment_count != actual).values(comment_count=actual)
+
+
+def recount_replies() -> Update:
+    actual = _reply_count(comments)
+    return update(comments).where(comments.c.reply_count != actual).values(reply_count=actual)
+
+
+def bump_stale_versions() -> Update:
+    """Увеличивает version постов, чьи счётчики или счётчики их комментариев разошлись с фактом.
+
+    Выполняется перед recount_*: иначе ETag поста и кэш деревьев (оба по
+    posts.version) продолжали бы отдавать старые значения.
+    """
+    stale = comments.alias("stale")
+    stale_replies = (
+        select(stale.c.id)
+        .where(stale.c.post_id == posts.c.id, stale.c.reply_count != _reply_count(stale))
+        .exists()
+    )
+    return (
+        update(posts)
+        .where(or_(posts.c.comment_count != _comment_count(), stale_replies))
+        .values(version=posts.c.version + 1)
+    )
@@ -0,0 +1,106 @@
+from typing import Any
+
+from sqlalchemy import event, make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+
+from config import Settings, settings as default_settings
+
+
+_CHOICES = {
+    "journal_mode": {"DELETE", "TRUNCATE", "PERSIST", "MEMORY", "WAL", "OFF"},
+    "synchronous": {"OFF", "NORMAL", "FULL", "EXTRA"},
+    "temp_store": {"DEFAULT", "FILE", "MEMORY"},
+}
+
+
+def sqlite_pragmas(config: Settings = default_settings) -> dict[str, str | int]:
+    """PRAGMA профиля SQLite из настроек; пустые значения пропускаются.
+
+    Значения проверяются здесь: PRAGMA не принимает параметры запроса,
+    поэтому они подставляются в текст.
+    """
+    raw = {
+        "journal_mode": config.SQLITE_JOURNAL_MODE,
+        "synchronous": config.SQLITE_SYNCHRONOUS,
+        "cache_size": config.SQLITE_CACHE_SIZE,
+        "mmap_size": config.SQLITE_MMAP_SIZE,
+        "busy_timeout": config.SQLITE_BUSY_TIMEOUT_MS,
+        "temp_store": config.SQLITE_TEMP_STORE,
+    }
+    pragmas: dict[str, str | int] = {}
+    for name, value in raw.items():
+        value = value.strip()
+        if not value:
+            continue
+        if name in _CHOICES:
+            value = value.upper()
+            if value not in _CHOICES[name]:
+                raise ValueError(f"недопустимое значение PRAGMA {name}: {value}")
+            pragmas[name] = value
+        else:
+            try:
+                pragmas[name] = int(value)
+            except ValueError:
+                raise ValueError(f"PRAGMA {name} должна быть целым числом: {value}") from None
+    return pragmas
+
+
+def create_engine(
+    url: str = default_settings.DATABASE_URL,
+    echo: bool = default_settings.DEBUG,
+    pragmas: dict[str, str | int] | None = None,
+    read_only: bool = False,
+    **kwargs: Any,
+) -> AsyncEngine:
+    """Движок приложения; для SQLite на каждое соединение применяется профиль PRAGMA.
+
+    pragmas=None - профиль из настроек, {} - настройки SQLite по умолчанию.
+    read_only - соединения с PRAGMA query_only: запись в них - ошибка SQLite.
+    """
+    engine = create_async_engine(url, echo=echo, **kwargs)
+    if engine.dialect.name != "sqlite":
+        return engine
+
+    if pragmas is None:
+        pragmas = sqlite_pragmas()
+    if read_only:
+        pragmas = {**pragmas, "query_only": "ON"}
+    statements = [f"PRAGMA {name}={value}" for name, value in pragmas.items()]
+
+    @event.listens_for(engine.sync_engine, "connect")
+    def _apply_pragmas(dbapi_connection, connection_record) -> None:
+        cursor = dbapi_connection.cursor()
+        try:
+            for statement in statements:
+                cursor.execute(statement)
+        finally:
+            cursor.close()
+
+    return engine
+
+
+def create_engines(
+    url: str = default_settings.DATABASE_URL,
+    echo: bool = default_settings.DEBUG,
+    read_pool_size: int = default_settings.SQLITE_READ_POOL_SIZE,
+) -> tuple[AsyncEngine, AsyncEngine]:
+    """Пара (читатели, писатель).
+
+    Для файловой SQLite: пул read_pool_size соединений query_only и движок
+    с единственным соединением для записи - записи выстраиваются в очередь
+    пула, а не конкурируют за блокировку БД. В остальных случаях (другая СУБД,
+    :memory:, read_pool_size <= 0) возвращается один и тот же движок дважды.
+    """
+    parsed = make_url(url)
+    if (
+        parsed.get_backend_name() != "sqlite"
+        or read_pool_size <= 0
+        or parsed.database in (None, "", ":memory:")
+    ):
+        engine = create_engine(url, echo=echo)
+        return engine, engine
+    writer = create_engine(url, echo=echo, pool_size=1, max_overflow=0)
+    readers = create_engine(
+        url, echo=echo, read_only=True, pool_size=read_pool_size, max_overflow=0
+    )
+    return readers, writer
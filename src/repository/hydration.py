@@ -0,0 +1,204 @@
+"""Сборка доменных объектов из строк одного JOIN-запроса.
+
+Колонки связанных сущностей выбираются с префиксом (author__id, post__title, ...),
+поэтому пользователь, пост и комментарий читаются из одной строки без
+дополнительных запросов.
+"""
+from sqlalchemy import Select, Table, select
+
+from domain.comment import Comment
+from domain.post import Post
+from domain.user import User
+from repository.tables import comments, posts, users
+
+
+comment_authors = users.alias("comment_author")
+post_authors = users.alias("post_author")
+parents = comments.alias("parent")
+parent_authors = users.alias("parent_author")
+
+
+def user_columns(table: Table = users, prefix: str = "") -> list:
+    return [
+        table.c.id.label(f"{prefix}id"),
+        table.c.username.label(f"{prefix}username"),
+        table.c.created_date.label(f"{prefix}created_date"),
+    ]
+
+
+def post_columns(table: Table = posts, prefix: str = "") -> list:
+    return [
+        table.c.id.label(f"{prefix}id"),
+        table.c.title.label(f"{prefix}title"),
+        table.c.content.label(f"{prefix}content"),
+        table.c.author_id.label(f"{prefix}author_id"),
+        table.c.created_at.label(f"{prefix}created_at"),
+        table.c.comment_count.label(f"{prefix}comment_count"),
+    ]
+
+
+def comment_columns(table: Table = comments, prefix: str = "") -> list:
+    return [
+        table.c.id.label(f"{prefix}id"),
+        table.c.post_id.label(f"{prefix}post_id"),
+        table.c.author_id.label(f"{prefix}author_id"),
+        table.c.parent_id.label(f"{prefix}parent_id"),
+        table.c.text.label(f"{prefix}text"),
+        table.c.created_at.label(f"{prefix}created_at"),
+        table.c.reply_count.label(f"{prefix}reply_count"),
+    ]
+
+
+def select_posts() -> Select:
+    """Посты вместе с авторами (колонки автора - с префиксом author__)."""
+    return select(
+        *post_columns(),
+        *user_columns(post_authors, "author__"),
+    ).join_from(posts, post_authors, posts.c.author_id == post_authors.c.id)
+
+
+def select_comments() -> Select:
+    """Комментарии вместе с авторами (колонки автора - с префиксом author__)."""
+    return select(
+        *comment_columns(),
+        *user_columns(comment_authors, "author__"),
+    ).join_from(comments, comment_authors, comments.c.author_id == comment_authors.c.id)
+
+
+def select_comment_with_context() -> Select:
+    """Комментарий с автором, постом, автором поста и родителем с его автором."""
+    return (
+        select_comments()
+        .add_columns(
+            *post_columns(posts, "post__"),
+            *user_columns(post_authors, "post_author__"),
+            *comment_columns(parents, "parent__"),
+            *user_columns(parent_authors, "parent_author__"),
+        )
+        .join(posts, comments.c.post_id == posts.c.id)
+        .join(post_authors, posts.c.author_id == post_authors.c.id)
+        .outerjoin(parents, comments.c.parent_id == parents.c.id)
+        .outerjoin(parent_authors, parents.c.author_id == parent_authors.c.id)
+    )
+
+
+def user_from_row(row, prefix: str = "", users_map: dict[int, User] | None = None) -> User:
+    """User из строки; users_map позволяет переиспользовать уже собранных авторов."""
+    user_id = int(row[f"{prefix}id"])
+    if users_map is not None and user_id in users_map:
+        return users_map[user_id]
+    user = User(
+        username=row[f"{prefix}username"],
+        created_date=row[f"{prefix}created_date"],
+        id=user_id
+    )
+    if users_map is not None:
+        users_map[user_id] = user
+    return user
+
+
+def post_from_row(
+    row,
+    author: User,
+    prefix: str = "",
+    posts_map: dict[int, Post] | None = None,
+) -> Post:
+    post_id = int(row[f"{prefix}id"])
+    if posts_map is not None and post_id in posts_map:
+        return posts_map[post_id]
+    post = Post(
+        title=row[f"{prefix}title"],
+        content=row[f"{prefix}content"],
+        author=author,
+        created_at=row[f"{prefix}created_at"],
+        id=post_id,
+        comment_count=row[f"{prefix}comment_count"]
+    )
+    if posts_map is not None:
+        posts_map[post_id] = post
+    return post
+
+
+def comment_from_row(
+    row,
+    post: Post,
+    author: User,
+    parent: Comment | None = None,
+    prefix: str = "",
+) -> Comment:
+    return Comment(
+        post=post,
+        author=author,
+        text=row[f"{prefix}text"],
+        parent=parent,
+        created_at=row[f"{prefix}created_at"],
+        id=int(row[f"{prefix}id"]),
+        reply_count=row[f"{prefix}reply_count"]
+    )
+
+
+def posts_from_rows(
+    rows,
+    users_map: dict[int, User] | None = None,
+    posts_map: dict[int, Post] | None = None,
+) -> list[Post]:
+    """Посты из строк select_posts(); одинаковые авторы - один объект User."""
+    users_map = {} if users_map is None else users_map
+    return [
+        post_from_row(row, user_from_row(row, "author__", users_map), posts_map=posts_map)
+        for row in rows
+    ]
+
+
+def comment_tree_from_rows(
+    rows,
+    post: Post,
+    known: dict[int, Comment] | None = None,
+    users_map: dict[int, User] | None = None,
+) -> list[Comment]:
+    """Дерево из строк select_comments(), где родитель идёт раньше своих ответов.
+
+    known - уже загруженные комментарии, к которым можно привязать ответы.
+    Возвращает все комментарии в порядке строк.
+    """
+    users_map = {} if users_map is None else users_map
+    comments_map: dict[int, Comment] = dict(known or {})
+    comments_list: list[Comment] = []
+    for row in rows:
+        author = user_from_row(row, "author__", users_map)
+        comment = comment_from_row(row, post, author, comments_map.get(row["parent_id"]))
+        comments_map[comment.id] = comment
+        comments_list.append(comment)
+    return comments_list
+
+
+def comment_with_context_from_row(
+    row,
+    users_map: dict[int, User] | None = None,
+    posts_map: dict[int, Post] | None = None,
+    comments_map: dict[int, Comment] | None = None,
+) -> Comment:
+    """Комментарий из строки select_comment_with_context().
+
+    Родитель берётся из comments_map, а если его там нет - собирается без
+    своего родителя и ответов и в comments_map не попадает.
+    """
+    users_map = {} if users_map is None else users_map
+    comments_map = {} if comments_map is None else comments_map
+    comment_id = int(row["id"])
+    if comment_id in comments_map:
+        return comments_map[comment_id]
+
+    post_author = user_from_row(row, "post_author__", users_map)
+    post = post_from_row(row, post_author, "post__", posts_map)
+    parent = None
+    parent_id = row["parent_id"]
+    if parent_id is not None:
+        parent = comments_map.get(parent_id)
+        if parent is None:
+            parent_author = user_from_row(row, "parent_author__", users_map)
+            parent = comment_from_row(row, post, parent_author, prefix="parent__")
+    author = user_from_row(row, "author__", users_map)
+    comment = comment_from_row(row, post, author, parent)
+    comments_map[comment_id] = comment
+    return comment
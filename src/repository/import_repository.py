@@ -0,0 +1,72 @@
+from dataclasses import dataclass
+from datetime import datetime
+
+from sqlalchemy import insert, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from repository.tables import import_checkpoints, import_refs
+from repository.unit_of_work import UnitOfWork
+
+
+@dataclass(frozen=True)
+class ImportCheckpoint:
+    """Докуда файл уже импортирован: смещение в байтах, номер строки, число записей."""
+    byte_offset: int
+    line: int
+    rows: int
+
+
+class ImportRepository:
+    """Состояние импорта JSONL: контрольные точки и ссылки из файла на созданные id.
+
+    Пишется в той же транзакции, что и импортированные данные, поэтому после
+    прерывания контрольная точка всегда совпадает с тем, что уже в БД.
+    """
+    def __init__(self, uow: UnitOfWork | None = None) -> None:
+        self.uow = uow
+
+    def _session(self, write: bool = False) -> AsyncSession:
+        if self.uow is None:
+            raise RuntimeError("unit of work не инициализирован")
+        return self.uow.session(write)
+
+    async def get_checkpoint(self, source: str) -> ImportCheckpoint | None:
+        session = self._session()
+        stmt = select(
+            import_checkpoints.c.byte_offset, import_checkpoints.c.line, import_checkpoints.c.rows
+        ).where(import_checkpoints.c.source == source)
+        row = (await session.execute(stmt)).one_or_none()
+        return ImportCheckpoint(*row) if row is not None else None
+
+    async def save_checkpoint(self, source: str, checkpoint: ImportCheckpoint) -> None:
+        session = self._session(write=True)
+        values = {
+            "byte_offset": checkpoint.byte_offset,
+            "line": checkpoint.line,
+            "rows": checkpoint.rows,
+            "updated_at": datetime.now(),
+        }
+        result = await session.execute(
+            update(import_checkpoints).where(import_checkpoints.c.source == source).values(**values)
+        )
+        if result.rowcount == 0:
+            await session.execute(insert(import_checkpoints).values(source=source, **values))
+
+    async def load_refs(self, source: str) -> dict[tuple[str, str], int]:
+        """Все ссылки файла: (вид, ссылка) -> id."""
+        session = self._session()
+        stmt = select(import_refs.c.kind, import_refs.c.ref, import_refs.c.target_id).where(
+            import_refs.c.source == source
+        )
+        result = await session.execute(stmt)
+        return {(kind, ref): target_id for kind, ref, target_id in result}
+
+    async def save_refs(self, source: str, refs: dict[tuple[str, str], int]) -> None:
+        if not refs:
+            return
+        session = self._session(write=True)
+        rows = [
+            {"source": source, "kind": kind, "ref": ref, "target_id": target_id}
+            for (kind, ref), target_id in refs.items()
+        ]
+        await session.execute(insert(import_refs), rows)
@@ -0,0 +1,75 @@
+import asyncio
+from typing import Awaitable, Callable, Generic, Hashable, TypeVar
+
+
+K = TypeVar("K", bound=Hashable)
+V = TypeVar("V")
+
+
+class BatchLoader(Generic[K, V]):
+    """Загрузчик в стиле DataLoader.
+
+    Все load(key), вызванные за один тик цикла событий, объединяются в один
+    вызов batch_fn(keys) (обычно один запрос WHERE id IN (...)). Найденные
+    объекты кладутся в cache - карту идентичности единицы работы, поэтому
+    повторный load того же ключа возвращает тот же объект без запроса.
+
+    lock общий для всех загрузчиков единицы работы: AsyncSession не допускает
+    параллельных запросов, поэтому пакеты выполняются по очереди.
+    """
+
+    def __init__(
+        self,
+        batch_fn: Callable[[list[K]], Awaitable[dict[K, V]]],
+        cache: dict[K, V],
+        lock: asyncio.Lock,
+    ) -> None:
+        self._batch_fn = batch_fn
+        self._cache = cache
+        self._lock = lock
+        self._queue: list[K] = []
+        self._futures: dict[K, asyncio.Future] = {}
+        self._tasks: set[asyncio.Task] = set()
+
+    async def load(self, key: K) -> V | None:
+        if key in self._cache:
+            return self._cache[key]
+
+        future = self._futures.get(key)
+        if future is None:
+            loop = asyncio.get_running_loop()
+            future = loop.create_future()
+            self._futures[key] = future
+            if not self._queue:
+                loop.call_soon(self._dispatch)
+            self._queue.append(key)
+        # shield: отмена одного ожидающего не должна отменять результат для остальных
+        return await asyncio.shield(future)
+
+    async def load_many(self, keys: list[K]) -> list[V | None]:
+        return list(await asyncio.gather(*(self.load(key) for key in keys)))
+
+    def _dispatch(self) -> None:
+        keys, self._queue = self._queue, []
+        task = asyncio.ensure_future(self._run(keys))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, keys: list[K]) -> None:
+        try:
+            async with self._lock:
+                found = await self._batch_fn(keys)
+        except Exception as exc:
+            for key in keys:
+                future = self._futures.pop(key)
+                if not future.done():
+                    future.set_exception(exc)
+            return
+
+        for key in keys:
+            value = found.get(key)
+            if value is not None:
+                value = self._cache.setdefault(key, value)
+            future = self._futures.pop(key)
+            if not future.done():
+                future.set_result(value)
@@ -0,0 +1,165 @@
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Callable
+
+from sqlalchemy import Connection, Table, bindparam, func, insert, inspect, select, text, update
+from sqlalchemy.ext.asyncio import AsyncEngine
+from sqlalchemy.schema import CreateColumn
+
+from repository.counters import recount_posts, recount_replies
+from repository.search_repository import SEARCH_INDEX_DDL
+from repository.tables import (
+    SENTINEL,
+    comments,
+    import_checkpoints,
+    import_refs,
+    metadata,
+    posts,
+    schema_migrations,
+    users,
+)
+from repository.tree_path import child_path
+
+
+@dataclass(frozen=True)
+class Migration:
+    """Одна версия схемы: номер, описание и функция применения."""
+    version: int
+    description: str
+    apply: Callable[[Connection], None]
+
+
+def _create_indexes(conn: Connection, table: Table, *names: str) -> None:
+    """Создаёт перечисленные индексы таблицы, если их ещё нет."""
+    indexes = {index.name: index for index in table.indexes}
+    for name in names:
+        indexes[name].create(conn, checkfirst=True)
+
+
+def _add_columns(conn: Connection, table: Table, *names: str) -> None:
+    """Добавляет колонки, объявленные в tables.py, если их ещё нет в БД."""
+    existing = {column["name"] for column in inspect(conn).get_columns(table.name)}
+    for name in names:
+        if name in existing:
+            continue
+        ddl = CreateColumn(table.c[name]).compile(dialect=conn.dialect)
+        conn.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {ddl}"))
+
+
+def _create_base_tables(conn: Connection) -> None:
+    # Для существующих БД (созданных ещё через metadata.create_all) ничего не делает
+    metadata.create_all(conn, tables=[users, posts, comments])
+
+
+def _add_lookup_indexes(conn: Connection) -> None:
+    duplicates = conn.execute(
+        select(users.c.username)
+        .group_by(users.c.username)
+        .having(func.count() > 1)
+        .limit(10)
+    ).scalars().all()
+    if duplicates:
+        raise RuntimeError(
+            "нельзя создать уникальный индекс по username, есть дубликаты: "
+            + ", ".join(duplicates)
+        )
+
+    _create_indexes(conn, users, "ux_users_username")
+    _create_indexes(conn, posts, "ix_posts_author_id")
+    _create_indexes(conn, comments, "ix_comments_post_id_id", "ix_comments_parent_id")
+
+
+def _add_comment_paths(conn: Connection) -> None:
+    _add_columns(conn, comments, "path")
+
+    # Родитель всегда вставлен раньше ответа, поэтому обход по id видит его путь
+    paths: dict[int, str] = {}
+    pending: list[dict] = []
+    stmt = update(comments).where(comments.c.id == bindparam("b_id")).values(path=bindparam("b_path"))
+    rows = conn.execute(
+        select(comments.c.id, comments.c.parent_id, comments.c.path).order_by(comments.c.id)
+    )
+    for comment_id, parent_id, path in rows:
+        if path is None:
+            path = child_path(paths.get(parent_id), comment_id)
+            pending.append({"b_id": comment_id, "b_path": path})
+        paths[comment_id] = path
+    for start in range(0, len(pending), 1000):
+        conn.execute(stmt, pending[start:start + 1000])
+
+    _create_indexes(conn, comments, "ix_comments_post_id_path")
+
+
+def _add_post_version(conn: Connection) -> None:
+    _add_columns(conn, posts, "version")
+
+
+def _add_counters(conn: Connection) -> None:
+    _add_columns(conn, posts, "comment_count")
+    _add_columns(conn, comments, "reply_count")
+    conn.execute(recount_posts())
+    conn.execute(recount_replies())
+
+
+def _add_search_index(conn: Connection) -> None:
+    # FTS5 - расширение SQLite; в других СУБД полнотекстового индекса нет
+    if conn.dialect.name != "sqlite":
+        return
+    for statement in SEARCH_INDEX_DDL:
+        conn.execute(text(statement))
+    conn.execute(text("INSERT INTO posts_fts(posts_fts) VALUES ('rebuild')"))
+    conn.execute(text("INSERT INTO comments_fts(comments_fts) VALUES ('rebuild')"))
+
+
+
+def _add_import_tables(conn: Connection) -> None:
+    import_checkpoints.create(conn, checkfirst=True)
+    import_refs.create(conn, checkfirst=True)
+
+
+def _add_insert_sentinels(conn: Connection) -> None:
+    for table in (users, posts, comments):
+        _add_columns(conn, table, SENTINEL)
+
+
+MIGRATIONS: list[Migration] = [
+    Migration(1, "базовые таблицы users/posts/comments", _create_base_tables),
+    Migration(2, "индексы для поиска по автору, посту, родителю и username", _add_lookup_indexes),
+    Migration(3, "материализованный путь комментариев", _add_comment_paths),
+    Migration(4, "версия поста для ETag", _add_post_version),
+    Migration(5, "счётчики комментариев поста и ответов комментария", _add_counters),
+    Migration(6, "полнотекстовый индекс FTS5 по постам и комментариям", _add_search_index),
+    Migration(7, "контрольные точки и ссылки импорта JSONL", _add_import_tables),
+    Migration(8, "служебные колонки для пакетного INSERT ... RETURNING", _add_insert_sentinels),
+]
+
+
+def _current_version(conn: Connection) -> int:
+    schema_migrations.create(conn, checkfirst=True)
+    version = conn.execute(select(func.max(schema_migrations.c.version))).scalar()
+    return version or 0
+
+
+async def migrate(engine: AsyncEngine) -> list[int]:
+    """Применяет недостающие миграции, каждую в своей транзакции.
+
+    Возвращает список применённых версий.
+    """
+    async with engine.begin() as conn:
+        current = await conn.run_sync(_current_version)
+
+    applied: list[int] = []
+    for migration in MIGRATIONS:
+        if migration.version <= current:
+            continue
+        async with engine.begin() as conn:
+            await conn.run_sync(migration.apply)
+            await conn.execute(
+                insert(schema_migrations).values(
+                    version=migration.version,
+                    description=migration.description,
+                    applied_at=datetime.now(),
+                )
+            )
+        applied.append(migration.version)
+    return applied
@@ -0,0 +1,62 @@
+import base64
+import binascii
+import json
+from dataclasses import dataclass, field
+from typing import Generic, TypeVar
+
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+# Строк за одно чтение серверного курсора при потоковой выдаче (stream_*)
+STREAM_CHUNK_SIZE = 500
+
+T = TypeVar("T")
+
+
+@dataclass
+class Page(Generic[T]):
+    """Страница выборки и курсор на следующую (None, если страница последняя)."""
+    items: list[T] = field(default_factory=list)
+    next_cursor: str | None = None
+
+
+def encode_position(position: dict) -> str:
+    """Непрозрачный курсор из ключа позиции (JSON в base64url)."""
+    raw = json.dumps(position, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_position(cursor: str) -> dict:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        position = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (binascii.Error, ValueError, TypeError):
+        raise ValueError("некорректный курсор")
+    if not isinstance(position, dict):
+        raise ValueError("некорректный курсор")
+    return position
+
+
+def encode_cursor(last_id: int) -> str:
+    """Непрозрачный курсор: позиция после записи с данным id."""
+    return encode_position({"id": last_id})
+
+
+def decode_cursor(cursor: str | None) -> int | None:
+    if not cursor:
+        return None
+    last_id = decode_position(cursor).get("id")
+    if not isinstance(last_id, int):
+        raise ValueError("некорректный курсор")
+    return last_id
+
+
+def make_page(items: list[T], limit: int, key=lambda item: item.id) -> Page[T]:
+    """Собирает страницу из limit + 1 записей, выбранных репозиторием.
+
+    Лишняя запись лишь сигнализирует, что следующая страница существует.
+    """
+    if len(items) <= limit:
+        return Page(items=items)
+    items = items[:limit]
+    return Page(items=items, next_cursor=encode_cursor(key(items[-1])))
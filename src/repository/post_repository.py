@@ -1,118 +1,140 @@
+from typing import AsyncIterator
+
 from sqlalchemy import select, insert
-from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from domain.post import Post
 from domain.user import User
-from repository.tables import posts as posts_table, users as users_table
+from repository.bulk import insert_returning_ids
+from repository.hydration import post_from_row, posts_from_rows, select_posts, user_from_row
+from repository.loader import BatchLoader
+from repository.pagination import STREAM_CHUNK_SIZE, Page, make_page
+from repository.tables import posts as posts_table
+from repository.unit_of_work import UnitOfWork
 
 
 class PostRepository:
     """Репозиторий постов."""
-    def __init__(self, session_factory: async_sessionmaker[AsyncSession] | None = None) -> None:
-        self.session_factory = session_factory
+    def __init__(self, uow: UnitOfWork | None = None) -> None:
+        self.uow = uow
+        self._batch_loader: BatchLoader[int, Post] | None = None
+
+    def _session(self, write: bool = False) -> AsyncSession:
+        if self.uow is None:
+            raise RuntimeError("unit of work не инициализирован")
+        return self.uow.session(write)
 
     async def save(self, post: Post) -> Post:
-        if self.session_factory is None:
-            raise RuntimeError("session_factory не инициализирован")
-
-        async with self.session_factory() as session:
-            async with session.begin():
-                stmt = insert(posts_table).values(
-                    title=post.title,
-                    content=post.content,
-                    author_id=post.author.id,
-                    created_at=post.created_at,
-                )
-                result = await session.execute(stmt)
-                post_id = result.inserted_primary_key[0]
-                post.id = int(post_id)
+        session = self._session(write=True)
+        stmt = insert(posts_table).values(
+            title=post.title,
+            content=post.content,
+            author_id=post.author.id,
+            created_at=post.created_at,
+        )
+        result = await session.execute(stmt)
+        post_id = result.inserted_primary_key[0]
+        post.id = int(post_id)
+        self.uow.identity_map.posts[post.id] = post
         return post
 
+    async def save_many(self, posts: list[Post]) -> list[Post]:
+        """Вставляет посты одним многострочным INSERT и проставляет id."""
+        session = self._session(write=True)
+        rows = [
+            {
+                "title": post.title,
+                "content": post.content,
+                "author_id": post.author.id,
+                "created_at": post.created_at,
+            }
+            for post in posts
+        ]
+        ids = await insert_returning_ids(session, posts_table, rows)
+        for post, post_id in zip(posts, ids):
+            post.id = post_id
+            self.uow.identity_map.posts[post.id] = post
+        return posts
+
     async def find_by_id(self, id: int) -> Post | None:
-        if self.session_factory is None:
-            raise RuntimeError("session_factory не инициализирован")
-
-        async with self.session_factory() as session:
-            stmt = select(posts_table).where(posts_table.c.id == id)
-            result = await session.execute(stmt)
-            row = result.mappings().one_or_none()
-            if row is None:
-                return None
-
-            author = await self._load_user(session, row["author_id"])
-            post = Post(
-                title=row["title"],
-                content=row["content"],
-                author=author,
-                created_at=row["created_at"],
-                id=int(row["id"])
-            )
-            return post
+        return await self.load(id)
+
+    async def load(self, id: int) -> Post | None:
+        """Пост по id: из карты идентичности или пакетом вместе с соседними load."""
+        return await self._loader().load(id)
+
+    async def load_many(self, ids: list[int]) -> list[Post | None]:
+        return await self._loader().load_many(ids)
+
+    async def get_version(self, id: int) -> int | None:
+        """Версия поста (растёт с каждым комментарием); None, если поста нет."""
+        session = self._session()
+        stmt = select(posts_table.c.version).where(posts_table.c.id == id)
+        result = await session.execute(stmt)
+        return result.scalar_one_or_none()
 
     async def find_by_author(self, author: User) -> list[Post]:
-        return await self.find_by_author_id(author.id)
+        # Автор уже загружен - JOIN не нужен
+        session = self._session()
+        stmt = select(posts_table).where(posts_table.c.author_id == author.id)
+        result = await session.execute(stmt)
+        posts_map = self.uow.identity_map.posts
+        return [post_from_row(row, author, posts_map=posts_map) for row in result.mappings().all()]
 
     async def find_by_author_id(self, author_id: int) -> list[Post]:
-        if self.session_factory is None:
-            raise RuntimeError("session_factory не инициализирован")
-
-        async with self.session_factory() as session:
-            stmt = select(posts_table).where(posts_table.c.author_id == author_id)
-            result = await session.execute(stmt)
-            rows = result.mappings().all()
-            if not rows:
-                return []
-
-            author = await self._load_user(session, author_id)
-            posts: list[Post] = []
-            for row in rows:
-                post = Post(
-                    title=row["title"],
-                    content=row["content"],
-                    author=author,
-                    created_at=row["created_at"],
-                    id=int(row["id"])
-                )
-                posts.append(post)
-            return posts
+        session = self._session()
+        stmt = select_posts().where(posts_table.c.author_id == author_id)
+        result = await session.execute(stmt)
+        return self._posts_from_rows(result.mappings().all())
 
     async def find_all(self) -> list[Post]:
-        if self.session_factory is None:
-            raise RuntimeError("session_factory не инициализирован")
-
-        async with self.session_factory() as session:
-            stmt = select(posts_table)
-            result = await session.execute(stmt)
-            rows = result.mappings().all()
-            if not rows:
-                return []
-
-            author_ids = {row["author_id"] for row in rows}
-            authors: dict[int, User] = {}
-            for aid in author_ids:
-                authors[aid] = await self._load_user(session, aid)
-
-            posts: list[Post] = []
-            for row in rows:
-                author = authors[row["author_id"]]
-                post = Post(
-                    title=row["title"],
-                    content=row["content"],
-                    author=author,
-                    created_at=row["created_at"],
-                    id=int(row["id"])
-                )
-                posts.append(post)
-            return posts
-
-    @staticmethod
-    async def _load_user(session: AsyncSession, user_id: int) -> User:
-        stmt = select(users_table).where(users_table.c.id == user_id)
+        session = self._session()
+        stmt = select_posts()
+        result = await session.execute(stmt)
+        return self._posts_from_rows(result.mappings().all())
+
+    async def find_page(self, limit: int, after_id: int | None = None) -> Page[Post]:
+        """Keyset-страница постов в порядке id."""
+        session = self._session()
+        stmt = select_posts().order_by(posts_table.c.id).limit(limit + 1)
+        if after_id is not None:
+            stmt = stmt.where(posts_table.c.id > after_id)
         result = await session.execute(stmt)
-        row = result.mappings().one()
-        user = User(
-            username=row["username"],
-            created_date=row["created_date"],
-            id=int(row["id"])
+        return make_page(self._posts_from_rows(result.mappings().all()), limit)
+
+    async def stream_all(self, after_id: int | None = None) -> AsyncIterator[Post]:
+        """Посты с авторами в порядке id по мере чтения серверного курсора.
+
+        Объекты не попадают в карту идентичности - память не растёт с выборкой.
+        """
+        session = self._session()
+        stmt = (
+            select_posts()
+            .order_by(posts_table.c.id)
+            .execution_options(yield_per=STREAM_CHUNK_SIZE)
         )
-        return user
+        if after_id is not None:
+            stmt = stmt.where(posts_table.c.id > after_id)
+        result = await session.stream(stmt)
+        async for row in result.mappings():
+            yield post_from_row(row, user_from_row(row, "author__"))
+
+    def _loader(self) -> BatchLoader[int, Post]:
+        if self.uow is None:
+            raise RuntimeError("unit of work не инициализирован")
+        if self._batch_loader is None:
+            self._batch_loader = BatchLoader(
+                self._load_batch, self.uow.identity_map.posts, self.uow.lock
+            )
+        return self._batch_loader
+
+    async def _load_batch(self, ids: list[int]) -> dict[int, Post]:
+        session = self._session()
+        stmt = select_posts().where(posts_table.c.id.in_(ids))
+        result = await session.execute(stmt)
+        posts = self._posts_from_rows(result.mappings().all())
+        return {post.id: post for post in posts}
+
+    def _posts_from_rows(self, rows) -> list[Post]:
+        identity_map = self.uow.identity_map
+        return posts_from_rows(rows, identity_map.users, identity_map.posts)
@@ -1,19 +1,66 @@
+from contextlib import AbstractAsyncContextManager
+
 from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
 
+from domain.user import User
+from repository.cache import LRUCache
 from repository.comment_repository import CommentRepository
+from repository.import_repository import ImportRepository
 from repository.post_repository import PostRepository
+from repository.search_repository import SearchRepository
+from repository.unit_of_work import UnitOfWork
 from repository.user_repository import UserRepository
 
 
 class Repository:
-    """Контейнер для всех репозиториев."""
+    """Контейнер для всех репозиториев.
+
+    Репозитории разделяют одну единицу работы: за время жизни контейнера
+    (запрос API или команда CLI) используется одна сессия и одна транзакция.
+    Кэши процесса (username_cache) передаются снаружи и живут дольше контейнера.
+    write_session_factory - отдельный писатель (см. UnitOfWork); save-методы
+    репозиториев идут через него, find_* - через session_factory.
+    """
 
-    def __init__(self, session_factory: async_sessionmaker[AsyncSession]) -> None:
+    def __init__(
+        self,
+        session_factory: async_sessionmaker[AsyncSession],
+        username_cache: LRUCache[str, User] | None = None,
+        write_session_factory: async_sessionmaker[AsyncSession] | None = None,
+    ) -> None:
         self.session_factory = session_factory
-        self.users = UserRepository(session_factory)
-        self.posts = PostRepository(session_factory)
-        self.comments = CommentRepository(session_factory)
+        self.uow = UnitOfWork(session_factory, write_session_factory)
+        self.users = UserRepository(self.uow, username_cache)
+        self.posts = PostRepository(self.uow)
+        self.comments = CommentRepository(self.uow)
+        self.search = SearchRepository(self.uow)
+        self.imports = ImportRepository(self.uow)
+
+    def session(self, write: bool = False) -> AsyncSession:
+        """Сессия текущей единицы работы (для записи - сессия писателя)."""
+        return self.uow.session(write)
+
+    async def commit(self) -> None:
+        await self.uow.commit()
+
+    def transaction(self) -> AbstractAsyncContextManager[None]:
+        """Несколько операций сервисов одной транзакцией (см. UnitOfWork.transaction)."""
+        return self.uow.transaction()
+
+    def savepoint(self) -> AbstractAsyncContextManager[None]:
+        return self.uow.savepoint()
+
+    async def snapshot(self) -> None:
+        """Дальнейшие чтения - из одного снимка БД (см. UnitOfWork.snapshot)."""
+        await self.uow.snapshot()
+
+    async def close(self) -> None:
+        """Завершить единицу работы; незафиксированные изменения откатываются."""
+        await self.uow.close()
+
+    async def __aenter__(self) -> "Repository":
+        await self.uow.__aenter__()
+        return self
 
-    def session(self) -> AsyncSession:
-        """Создать сессию."""
-        return self.session_factory()
+    async def __aexit__(self, exc_type, exc, tb) -> None:
+        await self.uow.__aexit__(exc_type, exc, tb)
@@ -0,0 +1,184 @@
+"""Полнотекстовый поиск по постам и комментариям (SQLite FTS5).
+
+posts_fts и comments_fts - FTS5-таблицы с внешним содержимым (content=posts /
+content=comments): текст хранится только в основных таблицах, индекс
+обновляется триггерами. Триггеры на UPDATE срабатывают только при изменении
+индексируемых колонок, поэтому обновления path, version и счётчиков их не трогают.
+"""
+import html
+import re
+from dataclasses import dataclass
+
+from sqlalchemy import column, func, literal, literal_column, select, table, tuple_, union_all
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from repository.pagination import Page, decode_position, encode_position
+from repository.tables import comments as comments_table
+from repository.unit_of_work import UnitOfWork
+
+
+SEARCH_INDEX_DDL = [
+    """CREATE VIRTUAL TABLE IF NOT EXISTS posts_fts USING fts5(
+        title, content, content='posts', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2')""",
+    """CREATE VIRTUAL TABLE IF NOT EXISTS comments_fts USING fts5(
+        text, content='comments', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2')""",
+    """CREATE TRIGGER IF NOT EXISTS posts_fts_insert AFTER INSERT ON posts BEGIN
+        INSERT INTO posts_fts(rowid, title, content) VALUES (new.id, new.title, new.content);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS posts_fts_delete AFTER DELETE ON posts BEGIN
+        INSERT INTO posts_fts(posts_fts, rowid, title, content)
+        VALUES ('delete', old.id, old.title, old.content);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS posts_fts_update AFTER UPDATE OF title, content ON posts BEGIN
+        INSERT INTO posts_fts(posts_fts, rowid, title, content)
+        VALUES ('delete', old.id, old.title, old.content);
+        INSERT INTO posts_fts(rowid, title, content) VALUES (new.id, new.title, new.content);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS comments_fts_insert AFTER INSERT ON comments BEGIN
+        INSERT INTO comments_fts(rowid, text) VALUES (new.id, new.text);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS comments_fts_delete AFTER DELETE ON comments BEGIN
+        INSERT INTO comments_fts(comments_fts, rowid, text) VALUES ('delete', old.id, old.text);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS comments_fts_update AFTER UPDATE OF text ON comments BEGIN
+        INSERT INTO comments_fts(comments_fts, rowid, text) VALUES ('delete', old.id, old.text);
+        INSERT INTO comments_fts(rowid, text) VALUES (new.id, new.text);
+    END""",
+]
+
+posts_fts = table("posts_fts", column("rowid"), column("title"), column("content"))
+comments_fts = table("comments_fts", column("rowid"), column("text"))
+
+# Заголовок поста весит больше текста
+POST_WEIGHTS = (2.0, 1.0)
+# snippet() вставляет маркеры как есть, не экранируя текст вокруг них, поэтому
+# FTS5 получает управляющие символы, а <b> подставляет highlight() после экранирования.
+SNIPPET_START = "\x02"
+SNIPPET_END = "\x03"
+SNIPPET_ELLIPSIS = "…"
+SNIPPET_TOKENS = 12
+
+_TOKEN = re.compile(r'[^\s"]+\*?')
+
+
+def highlight(snippet: str) -> str:
+    """Фрагмент FTS5 -> HTML: текст экранирован, совпадения в <b>...</b>."""
+    return html.escape(snippet).replace(SNIPPET_START, "<b>").replace(SNIPPET_END, "</b>")
+
+
+def plain(snippet: str) -> str:
+    """Фрагмент FTS5 -> обычный текст без разметки (для терминала)."""
+    return snippet.replace(SNIPPET_START, "").replace(SNIPPET_END, "")
+
+
+def fts_query(text: str) -> str:
+    """Запрос пользователя -> запрос FTS5: каждое слово в кавычках, все слова обязательны.
+
+    Операторы FTS5 (AND, NEAR, col:, ^ ...) так становятся обычными словами,
+    и запрос не может оказаться синтаксически неверным. Звёздочка в конце
+    слова сохраняется как поиск по префиксу.
+    """
+    terms = []
+    for token in _TOKEN.findall(text):
+        prefix = token.endswith("*")
+        word = token.rstrip("*")
+        if word:
+            terms.append(f'"{word}"*' if prefix else f'"{word}"')
+    if not terms:
+        raise ValueError("пустой поисковый запрос")
+    return " ".join(terms)
+
+
+@dataclass
+class SearchHit:
+    """Найденный пост (kind="post") или комментарий (kind="comment")."""
+    kind: str
+    id: int
+    post_id: int
+    rank: float
+    snippet: str
+
+
+class SearchRepository:
+    """Поиск по FTS5-индексу; посты и комментарии ранжируются вместе по bm25."""
+
+    def __init__(self, uow: UnitOfWork | None = None) -> None:
+        self.uow = uow
+
+    def _session(self) -> AsyncSession:
+        if self.uow is None:
+            raise RuntimeError("unit of work не инициализирован")
+        return self.uow.session()
+
+    async def search(
+        self, query: str, limit: int, cursor: str | None = None, as_html: bool = True
+    ) -> Page[SearchHit]:
+        """Страница результатов по убыванию релевантности (bm25 по возрастанию).
+
+        Курсор - позиция (rank, kind, id) последнего результата страницы.
+        snippet - HTML (см. highlight) или, с as_html=False, обычный текст.
+        """
+        match = fts_query(query)
+        post_hits = (
+            select(
+                literal("post").label("kind"),
+                posts_fts.c.rowid.label("id"),
+                posts_fts.c.rowid.label("post_id"),
+                func.bm25(literal_column("posts_fts"), *POST_WEIGHTS).label("rank"),
+                func.snippet(
+                    literal_column("posts_fts"), -1,
+                    SNIPPET_START, SNIPPET_END, SNIPPET_ELLIPSIS, SNIPPET_TOKENS,
+                ).label("snippet"),
+            )
+            .select_from(posts_fts)
+            .where(literal_column("posts_fts").op("MATCH")(match))
+        )
+        comment_hits = (
+            select(
+                literal("comment").label("kind"),
+                comments_fts.c.rowid.label("id"),
+                comments_table.c.post_id.label("post_id"),
+                func.bm25(literal_column("comments_fts")).label("rank"),
+                func.snippet(
+                    literal_column("comments_fts"), 0,
+                    SNIPPET_START, SNIPPET_END, SNIPPET_ELLIPSIS, SNIPPET_TOKENS,
+                ).label("snippet"),
+            )
+            .select_from(comments_fts)
+            .join(comments_table, comments_table.c.id == comments_fts.c.rowid)
+            .where(literal_column("comments_fts").op("MATCH")(match))
+        )
+        hits = union_all(post_hits, comment_hits).subquery("hits")
+        stmt = (
+            select(hits)
+            .order_by(hits.c.rank, hits.c.kind, hits.c.id)
+            .limit(limit + 1)
+        )
+        if cursor:
+            rank, kind, last_id = self._decode_cursor(cursor)
+            stmt = stmt.where(
+                tuple_(hits.c.rank, hits.c.kind, hits.c.id) > tuple_(rank, kind, last_id)
+            )
+
+        rows = (await self._session().execute(stmt)).mappings().all()
+        render = highlight if as_html else plain
+        items = [SearchHit(**{**row, "snippet": render(row["snippet"])}) for row in rows[:limit]]
+        next_cursor = None
+        if len(rows) > limit:
+            last = items[-1]
+            next_cursor = encode_position({"rank": last.rank, "kind": last.kind, "id": last.id})
+        return Page(items=items, next_cursor=next_cursor)
+
+    @staticmethod
+    def _decode_cursor(cursor: str) -> tuple[float, str, int]:
+        position = decode_position(cursor)
+        rank, kind, last_id = position.get("rank"), position.get("kind"), position.get("id")
+        if (
+            not isinstance(rank, (int, float))
+            or kind not in ("post", "comment")
+            or not isinstance(last_id, int)
+        ):
+            raise ValueError("некорректный курсор")
+        return float(rank), kind, last_id
@@ -0,0 +1,172 @@
+"""Журнал медленных SQL-запросов.
+
+Запросы дольше порога группируются по «форме» - тексту SQL, в котором списки
+параметров IN (?, ?, ...) и строки VALUES свёрнуты, - и для каждой формы хранятся
+число срабатываний, суммарное и максимальное время, параметры и маршрут самого
+медленного случая и план EXPLAIN QUERY PLAN (для SQLite; снимается один раз
+на форму, на том же соединении, сразу после медленного запроса).
+Каждое срабатывание пишется в лог commenthub.slow_queries.
+"""
+import logging
+import re
+import time
+from datetime import datetime, timezone
+from typing import Any
+
+from sqlalchemy.engine import Connection
+
+
+logger = logging.getLogger("commenthub.slow_queries")
+
+MAX_PARAMS = 20
+MAX_PARAM_LENGTH = 200
+_EXPLAINABLE = ("SELECT", "INSERT", "UPDATE", "DELETE", "WITH")
+_PLACEHOLDERS = re.compile(r"\?(?:\s*,\s*\?)+")
+_ROWS = re.compile(r"(\(\?, \.\.\.\))(?:\s*,\s*\(\?, \.\.\.\))+")
+
+
+def statement_shape(statement: str) -> str:
+    """SQL без переменной части: IN-списки и многострочные VALUES свёрнуты."""
+    shape = " ".join(statement.split())
+    shape = _PLACEHOLDERS.sub("?, ...", shape)
+    return _ROWS.sub(r"\1, ...", shape)
+
+
+def _short(value: Any) -> Any:
+    if isinstance(value, (str, bytes)) and len(value) > MAX_PARAM_LENGTH:
+        return value[:MAX_PARAM_LENGTH] + ("…" if isinstance(value, str) else b"...")
+    return value
+
+
+def _params(parameters: Any, executemany: bool) -> Any:
+    """Параметры для журнала: длинные значения и списки обрезаны."""
+    if executemany:
+        parameters = parameters[0] if parameters else ()
+    if isinstance(parameters, dict):
+        return {k: _short(v) for k, v in list(parameters.items())[:MAX_PARAMS]}
+    return [_short(v) for v in list(parameters or ())[:MAX_PARAMS]]
+
+
+def explain_query_plan(conn: Connection, statement: str, parameters: Any, executemany: bool) -> list[str] | None:
+    """План SQLite в виде строк с отступами по вложенности; None - если снять нельзя."""
+    if conn.dialect.name != "sqlite" or not statement.lstrip().upper().startswith(_EXPLAINABLE):
+        return None
+    if executemany:
+        parameters = parameters[0] if parameters else ()
+    cursor = conn.connection.dbapi_connection.cursor()
+    try:
+        cursor.execute("EXPLAIN QUERY PLAN " + statement, parameters)
+        rows = cursor.fetchall()
+    except Exception:
+        return None
+    finally:
+        cursor.close()
+
+    depth: dict[int, int] = {0: -1}
+    plan = []
+    for node_id, parent_id, _, detail in rows:
+        depth[node_id] = depth.get(parent_id, -1) + 1
+        plan.append("  " * depth[node_id] + detail)
+    return plan or None
+
+
+class SlowQuery:
+    """Статистика одной формы запроса."""
+    __slots__ = ("shape", "count", "total_seconds", "max_seconds", "statement", "params", "route", "at", "plan")
+
+    def __init__(self, shape: str) -> None:
+        self.shape = shape
+        self.count = 0
+        self.total_seconds = 0.0
+        self.max_seconds = 0.0
+        self.statement = ""
+        self.params: Any = None
+        self.route: str | None = None
+        self.at: datetime | None = None
+        self.plan: list[str] | None = None
+
+    def as_dict(self) -> dict[str, Any]:
+        return {
+            "shape": self.shape,
+            "count": self.count,
+            "total_ms": round(1000 * self.total_seconds, 2),
+            "max_ms": round(1000 * self.max_seconds, 2),
+            "avg_ms": round(1000 * self.total_seconds / self.count, 2),
+            "slowest": {
+                "statement": self.statement,
+                "params": self.params,
+                "route": self.route,
+                "at": self.at.isoformat(timespec="seconds") if self.at else None,
+            },
+            "plan": self.plan,
+        }
+
+
+class SlowQueryLog:
+    """Медленные запросы процесса; хранится не больше max_shapes форм.
+
+    При переполнении вытесняется форма с наименьшим максимальным временем.
+    """
+
+    def __init__(self, threshold: float, max_shapes: int = 500) -> None:
+        self.threshold = threshold
+        self.max_shapes = max_shapes
+        self._shapes: dict[str, SlowQuery] = {}
+        self.recorded = 0
+        self.explain_seconds = 0.0
+
+    def record(
+        self,
+        conn: Connection,
+        statement: str,
+        parameters: Any,
+        executemany: bool,
+        seconds: float,
+        route: str | None,
+    ) -> None:
+        shape = statement_shape(statement)
+        entry = self._shapes.get(shape)
+        if entry is None:
+            if len(self._shapes) >= self.max_shapes:
+                fastest = min(self._shapes.values(), key=lambda e: e.max_seconds)
+                del self._shapes[fastest.shape]
+            entry = self._shapes[shape] = SlowQuery(shape)
+            started = time.perf_counter()
+            entry.plan = explain_query_plan(conn, statement, parameters, executemany)
+            self.explain_seconds += time.perf_counter() - started
+
+        params = _params(parameters, executemany)
+        self.recorded += 1
+        entry.count += 1
+        entry.total_seconds += seconds
+        if seconds >= entry.max_seconds:
+            entry.max_seconds = seconds
+            entry.statement = statement
+            entry.params = params
+            entry.route = route
+            entry.at = datetime.now(timezone.utc)
+
+        logger.warning(
+            "медленный запрос %.1f мс%s: %s; параметры: %r%s",
+            1000 * seconds,
+            f" ({route})" if route else "",
+            shape,
+            params,
+            "; план: " + " | ".join(line.strip() for line in entry.plan) if entry.plan else "",
+        )
+
+    def top(self, limit: int, order: str = "max") -> list[dict[str, Any]]:
+        """Самые медленные формы: по максимальному (max) или суммарному (total) времени."""
+        key = (lambda e: e.total_seconds) if order == "total" else (lambda e: e.max_seconds)
+        return [e.as_dict() for e in sorted(self._shapes.values(), key=key, reverse=True)[:limit]]
+
+    def clear(self) -> None:
+        self._shapes.clear()
+
+    def stats(self) -> dict[str, float]:
+        return {
+            "threshold_ms": 1000 * self.threshold,
+            "shapes": len(self._shapes),
+            "recorded": self.recorded,
+            "explain_ms_total": 1000 * self.explain_seconds,
+        }
@@ -6,18 +6,27 @@ from sqlalchemy import (
     String,
     DateTime,
     ForeignKey,
-    Text
+    Index,
+    Text,
+    insert_sentinel,
 )
 
 
 metadata = MetaData()
 
+# Служебная колонка для INSERT ... RETURNING пакетами (repository/bulk.py):
+# по ней SQLAlchemy сопоставляет строки RETURNING с параметрами. Автоинкрементный
+# id в SQLite для этого не годится, без неё пакет выполняется построчно.
+SENTINEL = "insert_sentinel"
+
 users = Table(
     "users",
     metadata,
     Column("id", Integer, primary_key=True, autoincrement=True),
     Column("username", String(255), nullable=False, unique=False),
-    Column("created_date", DateTime, nullable=False)
+    Column("created_date", DateTime, nullable=False),
+    insert_sentinel(SENTINEL),
+    Index("ux_users_username", "username", unique=True),
 )
 
 posts = Table(
@@ -27,7 +36,13 @@ posts = Table(
     Column("title", String(255), nullable=False),
     Column("content", Text, nullable=False),
     Column("author_id", Integer, ForeignKey("users.id"), nullable=False),
-    Column("created_at", DateTime, nullable=False)
+    Column("created_at", DateTime, nullable=False),
+    # Увеличивается при каждом новом комментарии, используется как ETag
+    Column("version", Integer, nullable=False, server_default="0"),
+    # Денормализованный счётчик комментариев (см. repository/counters.py)
+    Column("comment_count", Integer, nullable=False, server_default="0"),
+    insert_sentinel(SENTINEL),
+    Index("ix_posts_author_id", "author_id"),
 )
 
 comments = Table(
@@ -38,5 +53,44 @@ comments = Table(
     Column("author_id", Integer, ForeignKey("users.id"), nullable=False),
     Column("parent_id", Integer, ForeignKey("comments.id"), nullable=True),
     Column("text", Text, nullable=False),
-    Column("created_at", DateTime, nullable=False)
+    Column("created_at", DateTime, nullable=False),
+    # Материализованный путь (см. repository/tree_path.py), заполняется в save
+    Column("path", Text, nullable=True),
+    # Число прямых ответов, поддерживается в save
+    Column("reply_count", Integer, nullable=False, server_default="0"),
+    insert_sentinel(SENTINEL),
+    # (post_id, id) покрывает и фильтр по посту, и упорядоченное чтение дерева
+    Index("ix_comments_post_id_id", "post_id", "id"),
+    Index("ix_comments_parent_id", "parent_id"),
+    Index("ix_comments_post_id_path", "post_id", "path"),
+)
+
+# Импорт JSONL (service/import_service.py): контрольная точка по каждому файлу
+# и соответствие ссылок из файла созданным id - для продолжения после прерывания
+import_checkpoints = Table(
+    "import_checkpoints",
+    metadata,
+    Column("source", String(1024), primary_key=True),
+    Column("byte_offset", Integer, nullable=False),
+    Column("line", Integer, nullable=False),
+    Column("rows", Integer, nullable=False),
+    Column("updated_at", DateTime, nullable=False),
+)
+
+import_refs = Table(
+    "import_refs",
+    metadata,
+    Column("source", String(1024), primary_key=True),
+    Column("kind", String(16), primary_key=True),
+    Column("ref", String(255), primary_key=True),
+    Column("target_id", Integer, nullable=False),
+)
+
+# Служебная таблица с применёнными версиями схемы (см. repository/migrations.py)
+schema_migrations = Table(
+    "schema_migrations",
+    metadata,
+    Column("version", Integer, primary_key=True),
+    Column("description", String(255), nullable=False),
+    Column("applied_at", DateTime, nullable=False)
 )
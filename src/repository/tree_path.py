@@ -0,0 +1,26 @@
+"""Материализованный путь комментария: id всех предков и самого комментария.
+
+Каждый уровень - id, дополненный нулями до SEGMENT_WIDTH, и "/":
+0000000001/0000000005/. Поддерево узла - это все пути, начинающиеся с его
+пути, то есть один диапазон [path, upper_bound(path)) в индексе.
+"""
+
+SEGMENT_WIDTH = 10
+SEGMENT_LENGTH = SEGMENT_WIDTH + 1
+
+
+def segment(comment_id: int) -> str:
+    return f"{comment_id:0{SEGMENT_WIDTH}d}/"
+
+
+def child_path(parent_path: str | None, comment_id: int) -> str:
+    return (parent_path or "") + segment(comment_id)
+
+
+def upper_bound(path: str) -> str:
+    """Наименьшая строка больше всех путей поддерева ("0" идёт сразу за "/")."""
+    return path[:-1] + "0"
+
+
+def depth(path: str) -> int:
+    return len(path) // SEGMENT_LENGTH
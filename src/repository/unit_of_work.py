@@ -0,0 +1,169 @@
+import asyncio
+from contextlib import asynccontextmanager
+from typing import AsyncIterator
+
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from domain.comment import Comment
+from domain.post import Post
+from domain.user import User
+
+
+class IdentityMap:
+    """Объекты, уже загруженные в рамках единицы работы, по id."""
+
+    def __init__(self) -> None:
+        self.users: dict[int, User] = {}
+        self.posts: dict[int, Post] = {}
+        self.comments: dict[int, Comment] = {}
+
+    def clear(self) -> None:
+        self.users.clear()
+        self.posts.clear()
+        self.comments.clear()
+
+
+class UnitOfWork:
+    """Единица работы: одна сессия и одна транзакция на запрос (или команду CLI).
+
+    Сессия открывается при первом обращении, все репозитории работают через неё.
+    Изменения фиксируются явным commit(); незафиксированное откатывается в close().
+    Карта идентичности и lock загрузчиков (repository/loader.py) живут столько же.
+
+    Если задана отдельная write_session_factory (единственный писатель SQLite),
+    чтение идёт через session_factory, а запись - через сессию писателя.
+    После первой записи чтение тоже переходит на писателя: так единица работы
+    видит свои незафиксированные изменения.
+
+    transaction() объединяет несколько операций (каждая со своим commit())
+    в одну транзакцию, savepoint() - откатываемый по ошибке шаг внутри неё.
+    snapshot() - чтение из одного снимка БД до следующего commit().
+
+    В остальном транзакциями SQLite управляет драйвер: он начинает её перед
+    первым INSERT/UPDATE/DELETE, поэтому чтение до записи идёт без транзакции,
+    а блокировка записи не повышается из читающей транзакции (SQLITE_BUSY).
+    """
+
+    def __init__(
+        self,
+        session_factory: async_sessionmaker[AsyncSession],
+        write_session_factory: async_sessionmaker[AsyncSession] | None = None,
+    ) -> None:
+        self.session_factory = session_factory
+        self.write_session_factory = write_session_factory or session_factory
+        self.identity_map = IdentityMap()
+        self.lock = asyncio.Lock()
+        self._session: AsyncSession | None = None
+        self._write_session: AsyncSession | None = None
+        self._deferred = False
+
+    @property
+    def in_transaction(self) -> bool:
+        """Открыт transaction(): прочитанное может откатиться вместе с блоком."""
+        return self._deferred
+
+    @property
+    def split(self) -> bool:
+        """Чтение и запись идут через разные фабрики сессий."""
+        return self.write_session_factory is not self.session_factory
+
+    def session(self, write: bool = False) -> AsyncSession:
+        if not self.split:
+            if self._session is None:
+                self._session = self.session_factory()
+            return self._session
+
+        if write or self._write_session is not None:
+            if self._write_session is None:
+                self._write_session = self.write_session_factory()
+            return self._write_session
+        if self._session is None:
+            self._session = self.session_factory()
+        return self._session
+
+    def _sessions(self) -> list[AsyncSession]:
+        return [s for s in (self._write_session, self._session) if s is not None]
+
+    async def commit(self) -> None:
+        """Фиксирует запись и завершает читающую транзакцию (освобождает соединения).
+
+        Внутри transaction() ничего не делает: фиксация - по выходу из неё.
+        """
+        if self._deferred:
+            return
+        for session in self._sessions():
+            await session.commit()
+
+    async def rollback(self) -> None:
+        self.identity_map.clear()
+        for session in self._sessions():
+            await session.rollback()
+
+    async def close(self) -> None:
+        self.identity_map.clear()
+        sessions = self._sessions()
+        self._session = self._write_session = None
+        for session in sessions:
+            await session.close()
+
+    async def _begin(self, session: AsyncSession, statement: str) -> None:
+        """Явно открывает транзакцию SQLite, если на соединении её ещё нет.
+
+        Без него первый SAVEPOINT открывал бы транзакцию сам, а его RELEASE
+        её фиксировал. Для других СУБД ничего не делает.
+        """
+        if session.get_bind().dialect.name != "sqlite":
+            return
+        connection = await session.connection()
+        raw = await connection.get_raw_connection()
+        if not raw.driver_connection.in_transaction:
+            await connection.exec_driver_sql(statement)
+
+    async def snapshot(self) -> None:
+        """Открывает читающую транзакцию: до commit() все чтения видят один снимок БД."""
+        await self._begin(self.session(), "BEGIN")
+
+    @asynccontextmanager
+    async def transaction(self) -> AsyncIterator[None]:
+        """Одна транзакция на весь блок: commit() внутри откладываются до выхода,
+        исключение откатывает всё.
+
+        Блок пишет, поэтому блокировка записи берётся сразу (BEGIN IMMEDIATE):
+        её ожидание покрывает busy_timeout, а повышение из читающей транзакции - нет.
+        """
+        if self._deferred:
+            raise RuntimeError("транзакция уже открыта")
+        self._deferred = True
+        try:
+            await self._begin(self.session(write=True), "BEGIN IMMEDIATE")
+            yield
+        except BaseException:
+            self._deferred = False
+            await self.rollback()
+            raise
+        self._deferred = False
+        await self.commit()
+
+    @asynccontextmanager
+    async def savepoint(self) -> AsyncIterator[None]:
+        """SAVEPOINT на сессии записи: исключение откатывает только этот блок.
+
+        Карта идентичности при откате очищается - в ней могли остаться
+        объекты с изменениями, которых больше нет в БД.
+        """
+        nested = await self.session(write=True).begin_nested()
+        try:
+            yield
+        except BaseException:
+            await nested.rollback()
+            self.identity_map.clear()
+            raise
+        await nested.commit()
+
+    async def __aenter__(self) -> "UnitOfWork":
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb) -> None:
+        if exc_type is not None:
+            await self.rollback()
+        await self.close()
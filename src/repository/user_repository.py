@@ -1,69 +1,192 @@
-from sqlalchemy import select, insert
-from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+from typing import AsyncIterator
+
+from sqlalchemy import insert, or_, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from domain.user import User
-from repository.tables import users as users_table
+from repository.bulk import insert_returning_ids
+from repository.cache import LRUCache
+from repository.hydration import user_from_row
+from repository.loader import BatchLoader
+from repository.pagination import STREAM_CHUNK_SIZE, Page, make_page
+from repository.tables import comments as comments_table, posts as posts_table, users as users_table
+from repository.unit_of_work import UnitOfWork
 
 
 class UserRepository:
-    """Репозиторий пользователей."""
-    def __init__(self, session_factory: async_sessionmaker[AsyncSession] | None = None) -> None:
-        self.session_factory = session_factory
+    """Репозиторий пользователей.
+
+    username_cache - общий для процесса кэш username -> User; сбрасывается в save.
+    Внутри transaction() кэш не пополняется: прочитанный там пользователь мог
+    быть создан в этой же транзакции и исчезнуть при её откате.
+    """
+    def __init__(
+        self,
+        uow: UnitOfWork | None = None,
+        username_cache: LRUCache[str, User] | None = None,
+    ) -> None:
+        self.uow = uow
+        self.username_cache = username_cache
+        self._batch_loader: BatchLoader[int, User] | None = None
+
+    def _session(self, write: bool = False) -> AsyncSession:
+        if self.uow is None:
+            raise RuntimeError("unit of work не инициализирован")
+        return self.uow.session(write)
+
+    def _remember(self, user: User) -> None:
+        if self.username_cache is not None and not self.uow.in_transaction:
+            self.username_cache.put(user.username, user)
 
     async def save(self, user: User) -> User:
-        if self.session_factory is None:
-            raise RuntimeError("session_factory не инициализирован")
-
-        async with self.session_factory() as session:
-            async with session.begin():
-                stmt = insert(users_table).values(
-                    username=user.username,
-                    created_date=user.created_date,
-                )
-                result = await session.execute(stmt)
-                user_id = result.inserted_primary_key[0]
-                user.id = int(user_id)
+        session = self._session(write=True)
+        if self.username_cache is not None:
+            self.username_cache.invalidate(user.username)
+        stmt = insert(users_table).values(
+            username=user.username,
+            created_date=user.created_date,
+        )
+        try:
+            result = await session.execute(stmt)
+        except IntegrityError:
+            raise ValueError("пользователь с таким именем уже существует")
+        user_id = result.inserted_primary_key[0]
+        user.id = int(user_id)
+        self.uow.identity_map.users[user.id] = user
         return user
 
+    async def save_many(self, users: list[User]) -> list[User]:
+        """Вставляет пользователей одним многострочным INSERT и проставляет id."""
+        session = self._session(write=True)
+        if self.username_cache is not None:
+            for user in users:
+                self.username_cache.invalidate(user.username)
+        rows = [{"username": u.username, "created_date": u.created_date} for u in users]
+        try:
+            ids = await insert_returning_ids(session, users_table, rows)
+        except IntegrityError:
+            raise ValueError("пользователь с таким именем уже существует")
+        for user, user_id in zip(users, ids):
+            user.id = user_id
+            self.uow.identity_map.users[user.id] = user
+        return users
+
     async def find_by_username(self, username: str) -> User | None:
-        if self.session_factory is None:
-            raise RuntimeError("session_factory не инициализирован")
+        session = self._session()
+        if self.username_cache is not None:
+            cached = self.username_cache.get(username)
+            if cached is not None:
+                return self.uow.identity_map.users.setdefault(cached.id, cached)
 
-        async with self.session_factory() as session:
-            stmt = select(users_table).where(users_table.c.username == username)
-            result = await session.execute(stmt)
-            row = result.mappings().one_or_none()
-            if row is None:
-                return None
-            return self._row_to_user(row)
+        stmt = select(users_table).where(users_table.c.username == username)
+        result = await session.execute(stmt)
+        row = result.mappings().one_or_none()
+        if row is None:
+            return None
+        user = self._row_to_user(row)
+        self._remember(user)
+        return user
+
+    async def find_by_usernames(self, usernames: list[str]) -> dict[str, User]:
+        """Пользователи по именам: из кэша, остальные - одним запросом IN (...)."""
+        found: dict[str, User] = {}
+        missing: list[str] = []
+        for username in dict.fromkeys(usernames):
+            cached = self.username_cache.get(username) if self.username_cache is not None else None
+            if cached is not None:
+                found[username] = self.uow.identity_map.users.setdefault(cached.id, cached)
+            else:
+                missing.append(username)
+        if not missing:
+            return found
+
+        session = self._session()
+        stmt = select(users_table).where(users_table.c.username.in_(missing))
+        result = await session.execute(stmt)
+        for row in result.mappings().all():
+            user = self._row_to_user(row)
+            found[user.username] = user
+            self._remember(user)
+        return found
 
     async def find_by_id(self, id: int) -> User | None:
-        if self.session_factory is None:
-            raise RuntimeError("session_factory не инициализирован")
+        return await self.load(id)
 
-        async with self.session_factory() as session:
-            stmt = select(users_table).where(users_table.c.id == id)
-            result = await session.execute(stmt)
-            row = result.mappings().one_or_none()
-            if row is None:
-                return None
-            return self._row_to_user(row)
+    async def load(self, id: int) -> User | None:
+        """Пользователь по id: из карты идентичности или пакетом вместе с соседними load."""
+        return await self._loader().load(id)
+
+    async def load_many(self, ids: list[int]) -> list[User | None]:
+        return await self._loader().load_many(ids)
 
     async def find_all(self) -> list[User]:
-        if self.session_factory is None:
-            raise RuntimeError("session_factory не инициализирован")
+        session = self._session()
+        stmt = select(users_table)
+        result = await session.execute(stmt)
+        rows = result.mappings().all()
+        return [self._row_to_user(r) for r in rows]
 
-        async with self.session_factory() as session:
-            stmt = select(users_table)
-            result = await session.execute(stmt)
-            rows = result.mappings().all()
-            return [self._row_to_user(r) for r in rows]
-
-    @staticmethod
-    def _row_to_user(row) -> User:
-        user = User(
-            username=row["username"],
-            created_date=row["created_date"],
-            id=int(row["id"])
+    async def find_page(self, limit: int, after_id: int | None = None) -> Page[User]:
+        """Keyset-страница пользователей в порядке id."""
+        session = self._session()
+        stmt = select(users_table).order_by(users_table.c.id).limit(limit + 1)
+        if after_id is not None:
+            stmt = stmt.where(users_table.c.id > after_id)
+        result = await session.execute(stmt)
+        rows = result.mappings().all()
+        return make_page([self._row_to_user(r) for r in rows], limit)
+
+    async def stream_all(self, after_id: int | None = None) -> AsyncIterator[User]:
+        """Пользователи в порядке id по мере чтения серверного курсора.
+
+        Объекты не попадают в карту идентичности - память не растёт с выборкой.
+        """
+        session = self._session()
+        stmt = (
+            select(users_table)
+            .order_by(users_table.c.id)
+            .execution_options(yield_per=STREAM_CHUNK_SIZE)
         )
-        return user
+        if after_id is not None:
+            stmt = stmt.where(users_table.c.id > after_id)
+        result = await session.stream(stmt)
+        async for row in result.mappings():
+            yield user_from_row(row)
+
+    async def stream_authors(self, post_id: int) -> AsyncIterator[User]:
+        """Автор поста и авторы его комментариев (каждый один раз) в порядке id.
+
+        Уникальность обеспечивает сама БД (IN по подзапросу), а не множество в памяти.
+        """
+        session = self._session()
+        comment_authors = select(comments_table.c.author_id).where(comments_table.c.post_id == post_id)
+        post_author = select(posts_table.c.author_id).where(posts_table.c.id == post_id)
+        stmt = (
+            select(users_table)
+            .where(or_(users_table.c.id.in_(comment_authors), users_table.c.id.in_(post_author)))
+            .order_by(users_table.c.id)
+            .execution_options(yield_per=STREAM_CHUNK_SIZE)
+        )
+        result = await session.stream(stmt)
+        async for row in result.mappings():
+            yield user_from_row(row)
+
+    def _loader(self) -> BatchLoader[int, User]:
+        if self.uow is None:
+            raise RuntimeError("unit of work не инициализирован")
+        if self._batch_loader is None:
+            self._batch_loader = BatchLoader(
+                self._load_batch, self.uow.identity_map.users, self.uow.lock
+            )
+        return self._batch_loader
+
+    async def _load_batch(self, ids: list[int]) -> dict[int, User]:
+        session = self._session()
+        stmt = select(users_table).where(users_table.c.id.in_(ids))
+        result = await session.execute(stmt)
+        users = [self._row_to_user(r) for r in result.mappings().all()]
+        return {user.id: user for user in users}
+
+    def _row_to_user(self, row) -> User:
+        return user_from_row(row, users_map=self.uow.identity_map.users)
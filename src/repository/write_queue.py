@@ -0,0 +1,174 @@
+import asyncio
+import time
+
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from domain.comment import Comment
+from repository.repository import Repository
+
+
+def _counters(comments: list[Comment]) -> list[tuple[object, str, int]]:
+    """Счётчики поста и родителей, которые save/save_many увеличивают в памяти.
+
+    Их увеличение происходит до commit: если он не удался, значения нужно
+    вернуть, иначе повторное сохранение посчитает комментарии дважды.
+    """
+    saved: dict[int, tuple[object, str, int]] = {}
+    for comment in comments:
+        saved.setdefault(id(comment.post), (comment.post, "comment_count", comment.post.comment_count))
+        if comment.parent is not None:
+            parent = comment.parent
+            saved.setdefault(id(parent), (parent, "reply_count", parent.reply_count))
+    return list(saved.values())
+
+
+def _restore(counters: list[tuple[object, str, int]]) -> None:
+    for obj, name, value in counters:
+        setattr(obj, name, value)
+
+
+class CommentWriteQueue:
+    """Групповая фиксация новых комментариев (group commit).
+
+    submit() ставит комментарий в очередь и ждёт, пока единственная задача-писатель
+    не зафиксирует его вместе с соседями: очередь разбирается каждые max_delay
+    секунд или сразу при накоплении max_batch элементов, весь пакет - один
+    save_many и один commit (один fsync вместо одного на комментарий).
+
+    Если пакет не удалось зафиксировать, его элементы сохраняются по одному,
+    и ошибка достаётся только тем вызывающим, чьи комментарии не записались.
+    Отмена ожидающего submit не отменяет запись: комментарий уже в пакете.
+    """
+
+    def __init__(
+        self,
+        session_factory: async_sessionmaker[AsyncSession],
+        max_batch: int = 100,
+        max_delay: float = 0.005,
+    ) -> None:
+        if max_batch <= 0:
+            raise ValueError("размер пакета должен быть положительным")
+        self.session_factory = session_factory
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self._queue: asyncio.Queue[tuple[Comment, asyncio.Future] | None] = asyncio.Queue()
+        self._full = asyncio.Event()
+        self._task: asyncio.Task | None = None
+        # Наблюдаемость: размеры пакетов и время фиксации
+        self.batches = 0
+        self.items = 0
+        self.max_batch_seen = 0
+        self.fallbacks = 0
+        self.commit_seconds_total = 0.0
+        self.commit_seconds_max = 0.0
+        self.last_commit_seconds = 0.0
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self) -> None:
+        """Дописать всё, что уже в очереди, и остановить писателя."""
+        if self._task is None:
+            return
+        self._queue.put_nowait(None)
+        self._full.set()
+        await self._task
+        self._task = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None
+
+    async def submit(self, comment: Comment) -> Comment:
+        """Сохранить комментарий в ближайшем пакете; после возврата у него есть id."""
+        if self._task is None:
+            raise RuntimeError("очередь записи не запущена")
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((comment, future))
+        if self._queue.qsize() >= self.max_batch:
+            self._full.set()
+        await future
+        return comment
+
+    async def _run(self) -> None:
+        stopping = False
+        while not stopping:
+            first = await self._queue.get()
+            if first is None:
+                break
+            if self._queue.qsize() < self.max_batch - 1:
+                # Копим пакет до max_delay, если он не наберётся раньше
+                try:
+                    await asyncio.wait_for(self._full.wait(), self.max_delay)
+                except asyncio.TimeoutError:
+                    pass
+
+            batch = [first]
+            while len(batch) < self.max_batch and not self._queue.empty():
+                item = self._queue.get_nowait()
+                if item is None:
+                    stopping = True
+                    break
+                batch.append(item)
+            if self._queue.qsize() < self.max_batch:
+                self._full.clear()
+
+            await self._flush(batch)
+
+    async def _flush(self, batch: list[tuple[Comment, asyncio.Future]]) -> None:
+        comments = [comment for comment, _ in batch]
+        counters = _counters(comments)
+        started = time.perf_counter()
+        try:
+            async with Repository(self.session_factory) as repos:
+                await repos.comments.save_many(comments)
+                await repos.commit()
+        except Exception:
+            self.fallbacks += 1
+            _restore(counters)
+            for comment in comments:
+                comment.id = None
+            for comment, future in batch:
+                await self._save_one(comment, future)
+        else:
+            for _, future in batch:
+                if not future.done():
+                    future.set_result(None)
+        self._observe(len(batch), time.perf_counter() - started)
+
+    async def _save_one(self, comment: Comment, future: asyncio.Future) -> None:
+        counters = _counters([comment])
+        try:
+            async with Repository(self.session_factory) as repos:
+                await repos.comments.save(comment)
+                await repos.commit()
+        except Exception as e:
+            _restore(counters)
+            comment.id = None
+            if not future.done():
+                future.set_exception(e)
+        else:
+            if not future.done():
+                future.set_result(None)
+
+    def _observe(self, size: int, seconds: float) -> None:
+        self.batches += 1
+        self.items += size
+        self.max_batch_seen = max(self.max_batch_seen, size)
+        self.last_commit_seconds = seconds
+        self.commit_seconds_total += seconds
+        self.commit_seconds_max = max(self.commit_seconds_max, seconds)
+
+    def stats(self) -> dict[str, float]:
+        return {
+            "queued": self._queue.qsize(),
+            "batches": self.batches,
+            "items": self.items,
+            "avg_batch": self.items / self.batches if self.batches else 0.0,
+            "max_batch": self.max_batch_seen,
+            "fallbacks": self.fallbacks,
+            "commit_ms_avg": 1000 * self.commit_seconds_total / self.batches if self.batches else 0.0,
+            "commit_ms_max": 1000 * self.commit_seconds_max,
+            "commit_ms_last": 1000 * self.last_commit_seconds,
+        }
@@ -1,28 +1,195 @@
+from contextlib import contextmanager
+from typing import Iterator, NamedTuple
+
 from domain.comment import Comment
 from domain.post import Post
 from domain.user import User
+from repository.cache import CommentTree, CommentTreeCache
+from repository.pagination import Page
 from repository.repository import Repository
+from repository.write_queue import CommentWriteQueue
+
+
+class NewComment(NamedTuple):
+    """Комментарий для пакетного создания.
+
+    Родитель задаётся либо parent_index (позиция более раннего элемента пакета),
+    либо parent_id (уже существующий комментарий того же поста).
+    """
+    username: str
+    text: str
+    parent_index: int | None = None
+    parent_id: int | None = None
 
 
 class CommentService:
-    def __init__(self, repositories: Repository) -> None:
+    def __init__(
+        self,
+        repositories: Repository,
+        tree_cache: CommentTreeCache | None = None,
+        write_queue: CommentWriteQueue | None = None,
+    ) -> None:
         self.repositories = repositories
+        self.tree_cache = tree_cache
+        self.write_queue = write_queue
 
     async def add_comment_to_post(self, post_id: int, username: str, text: str) -> Comment:
         post = await self._require_post(post_id)
         author = await self._require_user(username)
         comment = Comment.for_post(post, text, author)
-        return await self.repositories.comments.save(comment)
+        return await self._save(comment)
 
     async def reply_to_comment(self, comment_id: int, username: str, text: str) -> Comment:
         parent = await self._require_comment(comment_id)
         author = await self._require_user(username)
         reply = Comment.reply_to(parent, text, author)
-        return await self.repositories.comments.save(reply)
+        return await self._save(reply)
+
+    async def add_comments_to_post(self, post_id: int, items: list[NewComment]) -> list[Comment]:
+        """Создаёт пакет комментариев (с ответами внутри пакета) в одной транзакции."""
+        post = await self._require_post(post_id)
+        authors = await self.repositories.users.find_by_usernames([i.username for i in items])
+        parent_ids = list({i.parent_id for i in items if i.parent_id is not None})
+        parents = {
+            c.id: c
+            for c in await self.repositories.comments.load_many(parent_ids)
+            if c is not None and c.post.id == post.id
+        }
+
+        comments: list[Comment] = []
+        for index, item in enumerate(items):
+            author = authors.get(item.username)
+            if author is None:
+                raise LookupError(f"пользователь не найден: {item.username}")
+            if item.parent_index is not None and item.parent_id is not None:
+                raise ValueError("нужно указать либо parent_index, либо parent_id")
+
+            if item.parent_index is not None:
+                if not 0 <= item.parent_index < index:
+                    raise ValueError("parent_index должен ссылаться на комментарий выше в пакете")
+                comment = Comment.reply_to(comments[item.parent_index], item.text, author)
+            elif item.parent_id is not None:
+                if item.parent_id not in parents:
+                    raise LookupError(f"комментарий не найден: {item.parent_id}")
+                comment = Comment.reply_to(parents[item.parent_id], item.text, author)
+            else:
+                comment = Comment.for_post(post, item.text, author)
+            comments.append(comment)
+
+        with self._cache_window(comments):
+            await self.repositories.comments.save_many(comments)
+            await self.repositories.commit()
+        return comments
 
     async def get_comments_for_post(self, post_id: int) -> list[Comment]:
         post = await self._require_post(post_id)
-        return await self.repositories.comments.find_by_post(post.id)
+        return await self.repositories.comments.find_by_post(post.id, post=post)
+
+    async def get_comments_page(
+        self,
+        post_id: int,
+        limit: int,
+        after_id: int | None = None,
+        max_depth: int | None = None,
+        roots_only: bool = False,
+        version: int | None = None,
+    ) -> Page[Comment]:
+        """Страница комментариев поста.
+
+        С roots_only в items остаются только корни, ответы доступны через replies;
+        иначе items - плоский список всех загруженных комментариев.
+        Полные деревья (без max_depth) отдаются из tree_cache, если он подключён.
+        version - версия поста, уже прочитанная вызывающим в этой единице работы;
+        без неё сервис читает её сам.
+        """
+        if self.tree_cache is not None and max_depth is None:
+            if version is None:
+                version = await self.repositories.posts.get_version(post_id)
+                if version is None:
+                    raise LookupError("пост не найден")
+            tree = await self._cached_tree(post_id, version)
+            if tree is not None:
+                return tree.page(limit, after_id, roots_only)
+
+        post = await self._require_post(post_id)
+        page = await self.repositories.comments.find_page_by_post(
+            post.id, limit, after_id, max_depth, post=post
+        )
+        if roots_only:
+            page.items = [c for c in page.items if c.parent is None]
+        return page
+
+    async def get_thread(self, comment_id: int, max_depth: int | None = None) -> Comment:
+        comment = await self.repositories.comments.find_thread(comment_id, max_depth)
+        if comment is None:
+            raise LookupError("комментарий не найден")
+        return comment
+
+    async def _save(self, comment: Comment) -> Comment:
+        """Одиночное сохранение; с write_queue - в общем пакете с соседними запросами."""
+        with self._cache_window([comment]):
+            if self.write_queue is not None and self.write_queue.running:
+                # Завершаем читающую транзакцию: иначе ждущие пакета запросы
+                # держат соединения пула, и писателю может не хватить своего
+                await self.repositories.commit()
+                await self.write_queue.submit(comment)
+            else:
+                await self.repositories.comments.save(comment)
+                await self.repositories.commit()
+        return comment
+
+    @contextmanager
+    def _cache_window(self, comments: list[Comment]) -> Iterator[None]:
+        """Сохранение комментариев с последующей дописью в кэш деревьев.
+
+        Пока идёт commit, деревья их постов читаются из БД, а не из кэша:
+        иначе читатель мог бы получить новую версию поста со старым деревом.
+        """
+        if self.tree_cache is None:
+            yield
+            return
+
+        post_ids = {c.post.id for c in comments}
+        for post_id in post_ids:
+            self.tree_cache.begin_write(post_id)
+        try:
+            yield
+            for comment in comments:
+                self.tree_cache.add(comment)
+        finally:
+            for post_id in post_ids:
+                self.tree_cache.end_write(post_id)
+
+    async def _cached_tree(self, post_id: int, version: int) -> CommentTree | None:
+        """Дерево версии version из кэша или из БД; None - читать страницу из БД.
+
+        Дерево старее БД (комментарий добавил другой процесс) выбрасывается
+        и загружается заново. Дерево новее прочитанной версии (запись этого
+        процесса после начала запроса) остаётся в кэше, а запрос читает БД.
+        """
+        tree = self.tree_cache.get(post_id)
+        if tree is not None:
+            if tree.version == version:
+                return tree
+            if tree.version > version:
+                return None
+            self.tree_cache.invalidate(post_id)
+
+        load_version = self.tree_cache.start_load(post_id)
+        try:
+            post = await self._require_post(post_id)
+            comments = await self.repositories.comments.find_by_post(post.id, post=post)
+            # Чтение идёт не из одного снимка: если за время загрузки другой
+            # процесс добавил комментарий, дерево может не соответствовать version
+            if await self.repositories.posts.get_version(post_id) != version:
+                self.tree_cache.abort_load(post_id)
+                return None
+            tree = CommentTree(post, comments, version)
+        except BaseException:
+            self.tree_cache.abort_load(post_id)
+            raise
+        self.tree_cache.put(tree, load_version)
+        return tree
 
     async def _require_user(self, username: str) -> User:
         user = await self.repositories.users.find_by_username(username)
@@ -0,0 +1,159 @@
+"""Потоковый экспорт постов с деревьями комментариев в JSONL или CSV.
+
+JSONL - формат импорта (service/import_service.py): сначала записи user
+(все пользователи или автор поста и авторы его комментариев), затем каждый
+пост и его комментарии плоско, в порядке обхода дерева. Ссылки - "p<id>" и
+"c<id>", parent всегда указывает на уже выведенный комментарий, поэтому файл
+можно загрузить командой import в другую базу.
+
+CSV - одна строка на пост или комментарий (колонки CSV_COLUMNS); текст поста -
+в колонке text.
+
+Всё читается серверными курсорами (stream_*): в памяти держится только
+цепочка предков текущего комментария, расход памяти не зависит от размера
+ветки. Выгрузка идёт в одной транзакции чтения, то есть из одного снимка БД.
+"""
+import csv
+import io
+import json
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, AsyncIterator
+
+from domain.comment import Comment
+from domain.post import Post
+from domain.user import User
+from repository.repository import Repository
+
+
+EXPORT_FORMATS = ("jsonl", "csv")
+CSV_COLUMNS = ("type", "id", "post_id", "parent_id", "username", "created_at", "title", "text")
+
+
+@dataclass
+class ExportStats:
+    users: int = 0
+    posts: int = 0
+    comments: int = 0
+
+    @property
+    def rows(self) -> int:
+        return self.users + self.posts + self.comments
+
+
+def _iso(value: datetime) -> str:
+    return value.isoformat()
+
+
+class _JsonlWriter:
+    header = ""
+
+    @staticmethod
+    def _line(record: dict[str, Any]) -> str:
+        return json.dumps(record, ensure_ascii=False, separators=(",", ":")) + "\n"
+
+    def user(self, user: User) -> str:
+        return self._line({"type": "user", "username": user.username, "created_date": _iso(user.created_date)})
+
+    def post(self, post: Post) -> str:
+        return self._line({
+            "type": "post",
+            "ref": f"p{post.id}",
+            "username": post.author.username,
+            "title": post.title,
+            "content": post.content,
+            "created_at": _iso(post.created_at),
+        })
+
+    def comment(self, comment: Comment) -> str:
+        record = {"type": "comment", "ref": f"c{comment.id}", "post": f"p{comment.post_id}"}
+        if comment.parent is not None:
+            record["parent"] = f"c{comment.parent_id}"
+        record["username"] = comment.author.username
+        record["text"] = comment.text
+        record["created_at"] = _iso(comment.created_at)
+        return self._line(record)
+
+
+class _CsvWriter:
+    def __init__(self) -> None:
+        self._buffer = io.StringIO()
+        self._writer = csv.writer(self._buffer)
+        self.header = self._row(CSV_COLUMNS)
+
+    def _row(self, values: tuple) -> str:
+        self._writer.writerow(values)
+        text = self._buffer.getvalue()
+        self._buffer.seek(0)
+        self._buffer.truncate()
+        return text
+
+    def post(self, post: Post) -> str:
+        return self._row((
+            "post", post.id, post.id, "", post.author.username, _iso(post.created_at), post.title, post.content,
+        ))
+
+    def comment(self, comment: Comment) -> str:
+        return self._row((
+            "comment",
+            comment.id,
+            comment.post_id,
+            comment.parent_id or "",
+            comment.author.username,
+            _iso(comment.created_at),
+            "",
+            comment.text,
+        ))
+
+
+class ExportService:
+    def __init__(self, repositories: Repository) -> None:
+        self.repositories = repositories
+
+    def export(
+        self,
+        fmt: str,
+        post_id: int | None = None,
+        stats: ExportStats | None = None,
+    ) -> AsyncIterator[str]:
+        """Текст выгрузки кусками по записи: один пост или (post_id=None) все посты.
+
+        Несуществующий пост - LookupError при первом чтении итератора.
+        """
+        if fmt not in EXPORT_FORMATS:
+            raise ValueError(f"формат выгрузки: {', '.join(EXPORT_FORMATS)}")
+        return self._export(fmt, post_id, stats if stats is not None else ExportStats())
+
+    async def _export(self, fmt: str, post_id: int | None, stats: ExportStats) -> AsyncIterator[str]:
+        repos = self.repositories
+        # Пользователи выгружаются раньше постов: без общего снимка пост нового
+        # пользователя, созданного во время выгрузки, сослался бы на отсутствующую запись
+        await repos.snapshot()
+        if post_id is None:
+            posts = repos.posts.stream_all()
+        else:
+            post = await repos.posts.find_by_id(post_id)
+            if post is None:
+                raise LookupError("пост не найден")
+            posts = self._one(post)
+
+        writer = _JsonlWriter() if fmt == "jsonl" else _CsvWriter()
+        if writer.header:
+            yield writer.header
+        if fmt == "jsonl":
+            # Пользователи - до первого упоминания: импорт создаёт их раньше постов
+            users = repos.users.stream_all() if post_id is None else repos.users.stream_authors(post_id)
+            async for user in users:
+                stats.users += 1
+                yield writer.user(user)
+
+        async for post in posts:
+            stats.posts += 1
+            yield writer.post(post)
+            async for comment in repos.comments.stream_by_post(post.id, post=post):
+                stats.comments += 1
+                yield writer.comment(comment)
+
+    @staticmethod
+    async def _one(post: Post) -> AsyncIterator[Post]:
+        yield post
@@ -0,0 +1,330 @@
+"""Импорт пользователей, постов и комментариев из JSONL.
+
+Одна запись на строку, поле type задаёт вид:
+
+    {"type": "user", "username": "alice", "created_date": "2024-01-01T10:00:00"}
+    {"type": "post", "ref": "p1", "username": "alice", "title": "...", "content": "...",
+     "comments": [{"ref": "c1", "username": "bob", "text": "...", "replies": [...]}]}
+    {"type": "comment", "ref": "c2", "post": "p1", "parent": "c1", "username": "bob", "text": "..."}
+
+ref - ссылка из исходной системы (строка или число), по ней на запись ссылаются
+следующие строки; у комментария с parent поле post можно не указывать.
+Вложенные comments/replies ссылаются на родителя самой вложенностью.
+Даты (created_date, created_at) необязательны, в формате ISO 8601.
+Родитель должен встретиться в файле раньше ответа; пользователи, которые
+уже есть в БД, не создаются повторно.
+
+Файл читается потоково и фиксируется пакетами не меньше chunk_size записей
+(граница пакета - всегда граница строки). Вместе с каждым пакетом в той же
+транзакции сохраняются контрольная точка (смещение в файле) и новые ссылки,
+поэтому повторный запуск на том же файле продолжает с места прерывания.
+"""
+import json
+import os
+import time
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, BinaryIO, Callable, Iterator
+
+from domain.comment import Comment
+from domain.post import Post
+from domain.user import User
+from repository.import_repository import ImportCheckpoint
+from repository.repository import Repository
+
+
+DEFAULT_CHUNK_SIZE = 1000
+
+
+@dataclass
+class ImportStats:
+    source: str
+    started_line: int = 0
+    lines: int = 0
+    users: int = 0
+    users_skipped: int = 0
+    posts: int = 0
+    comments: int = 0
+    seconds: float = 0.0
+
+    @property
+    def rows(self) -> int:
+        return self.users + self.posts + self.comments
+
+    @property
+    def rows_per_second(self) -> float:
+        return self.rows / self.seconds if self.seconds else 0.0
+
+
+@dataclass(eq=False)
+class _Row:
+    """Запись файла; вложенные комментарии ссылаются на родительские _Row напрямую."""
+    kind: str
+    line: int
+    data: dict[str, Any]
+    post: "_Row | None" = None
+    parent: "_Row | None" = None
+    obj: Any = field(default=None, repr=False)
+
+    @property
+    def ref(self) -> str | None:
+        ref = self.data.get("ref")
+        return None if ref is None else str(ref)
+
+    def error(self, message: str) -> ValueError:
+        return ValueError(f"строка {self.line}: {message}")
+
+
+def _flatten(record: Any, line: int) -> Iterator[_Row]:
+    """Записи строки в порядке «родитель раньше ответов» (без рекурсии)."""
+    if not isinstance(record, dict) or record.get("type") not in ("user", "post", "comment"):
+        raise ValueError(f"строка {line}: ожидается объект с type user, post или comment")
+    root = _Row(record["type"], line, record)
+    yield root
+
+    nested_key = "comments" if root.kind == "post" else "replies"
+    stack = [(root, child) for child in reversed(record.get(nested_key) or [])]
+    while stack:
+        parent, data = stack.pop()
+        if not isinstance(data, dict):
+            raise ValueError(f"строка {line}: вложенный комментарий должен быть объектом")
+        row = _Row(
+            "comment",
+            line,
+            data,
+            post=parent if parent.kind == "post" else parent.post,
+            parent=parent if parent.kind == "comment" else None,
+        )
+        yield row
+        stack.extend((row, child) for child in reversed(data.get("replies") or []))
+
+
+class ImportService:
+    def __init__(self, repositories: Repository, chunk_size: int = DEFAULT_CHUNK_SIZE) -> None:
+        if chunk_size <= 0:
+            raise ValueError("размер пакета должен быть положительным")
+        self.repositories = repositories
+        self.chunk_size = chunk_size
+        # (вид, ссылка из файла) -> id в БД; восстанавливается из import_refs при продолжении
+        self.refs: dict[tuple[str, str], int] = {}
+
+    async def import_jsonl(
+        self,
+        path: str,
+        on_progress: Callable[[ImportStats], None] | None = None,
+    ) -> ImportStats:
+        """Импортировать файл (или его непройденный остаток); ValueError - ошибка в данных."""
+        source = os.path.abspath(path)
+        repos = self.repositories
+        checkpoint = await repos.imports.get_checkpoint(source)
+        if checkpoint is None:
+            checkpoint = ImportCheckpoint(0, 0, 0)
+            self.refs = {}
+        else:
+            self.refs = await repos.imports.load_refs(source)
+        await repos.close()
+
+        stats = ImportStats(source, started_line=checkpoint.line)
+        started = time.perf_counter()
+        with open(path, "rb") as file:
+            if os.fstat(file.fileno()).st_size < checkpoint.byte_offset:
+                raise ValueError("файл короче сохранённой контрольной точки: он изменился")
+            file.seek(checkpoint.byte_offset)
+            for rows, checkpoint in self._chunks(file, checkpoint):
+                await self._import_chunk(source, rows, checkpoint, stats)
+                stats.lines = checkpoint.line - stats.started_line
+                stats.seconds = time.perf_counter() - started
+                if on_progress is not None:
+                    on_progress(stats)
+        stats.seconds = time.perf_counter() - started
+        return stats
+
+    def _chunks(
+        self, file: BinaryIO, checkpoint: ImportCheckpoint
+    ) -> Iterator[tuple[list[_Row], ImportCheckpoint]]:
+        """Пакеты записей и контрольная точка после каждого из них."""
+        offset, line, total = checkpoint.byte_offset, checkpoint.line, checkpoint.rows
+        committed_line = line
+        rows: list[_Row] = []
+        for raw in file:
+            offset += len(raw)
+            line += 1
+            if raw.strip():
+                try:
+                    record = json.loads(raw)
+                except ValueError as e:
+                    raise ValueError(f"строка {line}: некорректный JSON ({e})")
+                rows.extend(_flatten(record, line))
+            if len(rows) >= self.chunk_size:
+                total += len(rows)
+                committed_line = line
+                yield rows, ImportCheckpoint(offset, line, total)
+                rows = []
+        if rows or line != committed_line:
+            # Остаток файла (в том числе одни пустые строки - чтобы сдвинуть контрольную точку)
+            yield rows, ImportCheckpoint(offset, line, total + len(rows))
+
+    async def _import_chunk(
+        self, source: str, rows: list[_Row], checkpoint: ImportCheckpoint, stats: ImportStats
+    ) -> None:
+        repos = self.repositories
+        authors = await self._resolve_users(rows, stats)
+        posts = [self._make_post(row, authors) for row in rows if row.kind == "post"]
+        await repos.posts.save_many(posts)
+
+        comment_rows = [row for row in rows if row.kind == "comment"]
+        loaded_posts, loaded_parents = await self._load_targets(comment_rows)
+        # Записи этого пакета по ссылкам: на них могут ссылаться следующие строки пакета
+        local: dict[tuple[str, str], Any] = {}
+        for row in rows:
+            if row.kind == "comment":
+                self._make_comment(row, authors, local, loaded_posts, loaded_parents)
+            if row.kind != "user" and row.ref is not None:
+                if (row.kind, row.ref) in local:
+                    raise row.error(f"ссылка {row.kind} {row.ref} уже встречалась")
+                local[(row.kind, row.ref)] = row.obj
+        await repos.comments.save_many([row.obj for row in comment_rows])
+
+        new_refs = {key: obj.id for key, obj in local.items()}
+        await repos.imports.save_refs(source, new_refs)
+        await repos.imports.save_checkpoint(source, checkpoint)
+        await repos.commit()
+        # Объекты пакета больше не нужны: карта идентичности не растёт от пакета к пакету
+        await repos.close()
+
+        self.refs.update(new_refs)
+        stats.posts += len(posts)
+        stats.comments += len(comment_rows)
+
+    async def _resolve_users(self, rows: list[_Row], stats: ImportStats) -> dict[str, User]:
+        """Авторы пакета по username; пользователи из записей user создаются, если их нет."""
+        names = []
+        for row in rows:
+            username = row.data.get("username")
+            if not isinstance(username, str) or not username:
+                raise row.error("нужен username")
+            names.append(username)
+        users = await self.repositories.users.find_by_usernames(names)
+
+        new_users: list[User] = []
+        for row in rows:
+            if row.kind != "user":
+                continue
+            username = row.data["username"]
+            if username in users:
+                stats.users_skipped += 1
+                continue
+            try:
+                user = User(username, self._datetime(row, "created_date"))
+            except ValueError as e:
+                raise row.error(str(e))
+            users[username] = user
+            new_users.append(user)
+        await self.repositories.users.save_many(new_users)
+        stats.users += len(new_users)
+        return users
+
+    def _make_post(self, row: _Row, authors: dict[str, User]) -> Post:
+        self._check_new_ref(row, "post")
+        try:
+            row.obj = Post(
+                row.data.get("title"),
+                row.data.get("content"),
+                self._author(row, authors),
+                created_at=self._datetime(row, "created_at"),
+            )
+        except ValueError as e:
+            raise row.error(str(e))
+        return row.obj
+
+    async def _load_targets(self, rows: list[_Row]) -> tuple[dict[int, Post], dict[int, Comment]]:
+        """Посты и родительские комментарии из прошлых пакетов, на которые ссылается пакет."""
+        post_ids: set[int] = set()
+        parent_ids: set[int] = set()
+        for row in rows:
+            if row.parent is None and row.data.get("parent") is not None:
+                parent_id = self.refs.get(("comment", str(row.data["parent"])))
+                if parent_id is not None:
+                    parent_ids.add(parent_id)
+            if row.post is None and row.data.get("post") is not None:
+                post_id = self.refs.get(("post", str(row.data["post"])))
+                if post_id is not None:
+                    post_ids.add(post_id)
+
+        posts = await self.repositories.posts.load_many(list(post_ids))
+        parents = await self.repositories.comments.load_many(list(parent_ids))
+        return (
+            {p.id: p for p in posts if p is not None},
+            {c.id: c for c in parents if c is not None},
+        )
+
+    def _make_comment(
+        self,
+        row: _Row,
+        authors: dict[str, User],
+        local: dict[tuple[str, str], Any],
+        loaded_posts: dict[int, Post],
+        loaded_parents: dict[int, Comment],
+    ) -> None:
+        self._check_new_ref(row, "comment")
+        parent = row.parent.obj if row.parent is not None else None
+        if parent is None and row.data.get("parent") is not None:
+            parent = self._lookup(row, "comment", row.data["parent"], local, loaded_parents)
+
+        post = row.post.obj if row.post is not None else None
+        if post is None and row.data.get("post") is not None:
+            post = self._lookup(row, "post", row.data["post"], local, loaded_posts)
+        if post is None and parent is not None:
+            post = parent.post
+        if post is None:
+            raise row.error("у комментария нет ни post, ни parent")
+        if parent is not None and parent.post.id != post.id:
+            raise row.error("родительский комментарий относится к другому посту")
+
+        try:
+            row.obj = Comment(
+                post=post,
+                author=self._author(row, authors),
+                text=row.data.get("text"),
+                parent=parent,
+                created_at=self._datetime(row, "created_at"),
+            )
+        except ValueError as e:
+            raise row.error(str(e))
+
+    def _lookup(
+        self,
+        row: _Row,
+        kind: str,
+        ref: Any,
+        local: dict[tuple[str, str], Any],
+        loaded: dict[int, Any],
+    ) -> Any:
+        key = (kind, str(ref))
+        if key in local:
+            return local[key]
+        target_id = self.refs.get(key)
+        if target_id is None or target_id not in loaded:
+            raise row.error(f"неизвестная ссылка {kind} {ref}")
+        return loaded[target_id]
+
+    def _check_new_ref(self, row: _Row, kind: str) -> None:
+        if row.ref is not None and (kind, row.ref) in self.refs:
+            raise row.error(f"ссылка {kind} {row.ref} уже импортирована")
+
+    @staticmethod
+    def _author(row: _Row, authors: dict[str, User]) -> User:
+        author = authors.get(row.data["username"])
+        if author is None:
+            raise row.error(f"пользователь не найден: {row.data['username']}")
+        return author
+
+    @staticmethod
+    def _datetime(row: _Row, key: str) -> datetime | None:
+        value = row.data.get(key)
+        if value is None:
+            return None
+        try:
+            return datetime.fromisoformat(value)
+        except (TypeError, ValueError):
+            raise row.error(f"{key}: ожидается дата в формате ISO 8601")
@@ -1,7 +1,16 @@
+from typing import NamedTuple
+
 from domain.post import Post
 from repository.repository import Repository
 
 
+class NewPost(NamedTuple):
+    """Пост для пакетного создания."""
+    username: str
+    title: str
+    content: str
+
+
 class PostService:
     def __init__(self, repositories: Repository) -> None:
         self.repositories = repositories
@@ -11,4 +20,19 @@ class PostService:
         if author is None:
             raise LookupError("пользователь не найден")
         post = Post(title, content, author)
-        return await self.repositories.posts.save(post)
+        await self.repositories.posts.save(post)
+        await self.repositories.commit()
+        return post
+
+    async def create_posts(self, items: list[NewPost]) -> list[Post]:
+        """Создаёт пакет постов одним INSERT в одной транзакции."""
+        authors = await self.repositories.users.find_by_usernames([i.username for i in items])
+        posts: list[Post] = []
+        for item in items:
+            author = authors.get(item.username)
+            if author is None:
+                raise LookupError(f"пользователь не найден: {item.username}")
+            posts.append(Post(item.title, item.content, author))
+        await self.repositories.posts.save_many(posts)
+        await self.repositories.commit()
+        return posts
@@ -0,0 +1,15 @@
+from repository.pagination import Page
+from repository.repository import Repository
+from repository.search_repository import SearchHit
+
+
+class SearchService:
+    def __init__(self, repositories: Repository) -> None:
+        self.repositories = repositories
+
+    async def search(self, query: str, limit: int, cursor: str | None = None) -> Page[SearchHit]:
+        """Посты и комментарии, где встречаются все слова запроса, по релевантности.
+
+        ValueError - пустой запрос или некорректный курсор.
+        """
+        return await self.repositories.search.search(query, limit, cursor)
@@ -1,4 +1,5 @@
 from domain.user import User
+from repository.pagination import Page
 from repository.repository import Repository
 
 
@@ -8,7 +9,16 @@ class UserService:
 
     async def create_user(self, username: str) -> User:
         user = User(username)
-        return await self.repositories.users.save(user)
+        await self.repositories.users.save(user)
+        await self.repositories.commit()
+        return user
+
+    async def create_users(self, usernames: list[str]) -> list[User]:
+        """Создаёт пакет пользователей одним INSERT в одной транзакции."""
+        users = [User(username) for username in usernames]
+        await self.repositories.users.save_many(users)
+        await self.repositories.commit()
+        return users
 
     async def find_by_id(self, id: int) -> User:
         user = await self.repositories.users.find_by_id(id)
@@ -18,3 +28,6 @@ class UserService:
 
     async def find_all(self) -> list[User]:
         return await self.repositories.users.find_all()
+
+    async def find_page(self, limit: int, after_id: int | None = None) -> Page[User]:
+        return await self.repositories.users.find_page(limit, after_id)
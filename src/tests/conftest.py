@@ -0,0 +1,64 @@
+"""Общие фикстуры: приложение и репозитории поверх временной БД SQLite.
+
+Настройки читаются из окружения при импорте config, поэтому DATABASE_URL
+задаётся до импорта модулей приложения. Тесты запускаются из src:
+python -m pytest tests
+"""
+import asyncio
+import importlib.util
+import os
+import sys
+import tempfile
+import uuid
+from pathlib import Path
+
+import pytest
+
+SRC = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(SRC))
+
+_db_dir = tempfile.mkdtemp(prefix="commenthub-tests-")
+DATABASE_URL = f"sqlite+aiosqlite:///{_db_dir}/commenthub.db"
+os.environ["DATABASE_URL"] = DATABASE_URL
+
+from fastapi.testclient import TestClient  # noqa: E402
+from sqlalchemy.ext.asyncio import async_sessionmaker  # noqa: E402
+from sqlalchemy.pool import NullPool  # noqa: E402
+
+from repository.engine import create_engine  # noqa: E402
+from repository.migrations import migrate  # noqa: E402
+from repository.repository import Repository  # noqa: E402
+
+
+def _load_app():
+    # Модуль api.py затеняется пакетом api/ - загружаем его по пути
+    spec = importlib.util.spec_from_file_location("commenthub_app", SRC / "api.py")
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module.app
+
+
+@pytest.fixture(scope="session")
+def client():
+    with TestClient(_load_app()) as client:
+        yield client
+
+
+@pytest.fixture
+def new_repository(tmp_path):
+    """Фабрика Repository над отдельной пустой БД теста (с миграциями).
+
+    NullPool: каждый asyncio.run в тесте - свой цикл событий, соединения
+    между ними не переиспользуются.
+    """
+    engine = create_engine(f"sqlite+aiosqlite:///{tmp_path}/test.db", echo=False, poolclass=NullPool)
+    session_factory = async_sessionmaker(engine, expire_on_commit=False)
+    asyncio.run(migrate(engine))
+    yield lambda **kwargs: Repository(session_factory, **kwargs)
+    asyncio.run(engine.dispose())
+
+
+@pytest.fixture
+def unique():
+    """Уникальные имена: БД приложения общая для всех тестов сессии."""
+    return lambda prefix: f"{prefix}-{uuid.uuid4().hex[:10]}"
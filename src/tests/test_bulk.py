@@ -0,0 +1,20 @@
+import asyncio
+from datetime import datetime
+
+from repository.bulk import insert_returning_ids
+from repository.tables import users as users_table
+
+
+def test_ids_follow_parameter_order(new_repository):
+    rows = [
+        {"id": id_, "username": f"u{id_}", "created_date": datetime(2024, 1, 1)}
+        for id_ in (50, 7, 30)
+    ]
+
+    async def run() -> list[int]:
+        async with new_repository() as repos:
+            ids = await insert_returning_ids(repos.uow.session(), users_table, rows)
+            await repos.commit()
+            return ids
+
+    assert asyncio.run(run()) == [50, 7, 30]
@@ -0,0 +1,47 @@
+import asyncio
+
+from sqlalchemy.ext.asyncio import async_sessionmaker
+from sqlalchemy.pool import NullPool
+
+from api.dependencies import comment_tree_cache
+from conftest import DATABASE_URL
+from repository.engine import create_engine
+from repository.repository import Repository
+from service.comment_service import CommentService
+
+
+def _add_comment_from_other_process(post_id: int, username: str, text: str) -> None:
+    """Как python main.py comment add: своё соединение, без кэша деревьев API."""
+    async def add():
+        engine = create_engine(DATABASE_URL, echo=False, poolclass=NullPool)
+        repos = Repository(async_sessionmaker(engine, expire_on_commit=False))
+        try:
+            await CommentService(repos).add_comment_to_post(post_id, username, text)
+        finally:
+            await repos.close()
+            await engine.dispose()
+
+    asyncio.run(add())
+
+
+def test_cached_tree_sees_comments_written_elsewhere(client, unique):
+    username = unique("author")
+    assert client.post("/users/", json={"username": username}).status_code == 201
+    post_id = client.post("/posts/", params={"username": username}, json={"title": "t", "content": "c"}).json()["id"]
+
+    first = client.get(f"/comments/post/{post_id}")
+    assert first.json()["items"] == []
+
+    _add_comment_from_other_process(post_id, username, "from-cli")
+
+    second = client.get(f"/comments/post/{post_id}")
+    assert second.headers["ETag"] != first.headers["ETag"]
+    assert [c["text"] for c in second.json()["items"]] == ["from-cli"]
+
+    # Комментарий через API после перезагрузки дерева добавляется в кэш инкрементально
+    reply = client.post(f"/comments/post/{post_id}", params={"username": username}, json={"text": "from-api"})
+    assert reply.status_code == 201
+    misses = comment_tree_cache.misses
+    third = client.get(f"/comments/post/{post_id}")
+    assert [c["text"] for c in third.json()["items"]] == ["from-cli", "from-api"]
+    assert comment_tree_cache.misses == misses
@@ -0,0 +1,48 @@
+import asyncio
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import async_sessionmaker
+from sqlalchemy.pool import NullPool
+
+from conftest import DATABASE_URL
+from repository.engine import create_engine
+from repository.repository import Repository
+
+
+async def _with_repository(action):
+    """Отдельное соединение с БД приложения, как у команд CLI."""
+    engine = create_engine(DATABASE_URL, echo=False, poolclass=NullPool)
+    repos = Repository(async_sessionmaker(engine, expire_on_commit=False))
+    try:
+        result = await action(repos)
+        await repos.commit()
+        return result
+    finally:
+        await repos.close()
+        await engine.dispose()
+
+
+def test_repair_counters_invalidates_etag_and_tree_cache(client, unique):
+    username = unique("author")
+    assert client.post("/users/", json={"username": username}).status_code == 201
+    post_id = client.post("/posts/", params={"username": username}, json={"title": "t", "content": "c"}).json()["id"]
+    root_id = client.post(f"/comments/post/{post_id}", params={"username": username}, json={"text": "root"}).json()["id"]
+    client.post(f"/comments/{root_id}/reply", params={"username": username}, json={"text": "reply"})
+
+    async def corrupt(repos):
+        session = repos.session(write=True)
+        await session.execute(text("UPDATE posts SET comment_count = 9 WHERE id = :id"), {"id": post_id})
+        await session.execute(text("UPDATE comments SET reply_count = 5 WHERE id = :id"), {"id": root_id})
+
+    asyncio.run(_with_repository(corrupt))
+    stale = client.get(f"/posts/{post_id}")
+    assert stale.json()["comment_count"] == 9
+    assert client.get(f"/comments/post/{post_id}").json()["items"][0]["reply_count"] == 5
+
+    fixed = asyncio.run(_with_repository(lambda repos: repos.comments.repair_counters()))
+    assert fixed == (1, 1)
+
+    repaired = client.get(f"/posts/{post_id}", headers={"If-None-Match": stale.headers["ETag"]})
+    assert repaired.status_code == 200
+    assert repaired.json()["comment_count"] == 2
+    assert client.get(f"/comments/post/{post_id}").json()["items"][0]["reply_count"] == 1
@@ -0,0 +1,29 @@
+import asyncio
+
+import pytest
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+
+from api.metrics import instrument_engine
+from repository.engine import create_engine
+
+
+def test_failed_statements_do_not_leak_timing_state(tmp_path):
+    # Одно соединение в пуле: ошибки накапливались бы в его info
+    engine = create_engine(
+        f"sqlite+aiosqlite:///{tmp_path}/metrics.db", echo=False, pool_size=1, max_overflow=0
+    )
+    instrument_engine(engine)
+
+    async def run() -> dict:
+        for _ in range(3):
+            async with engine.connect() as conn:
+                with pytest.raises(OperationalError):
+                    await conn.execute(text("SELECT * FROM no_such_table"))
+        async with engine.connect() as conn:
+            await conn.execute(text("SELECT 1"))
+            info = dict(conn.info)
+        await engine.dispose()
+        return info
+
+    assert "query_started" not in asyncio.run(run())
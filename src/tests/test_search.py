@@ -0,0 +1,28 @@
+from repository.search_repository import highlight, plain
+
+
+def test_snippet_escapes_user_text(client, unique):
+    username = unique("author")
+    word = unique("needle").replace("-", "")
+    assert client.post("/users/", json={"username": username}).status_code == 201
+    post = client.post(
+        "/posts/",
+        params={"username": username},
+        json={"title": "t", "content": f"<script>alert(1)</script> {word} & <b>bold</b>"},
+    ).json()
+
+    response = client.get("/search", params={"q": word})
+    assert response.status_code == 200
+    [hit] = response.json()["items"]
+    assert hit["id"] == post["id"]
+    assert hit["snippet"] == (
+        f"&lt;script&gt;alert(1)&lt;/script&gt; <b>{word}</b> &amp; &lt;b&gt;bold&lt;/b&gt;"
+    )
+
+
+def test_highlight_replaces_markers_after_escaping():
+    assert highlight("a \x02<i>\x03 b") == "a <b>&lt;i&gt;</b> b"
+
+
+def test_plain_drops_markers_without_escaping():
+    assert plain("a \x02<i>\x03 & b") == "a <i> & b"
@@ -0,0 +1,52 @@
+import json
+
+NDJSON = {"accept": "application/x-ndjson"}
+
+
+def _lines(response) -> list[dict]:
+    assert response.status_code == 200
+    return [json.loads(line) for line in response.text.splitlines()]
+
+
+def _create_users(client, unique, count: int) -> list[dict]:
+    response = client.post("/users/batch", json={"users": [{"username": unique("author")} for _ in range(count)]})
+    assert response.status_code == 201
+    return response.json()
+
+
+def test_ndjson_comments_keep_their_own_authors(client, unique):
+    users = _create_users(client, unique, 50)
+    post = client.post("/posts/", params={"username": users[0]["username"]}, json={"title": "t", "content": "c"})
+    post_id = post.json()["id"]
+    comments = [{"username": user["username"], "text": f"by {user['username']}"} for user in users for _ in range(3)]
+    response = client.post(f"/comments/post/{post_id}/batch", json={"comments": comments})
+    assert response.status_code == 201
+
+    streamed = _lines(client.get(f"/comments/post/{post_id}", headers=NDJSON))
+
+    assert len(streamed) == len(comments)
+    for item in streamed:
+        assert item["text"] == f"by {item['author']['username']}"
+
+
+def test_ndjson_posts_keep_their_own_authors(client, unique):
+    users = _create_users(client, unique, 30)
+    posts = [{"username": user["username"], "title": user["username"], "content": "c"} for user in users]
+    created = client.post("/posts/batch", json={"posts": posts}).json()
+
+    streamed = _lines(client.get("/posts/", headers=NDJSON))
+
+    by_id = {post["id"]: post for post in streamed}
+    for post in created:
+        assert by_id[post["id"]]["author"]["username"] == post["title"]
+
+
+def test_encoder_cache_keyed_by_user_id():
+    from api.encoders import MAX_CACHED_USERS, Encoder
+    from domain.user import User
+
+    encoder = Encoder()
+    for i in range(MAX_CACHED_USERS + 10):
+        # Объект освобождается сразу: его адрес достанется следующему
+        assert json.loads(encoder.user(User(f"u{i}", id=i)))["username"] == f"u{i}"
+    assert len(encoder._users) <= MAX_CACHED_USERS
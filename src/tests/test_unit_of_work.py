@@ -0,0 +1,98 @@
+import asyncio
+
+import pytest
+
+from service.user_service import UserService
+
+
+async def _usernames(repos) -> set[str]:
+    try:
+        return {user.username for user in await repos.users.find_all()}
+    finally:
+        await repos.close()
+
+
+def test_rolled_back_transaction_leaves_no_rows(new_repository):
+    async def scenario():
+        repos = new_repository()
+        users = UserService(repos)
+        with pytest.raises(RuntimeError):
+            async with repos.transaction():
+                for name in ("a", "b"):
+                    async with repos.savepoint():
+                        await users.create_user(name)
+                raise RuntimeError("откат всей группы")
+        await repos.close()
+        return await _usernames(new_repository())
+
+    assert asyncio.run(scenario()) == set()
+
+
+def test_failed_savepoint_rolls_back_only_itself(new_repository):
+    async def scenario():
+        repos = new_repository()
+        users = UserService(repos)
+        async with repos.transaction():
+            async with repos.savepoint():
+                await users.create_user("a")
+            with pytest.raises(ValueError):
+                async with repos.savepoint():
+                    await users.create_user("b")
+                    raise ValueError("откат одной команды")
+            async with repos.savepoint():
+                await users.create_user("c")
+            # До выхода из transaction() ничего не зафиксировано
+            assert await _usernames(new_repository()) == set()
+        await repos.close()
+        return await _usernames(new_repository())
+
+    assert asyncio.run(scenario()) == {"a", "c"}
+
+
+def test_concurrent_writers_on_shared_engine(new_repository, unique):
+    # Каждая запись сначала читает (пользователь, пост), потом пишет:
+    # из читающей транзакции SQLite повысить блокировку не даёт (SQLITE_BUSY)
+    from service.comment_service import CommentService
+    from service.post_service import PostService
+
+    username = unique("writer")
+
+    async def add(post_id: int, i: int) -> None:
+        async with new_repository() as repos:
+            await CommentService(repos).add_comment_to_post(post_id, username, f"comment {i}")
+
+    async def scenario():
+        async with new_repository() as repos:
+            await UserService(repos).create_user(username)
+            post = await PostService(repos).create_post(username, "t", "c")
+        await asyncio.gather(*(add(post.id, i) for i in range(8)))
+        async with new_repository() as repos:
+            return (await repos.posts.find_by_id(post.id)).comment_count
+
+    assert asyncio.run(scenario()) == 8
+
+
+def test_rolled_back_transaction_does_not_cache_users(new_repository):
+    from repository.cache import LRUCache
+    from service.post_service import PostService
+
+    cache = LRUCache(100)
+
+    async def scenario():
+        repos = new_repository(username_cache=cache)
+        with pytest.raises(RuntimeError):
+            async with repos.transaction():
+                async with repos.savepoint():
+                    await UserService(repos).create_user("ghost")
+                async with repos.savepoint():
+                    # Читает ещё не зафиксированного пользователя
+                    await PostService(repos).create_post("ghost", "t", "c")
+                raise RuntimeError("откат всей группы")
+        await repos.close()
+
+        async with new_repository(username_cache=cache) as repos:
+            with pytest.raises(LookupError):
+                await PostService(repos).create_post("ghost", "t", "c")
+
+    asyncio.run(scenario())
+    assert cache.get("ghost") is None
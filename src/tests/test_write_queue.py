@@ -0,0 +1,53 @@
+import asyncio
+
+from domain.comment import Comment
+from repository.repository import Repository
+from repository.write_queue import CommentWriteQueue
+from service.comment_service import CommentService
+from service.post_service import PostService
+from service.user_service import UserService
+
+
+def test_fallback_after_failed_batch_does_not_double_count(new_repository, monkeypatch):
+    async def scenario():
+        repos = new_repository()
+        author = await UserService(repos).create_user("author")
+        post = await PostService(repos).create_post("author", "t", "c")
+        parent = await CommentService(repos).add_comment_to_post(post.id, "author", "parent")
+
+        commit = Repository.commit
+        calls = 0
+
+        async def failing_first_commit(self):
+            nonlocal calls
+            calls += 1
+            if calls == 1:
+                raise RuntimeError("сбой фиксации пакета")
+            await commit(self)
+
+        monkeypatch.setattr(Repository, "commit", failing_first_commit)
+        queue = CommentWriteQueue(repos.session_factory, max_batch=3, max_delay=1.0)
+        queue.start()
+        try:
+            await asyncio.gather(
+                queue.submit(Comment.reply_to(parent, "r1", author)),
+                queue.submit(Comment.reply_to(parent, "r2", author)),
+                queue.submit(Comment.for_post(post, "root", author)),
+            )
+        finally:
+            await queue.stop()
+            monkeypatch.setattr(Repository, "commit", commit)
+        assert queue.fallbacks == 1
+        in_memory = (post.comment_count, parent.reply_count)
+        await repos.close()
+
+        check = new_repository()
+        stored_post = await check.posts.find_by_id(post.id)
+        stored_parent = await check.comments.find_by_id(parent.id)
+        stored = (stored_post.comment_count, stored_parent.reply_count)
+        await check.close()
+        return in_memory, stored
+
+    in_memory, stored = asyncio.run(scenario())
+    assert stored == (4, 2)
+    assert in_memory == stored